@@ -21,15 +21,20 @@
     """,
     'author': 'Vertical Pharmacy Team',
     'website': 'https://github.com/vertical-pharmacy',
-    'depends': ['base', 'product', 'stock'],
+    'depends': ['base', 'product', 'stock', 'product_expiry'],
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
         'data/sequences.xml',
+        'data/ir_cron.xml',
         'views/product_template_views.xml',
         'views/product_category_views.xml',
         'views/res_partner_views.xml',
         'views/insurance_info_views.xml',
+        'views/import_job_views.xml',
+        'views/profiling_stat_views.xml',
+        'views/cold_chain_views.xml',
+        'views/near_expiry_views.xml',
         'views/menus.xml',
     ],
     'demo': [
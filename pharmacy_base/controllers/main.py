@@ -0,0 +1,44 @@
+from odoo import http, _
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+from ..tools import get_profiling_stats, is_profiling_enabled, reset_profiling_stats
+
+
+class PharmacyController(http.Controller):
+
+    @http.route('/pharmacy_base/profiling/stats', type='json', auth='user')
+    def profiling_stats(self, reset=False):
+        """
+        Estadísticas de perfilado del worker que atiende la petición
+
+        :param reset: si es True, reinicia las estadísticas después de leerlas
+        :return: dict con {'enabled': bool, 'stats': [...]}
+        """
+        if not request.env.user.has_group('pharmacy_base.pharmacy_group_manager'):
+            raise AccessError(_('Solo los gerentes de farmacia pueden ver el perfilado.'))
+        result = {
+            'enabled': is_profiling_enabled(request.env),
+            'stats': get_profiling_stats(),
+        }
+        if reset:
+            reset_profiling_stats()
+        return result
+
+    @http.route('/pharmacy_base/pos/snapshot', type='json', auth='user')
+    def pos_snapshot(self, cursor=None, patient_ids=None, insurance_ids=None):
+        """
+        Caché offline del POS: carga completa sin cursor, delta con el cursor
+        devuelto por la llamada anterior y los ids en caché del POS (ver
+        pharmacy.pos.snapshot)
+        """
+        return request.env['pharmacy.pos.snapshot'].get_snapshot(
+            cursor=cursor, patient_ids=patient_ids, insurance_ids=insurance_ids)
+
+    @http.route('/pharmacy_base/counter/quote', type='json', auth='user')
+    def counter_quote(self, patient, lines):
+        """
+        Cotización de mostrador en un solo viaje: paciente, cobertura, receta,
+        alergias y copago por línea (ver pharmacy.counter.get_counter_quote)
+        """
+        return request.env['pharmacy.counter'].get_counter_quote(patient, lines)
@@ -1,4 +1,19 @@
+from . import bulk_validation
 from . import product_category
 from . import product_template
 from . import res_partner
-from . import insurance_info
\ No newline at end of file
+from . import insurance_info
+from . import deductible_entry
+from . import import_job
+from . import ir_config_parameter
+from . import profiling_stat
+from . import pos_snapshot
+from . import counter
+from . import stock_location
+from . import stock_move_line
+from . import stock_picking
+from . import cold_chain_stock
+from . import copurchase
+from . import stock_lot
+from . import stock_quant
+from . import near_expiry_stock
\ No newline at end of file
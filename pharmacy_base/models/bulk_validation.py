@@ -0,0 +1,93 @@
+import threading
+from contextlib import contextmanager
+
+from odoo import models, _
+from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+
+# Registros nombrados en el mensaje de error cuando varios violan una regla
+MAX_NAMED_VIOLATIONS = 10
+
+# Cursor y modelo en modo de validación masiva, por hilo. No se expone en el
+# contexto para que un llamador RPC no pueda omitir las restricciones.
+_bulk_validation = threading.local()
+
+
+class PharmacyBulkValidationMixin(models.AbstractModel):
+    """
+    Reglas de validación evaluables en SQL sobre todo un recordset.
+
+    Cada regla es una condición SQL sobre la tabla del modelo que selecciona
+    los registros inválidos. Las restricciones @api.constrains verifican la
+    regla registro por registro con _check_bulk_validation_rule, sin
+    consultas; dentro de _bulk_validation_mode() se omiten y el llamador
+    (importaciones, ediciones masivas) obtiene luego todas las violaciones de
+    una vez en SQL con get_constraint_violations().
+    """
+    _name = 'pharmacy.bulk.validation.mixin'
+    _description = 'Validación masiva de reglas de farmacia'
+
+    def _get_bulk_validation_rules(self):
+        """:return: dict {regla: (condición SQL de registros inválidos, mensaje)}"""
+        return {}
+
+    @contextmanager
+    def _bulk_validation_mode(self):
+        """
+        Omite las restricciones por regla de este modelo en el cursor actual
+        mientras dura el bloque; las de otros modelos escritos en la misma
+        transacción se siguen verificando. El llamador debe verificar los
+        registros con get_constraint_violations() antes de salir.
+        """
+        previous = getattr(_bulk_validation, 'scope', None)
+        _bulk_validation.scope = (self.env.cr, self._name)
+        try:
+            yield
+        finally:
+            _bulk_validation.scope = previous
+
+    def get_constraint_violations(self, rules=None):
+        """
+        Evalúa las reglas sobre todo el recordset, una consulta por regla.
+
+        :param rules: nombres de las reglas a evaluar (por defecto todas)
+        :return: dict {regla: {'message': str, 'ids': [ids inválidos]}} solo
+                 con las reglas que tienen violaciones
+        """
+        all_rules = self._get_bulk_validation_rules()
+        if not self or not all_rules:
+            return {}
+        self.flush_recordset()
+        violations = {}
+        for rule in rules or all_rules:
+            condition, message = all_rules[rule]
+            self.env.cr.execute(SQL(
+                "SELECT id FROM %s WHERE id = ANY(%s) AND (%s) ORDER BY id",
+                SQL.identifier(self._table), self.ids, condition,
+            ))
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if ids:
+                violations[rule] = {'message': message, 'ids': ids}
+        return violations
+
+    def _check_bulk_validation_rule(self, rule, is_invalid):
+        """
+        Restricción de una regla, evaluada en Python sobre los registros ya
+        cargados; se omite en modo de validación masiva.
+
+        :param rule: nombre de la regla (para el mensaje de error)
+        :param is_invalid: función registro -> bool equivalente a la
+                           condición SQL de la regla
+        """
+        if getattr(_bulk_validation, 'scope', None) == (self.env.cr, self._name):
+            return
+        invalid = self.filtered(is_invalid)
+        if not invalid:
+            return
+        message = self._get_bulk_validation_rules()[rule][1]
+        if len(invalid) > 1:
+            names = invalid[:MAX_NAMED_VIOLATIONS].mapped('display_name')
+            message = '%s\n%s' % (message, '\n'.join('- %s' % name for name in names))
+            if len(invalid) > MAX_NAMED_VIOLATIONS:
+                message += '\n' + _('... y %s más', len(invalid) - MAX_NAMED_VIOLATIONS)
+        raise ValidationError(message)
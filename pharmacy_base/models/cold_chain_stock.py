@@ -0,0 +1,87 @@
+from odoo import models, fields, api, tools
+from odoo.tools import SQL, sql
+
+
+class PharmacyColdChainStock(models.Model):
+    """
+    Existencias de productos de cadena de frío (refrigerados o fotosensibles)
+    por ubicación interna.
+
+    Es una vista SQL sobre stock.quant: refleja cada movimiento de stock en
+    el momento en que se confirma, sin proceso de refresco. El índice parcial
+    sobre product_template hace que solo se recorran los quants de los
+    productos marcados.
+    """
+    _name = 'pharmacy.cold.chain.stock'
+    _description = 'Existencias de Cadena de Frío'
+    _auto = False
+    _order = 'location_id, product_id'
+
+    product_id = fields.Many2one('product.product', string='Producto', readonly=True)
+    product_tmpl_id = fields.Many2one('product.template', string='Plantilla de Producto', readonly=True)
+    location_id = fields.Many2one('stock.location', string='Ubicación', readonly=True)
+    warehouse_id = fields.Many2one('stock.warehouse', string='Almacén', readonly=True)
+    lot_id = fields.Many2one('stock.lot', string='Lote', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    quantity = fields.Float(string='Cantidad', digits='Product Unit of Measure', readonly=True)
+    requires_refrigeration = fields.Boolean(string='Requiere Refrigeración', readonly=True)
+    photosensitive = fields.Boolean(string='Fotosensible', readonly=True)
+    is_refrigerated = fields.Boolean(string='Ubicación Refrigerada', readonly=True)
+    is_light_protected = fields.Boolean(string='Ubicación Protegida de la Luz', readonly=True)
+    storage_violation = fields.Boolean(
+        string='Ubicación Inadecuada',
+        readonly=True,
+        help='La ubicación no cumple las condiciones de almacenamiento del producto'
+    )
+
+    def _query(self):
+        return SQL("""
+            SELECT sq.id AS id,
+                   sq.product_id AS product_id,
+                   pp.product_tmpl_id AS product_tmpl_id,
+                   sq.location_id AS location_id,
+                   sl.warehouse_id AS warehouse_id,
+                   sq.lot_id AS lot_id,
+                   sq.company_id AS company_id,
+                   sq.quantity AS quantity,
+                   pt.requires_refrigeration AS requires_refrigeration,
+                   pt.photosensitive AS photosensitive,
+                   COALESCE(sl.is_refrigerated, FALSE) AS is_refrigerated,
+                   COALESCE(sl.is_light_protected, FALSE) AS is_light_protected,
+                   (pt.requires_refrigeration AND NOT COALESCE(sl.is_refrigerated, FALSE))
+                       OR (pt.photosensitive AND NOT COALESCE(sl.is_light_protected, FALSE)) AS storage_violation
+              FROM stock_quant sq
+              JOIN stock_location sl ON sl.id = sq.location_id
+              JOIN product_product pp ON pp.id = sq.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE sl.usage = 'internal'
+               AND sq.quantity != 0
+               AND (pt.requires_refrigeration OR pt.photosensitive)
+        """)
+
+    def init(self):
+        sql.create_index(
+            self.env.cr,
+            'product_template_cold_chain_idx',
+            'product_template',
+            ['id'],
+            where='requires_refrigeration OR photosensitive',
+        )
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL("CREATE OR REPLACE VIEW %s AS (%s)", SQL.identifier(self._table), self._query()))
+
+    @api.model
+    def get_excursion_stock(self, location_ids, exposure='temperature'):
+        """
+        Existencias afectadas por un incidente de temperatura (o de luz) en
+        las ubicaciones dadas y sus sub-ubicaciones, en una sola consulta.
+
+        :param location_ids: ids de stock.location afectadas
+        :param exposure: 'temperature' o 'light'
+        :return: lista de dicts con producto, lote, ubicación y cantidad
+        """
+        flag = 'requires_refrigeration' if exposure == 'temperature' else 'photosensitive'
+        return self.search_read(
+            [('location_id', 'child_of', location_ids), (flag, '=', True)],
+            ['product_id', 'lot_id', 'location_id', 'warehouse_id', 'quantity'],
+        )
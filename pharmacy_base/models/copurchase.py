@@ -0,0 +1,189 @@
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Margen hacia atrás de cada ejecución, para las entregas de transacciones que
+# confirmaron después de la ejecución anterior; no se cuentan dos veces porque
+# cada entrega se marca al sumarla (stock.picking.copurchase_counted)
+COPURCHASE_OVERLAP = timedelta(hours=1)
+
+
+class PharmacyCopurchasePair(models.Model):
+    """
+    Matriz dispersa de co-ocurrencias: cuántas entregas a clientes incluyeron
+    ambos productos. Cada par se guarda una sola vez (product_a_id < product_b_id).
+    """
+    _name = 'pharmacy.copurchase.pair'
+    _description = 'Par de Productos Comprados Juntos'
+    _log_access = False
+
+    product_a_id = fields.Many2one(
+        'product.template',
+        string='Producto A',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    product_b_id = fields.Many2one(
+        'product.template',
+        string='Producto B',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    count = fields.Integer(
+        string='Compras Conjuntas',
+        required=True
+    )
+
+    _sql_constraints = [
+        ('pair_unique', 'UNIQUE(product_a_id, product_b_id)',
+         'El par de productos ya existe.'),
+    ]
+
+    @api.model
+    def _cron_compute_copurchase(self):
+        """
+        Cron: incorpora a la matriz las entregas realizadas desde la última
+        ejecución (con un margen de COPURCHASE_OVERLAP para las que
+        confirmaron tarde) y recalcula los productos relacionados solo de los
+        productos que aparecieron en ellas.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        top_n = int(ICP.get_param('pharmacy_base.copurchase_top_n', 5))
+        min_count = int(ICP.get_param('pharmacy_base.copurchase_min_count', 2))
+        last_run = fields.Datetime.to_datetime(ICP.get_param('pharmacy_base.copurchase_last_run')) \
+            or fields.Datetime.to_datetime('1970-01-01 00:00:00')
+
+        now = fields.Datetime.now()
+        self.env['stock.move'].flush_model(['state', 'date', 'product_id', 'picking_id', 'location_dest_id'])
+        self.env['stock.picking'].flush_model(['copurchase_counted'])
+        self.env['product.template'].flush_model(['related_products_ids'])
+
+        touched = self._accumulate_pairs(last_run - COPURCHASE_OVERLAP)
+        if touched:
+            self._publish_related_products(touched, top_n, min_count)
+
+        ICP.set_param('pharmacy_base.copurchase_last_run', fields.Datetime.to_string(now))
+        _logger.info("Compras conjuntas: %s productos actualizados", len(touched))
+
+    @api.model
+    def _accumulate_pairs(self, since):
+        """
+        Suma a la matriz los pares de productos de las entregas a clientes
+        realizadas después de since que todavía no se sumaron, y las marca
+        como sumadas en la misma sentencia.
+
+        :return: ids de product.template con pares nuevos o modificados
+        """
+        self.env.cr.execute("""
+            WITH counted AS (
+                UPDATE stock_picking sp
+                   SET copurchase_counted = TRUE
+                 WHERE sp.copurchase_counted IS NOT TRUE
+                   AND EXISTS (
+                       SELECT 1
+                         FROM stock_move sm
+                         JOIN stock_location dest ON dest.id = sm.location_dest_id
+                        WHERE sm.picking_id = sp.id
+                          AND sm.state = 'done'
+                          AND dest.usage = 'customer'
+                          AND sm.date > %(since)s
+                   )
+             RETURNING sp.id
+            ), baskets AS (
+                SELECT DISTINCT sm.picking_id, pp.product_tmpl_id
+                  FROM stock_move sm
+                  JOIN counted ON counted.id = sm.picking_id
+                  JOIN stock_location dest ON dest.id = sm.location_dest_id
+                  JOIN product_product pp ON pp.id = sm.product_id
+                 WHERE sm.state = 'done'
+                   AND dest.usage = 'customer'
+            ), pairs AS (
+                SELECT a.product_tmpl_id AS product_a_id,
+                       b.product_tmpl_id AS product_b_id,
+                       COUNT(*) AS count
+                  FROM baskets a
+                  JOIN baskets b ON b.picking_id = a.picking_id
+                                AND b.product_tmpl_id > a.product_tmpl_id
+              GROUP BY a.product_tmpl_id, b.product_tmpl_id
+            )
+            INSERT INTO pharmacy_copurchase_pair (product_a_id, product_b_id, count)
+            SELECT product_a_id, product_b_id, count FROM pairs
+            ON CONFLICT (product_a_id, product_b_id)
+            DO UPDATE SET count = pharmacy_copurchase_pair.count + EXCLUDED.count
+            RETURNING product_a_id, product_b_id
+        """, {'since': since})
+        touched = set()
+        for product_a_id, product_b_id in self.env.cr.fetchall():
+            touched.update((product_a_id, product_b_id))
+        self.invalidate_model(['count'])
+        self.env['stock.picking'].invalidate_model(['copurchase_counted'])
+        return sorted(touched)
+
+    @api.model
+    def _publish_related_products(self, product_ids, top_n, min_count):
+        """
+        Recalcula los `top_n` productos más comprados junto con cada producto
+        dado y los escribe en bloque en related_products_ids.
+
+        Solo se reemplazan las relaciones publicadas por este proceso
+        (copurchase_published_ids); las cargadas a mano no se modifican.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TEMP TABLE pharmacy_copurchase_top ON COMMIT DROP AS
+            SELECT product_id, related_id
+              FROM (
+                  SELECT product_id, related_id,
+                         ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY count DESC, related_id) AS rank
+                    FROM (
+                        SELECT product_a_id AS product_id, product_b_id AS related_id, count
+                          FROM pharmacy_copurchase_pair
+                         WHERE product_a_id = ANY(%(product_ids)s) AND count >= %(min_count)s
+                         UNION ALL
+                        SELECT product_b_id, product_a_id, count
+                          FROM pharmacy_copurchase_pair
+                         WHERE product_b_id = ANY(%(product_ids)s) AND count >= %(min_count)s
+                    ) candidates
+              ) ranked
+             WHERE rank <= %(top_n)s
+        """, {'product_ids': product_ids, 'min_count': min_count, 'top_n': top_n})
+
+        # Relaciones publicadas antes que ya no están en el top
+        cr.execute("""
+            WITH stale AS (
+                DELETE FROM pharmacy_copurchase_published_rel pub
+                 WHERE pub.product_tmpl_id = ANY(%(product_ids)s)
+                   AND NOT EXISTS (
+                       SELECT 1 FROM pharmacy_copurchase_top top
+                        WHERE top.product_id = pub.product_tmpl_id
+                          AND top.related_id = pub.related_tmpl_id
+                   )
+             RETURNING pub.product_tmpl_id, pub.related_tmpl_id
+            )
+            DELETE FROM product_related_rel rel
+             USING stale
+             WHERE rel.product_id = stale.product_tmpl_id
+               AND rel.related_product_id = stale.related_tmpl_id
+        """, {'product_ids': product_ids})
+
+        # Nuevas relaciones; las que ya existían (manuales) no se marcan como publicadas
+        cr.execute("""
+            WITH inserted AS (
+                INSERT INTO product_related_rel (product_id, related_product_id)
+                SELECT product_id, related_id FROM pharmacy_copurchase_top
+                ON CONFLICT DO NOTHING
+                RETURNING product_id, related_product_id
+            )
+            INSERT INTO pharmacy_copurchase_published_rel (product_tmpl_id, related_tmpl_id)
+            SELECT product_id, related_product_id FROM inserted
+            ON CONFLICT DO NOTHING
+        """)
+        cr.execute("DROP TABLE pharmacy_copurchase_top")
+        self.env['product.template'].invalidate_model(['related_products_ids', 'copurchase_published_ids'])
@@ -0,0 +1,143 @@
+from odoo import models, fields, api
+
+from ..tools import profiled, split_patient_cost, REASONS
+
+# Pacientes devueltos como candidatos cuando el código es ambiguo (póliza grupal)
+MAX_CANDIDATES = 10
+
+
+class PharmacyCounter(models.AbstractModel):
+    _name = 'pharmacy.counter'
+    _description = 'Cotización de Mostrador de Farmacia'
+
+    @api.model
+    @profiled
+    def get_counter_quote(self, patient, lines):
+        """
+        Cotiza una venta de mostrador en una sola llamada: identifica al
+        paciente, resuelve su cobertura vigente y devuelve por línea si requiere
+        receta, las alergias detectadas y el reparto entre paciente y seguro.
+
+        Los datos se leen por lotes al inicio (paciente, póliza, productos),
+        por lo que la cantidad de consultas no depende de la cantidad de líneas.
+
+        :param patient: id de res.partner, o código de paciente, ID de
+                        asegurado o número de póliza (ver lookup_patient)
+        :param lines: lista de (product_id, cantidad, monto); product_id es un
+                      id de product.product y el monto es el total de la línea
+                      (si es None se usa precio de lista * cantidad)
+        :return: dict con 'patient', 'candidates', 'coverage', 'lines',
+                 'requires_prescription', 'totals' y 'unknown_product_ids'
+                 (productos inexistentes, cuyas líneas no se cotizan)
+        """
+        partner, candidates = self._resolve_counter_patient(patient)
+        coverage = partner.resolve_active_coverage() if partner else self.env['pharmacy.insurance.info']
+
+        Product = self.env['product.product']
+        existing = set(Product.browse({line[0] for line in lines}).exists().ids)
+        unknown_product_ids = [line[0] for line in lines if line[0] not in existing]
+        lines = [line for line in lines if line[0] in existing]
+        products = Product.browse([line[0] for line in lines])
+        products.fetch(['product_tmpl_id'])
+        products.product_tmpl_id.fetch(['name', 'requires_prescription', 'list_price'])
+        alerts = {
+            alert['product_tmpl_id']: alert['allergens']
+            for alert in (partner.screen_allergies(products.product_tmpl_id.ids) if partner else [])
+        }
+
+        amounts = [
+            amount if amount is not None else product.lst_price * qty
+            for product, (dummy, qty, amount) in zip(products, lines)
+        ]
+        if coverage:
+            costs = coverage.calculate_patient_cost_batch([(coverage.id, amount) for amount in amounts])
+        else:
+            costs = [self._get_uncovered_cost(amount) for amount in amounts]
+
+        quote_lines = []
+        for product, (dummy, qty, dummy), amount, cost in zip(products, lines, amounts, costs):
+            template = product.product_tmpl_id
+            quote_lines.append({
+                'product_id': product.id,
+                'product_name': template.name,
+                'qty': qty,
+                'amount': amount,
+                'requires_prescription': template.requires_prescription,
+                'allergens': alerts.get(template.id, []),
+                **cost,
+            })
+        return {
+            'patient': self._get_quote_patient(partner),
+            'candidates': candidates,
+            'coverage': self._get_quote_coverage(coverage),
+            'lines': quote_lines,
+            'requires_prescription': any(line['requires_prescription'] for line in quote_lines),
+            'totals': {
+                'amount': sum(amounts),
+                'patient_pays': sum(line['patient_pays'] for line in quote_lines),
+                'insurance_pays': sum(line['insurance_pays'] for line in quote_lines),
+            },
+            'unknown_product_ids': unknown_product_ids,
+        }
+
+    @api.model
+    def _resolve_counter_patient(self, patient):
+        """
+        Un texto numérico que no es un código conocido se toma como id de
+        res.partner (los ids llegan como texto desde algunos clientes JSON).
+
+        :return: tupla (paciente identificado o recordset vacío, lista de
+                 candidatos {'id', 'name', 'patient_code'} si el código no
+                 identifica a un único paciente)
+        """
+        Partner = self.env['res.partner']
+        if not patient or isinstance(patient, bool):
+            return Partner, []
+        if isinstance(patient, int):
+            return Partner.browse(patient).exists(), []
+        if not isinstance(patient, str):
+            return Partner, []
+        matches = Partner.lookup_patient(patient, limit=MAX_CANDIDATES)
+        if not matches and patient.strip().isdigit():
+            return Partner.browse(int(patient)).exists(), []
+        if len(matches) == 1 or (matches and matches[0].patient_code == patient.strip()):
+            return matches[0], []
+        matches.fetch(['name', 'patient_code'])
+        return Partner, [
+            {'id': match.id, 'name': match.name, 'patient_code': match.patient_code}
+            for match in matches
+        ]
+
+    @api.model
+    def _get_uncovered_cost(self, amount):
+        """Reparto de una línea sin cobertura vigente: paga todo el paciente"""
+        patient_pays, insurance_pays, reason = split_patient_cost(False, 0.0, 0.0, 0.0, amount)
+        return {'patient_pays': patient_pays, 'insurance_pays': insurance_pays, 'reason': REASONS[reason]}
+
+    @api.model
+    def _get_quote_patient(self, partner):
+        if not partner:
+            return False
+        return {
+            'id': partner.id,
+            'name': partner.name,
+            'patient_code': partner.patient_code,
+            'allergies': partner.allergies or False,
+        }
+
+    @api.model
+    def _get_quote_coverage(self, coverage):
+        if not coverage:
+            return False
+        return {
+            'id': coverage.id,
+            'insurance_company': coverage.insurance_company_id.display_name,
+            'plan_name': coverage.plan_name,
+            'policy_number': coverage.policy_number,
+            'member_id': coverage.member_id,
+            'coverage_level': coverage.coverage_level,
+            'end_date': fields.Date.to_string(coverage.end_date),
+            'remaining_deductible': coverage.remaining_deductible,
+            'copay_default': coverage.copay_default,
+            'coinsurance_percentage': coverage.coinsurance_percentage,
+        }
@@ -0,0 +1,54 @@
+from odoo import models, fields
+from odoo.tools import sql
+
+
+class PharmacyDeductibleEntry(models.Model):
+    _name = 'pharmacy.deductible.entry'
+    _description = 'Movimiento de Deducible de Seguro'
+    _order = 'id desc'
+
+    insurance_id = fields.Many2one(
+        'pharmacy.insurance.info',
+        string='Seguro',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    amount = fields.Monetary(
+        string='Monto',
+        currency_field='currency_id',
+        required=True
+    )
+
+    currency_id = fields.Many2one(
+        related='insurance_id.currency_id',
+        string='Moneda'
+    )
+
+    date = fields.Date(
+        string='Fecha',
+        required=True,
+        default=fields.Date.context_today
+    )
+
+    reference = fields.Char(
+        string='Referencia',
+        help='Ej: número de orden o ticket de la dispensación'
+    )
+
+    rolled_up = fields.Boolean(
+        string='Acumulado',
+        readonly=True,
+        help='El monto ya se sumó al deducible pagado del seguro'
+    )
+
+    def init(self):
+        """Índice parcial de los pagos pendientes de acumular por seguro"""
+        sql.create_index(
+            self.env.cr,
+            'pharmacy_deductible_entry_pending_idx',
+            self._table,
+            ['insurance_id'],
+            where='NOT rolled_up',
+        )
@@ -0,0 +1,363 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+from psycopg2 import DatabaseError
+
+_logger = logging.getLogger(__name__)
+
+# Máximo de errores detallados que se registran por bloque
+MAX_ERRORS_PER_CHUNK = 20
+
+# Líneas del registro que se conservan (las más recientes)
+MAX_LOG_LINES = 500
+
+
+class PharmacyImportJob(models.Model):
+    _name = 'pharmacy.import.job'
+    _description = 'Importación Masiva de Farmacia'
+    _order = 'create_date desc'
+
+    name = fields.Char(
+        string='Nombre',
+        required=True
+    )
+
+    import_type = fields.Selection([
+        ('patient', 'Pacientes'),
+        ('prescriber', 'Médicos Prescriptores'),
+        ('policy', 'Seguros Médicos'),
+    ], string='Tipo de Importación', required=True, default='patient')
+
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ], string='Formato', required=True, default='csv')
+
+    data_file = fields.Binary(
+        string='Archivo',
+        attachment=True,
+        required=True
+    )
+
+    data_filename = fields.Char(
+        string='Nombre del Archivo'
+    )
+
+    chunk_size = fields.Integer(
+        string='Filas por Bloque',
+        default=1000,
+        help='Cantidad de filas que se validan, crean y confirman juntas'
+    )
+
+    state = fields.Selection([
+        ('draft', 'Borrador'),
+        ('queued', 'En Cola'),
+        ('running', 'En Proceso'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ], string='Estado', default='draft', readonly=True)
+
+    # Punto de control: filas ya procesadas y confirmadas
+    rows_done = fields.Integer(
+        string='Filas Procesadas',
+        readonly=True
+    )
+
+    rows_created = fields.Integer(
+        string='Registros Creados',
+        readonly=True
+    )
+
+    rows_failed = fields.Integer(
+        string='Filas con Error',
+        readonly=True
+    )
+
+    log = fields.Text(
+        string='Registro',
+        readonly=True
+    )
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for record in self:
+            if record.chunk_size <= 0:
+                raise ValidationError(_('El tamaño de bloque debe ser mayor que cero.'))
+
+    def action_start(self):
+        """Encola la importación para que la procese el cron en segundo plano"""
+        if any(job.state in ('done', 'running') for job in self):
+            raise UserError(_('Solo se pueden iniciar importaciones pendientes o fallidas.'))
+        self.write({'state': 'queued'})
+        self.env.ref('pharmacy_base.ir_cron_pharmacy_import_job')._trigger()
+
+    def action_reset(self):
+        """Reinicia el punto de control para volver a importar desde el inicio"""
+        self.write({
+            'state': 'draft',
+            'rows_done': 0,
+            'rows_created': 0,
+            'rows_failed': 0,
+            'log': False,
+        })
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Procesa las importaciones en cola y reanuda las interrumpidas"""
+        for job in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            job._run()
+
+    def _run(self):
+        """
+        Importa el archivo por bloques a partir del punto de control.
+
+        Cada bloque se valida en lote, se crea dentro de un savepoint y se
+        confirma junto con el avance, de modo que una interrupción se reanuda
+        en el primer bloque no confirmado.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Model = self._get_target_model()
+        self.state = 'running'
+
+        rows = itertools.islice(self._iter_rows(), self.rows_done, None)
+        chunk_number = self.rows_done // self.chunk_size
+        try:
+            for chunk in split_every(self.chunk_size, rows, list):
+                chunk_number += 1
+                first_line = self.rows_done + 1
+                started = time.perf_counter()
+
+                vals_list, errors = self._prepare_chunk(chunk, first_line)
+                created, create_errors = self._create_chunk(Model, vals_list)
+                errors += create_errors
+
+                elapsed = time.perf_counter() - started
+                message = _('Bloque %(chunk)s (filas %(first)s-%(last)s): %(created)s creados, '
+                            '%(errors)s errores, %(speed).0f filas/s',
+                            chunk=chunk_number, first=first_line, last=first_line + len(chunk) - 1,
+                            created=created, errors=len(errors), speed=len(chunk) / (elapsed or 1e-6))
+                _logger.info("Importación %s: %s", self.id, message)
+                self.write({
+                    'rows_done': self.rows_done + len(chunk),
+                    'rows_created': self.rows_created + created,
+                    'rows_failed': self.rows_failed + len(errors),
+                    'log': self._append_log([message] + errors[:MAX_ERRORS_PER_CHUNK]),
+                })
+                if auto_commit:
+                    self.env.cr.commit()
+        except Exception as e:
+            if not auto_commit:
+                raise
+            self.env.cr.rollback()
+            _logger.exception("Importación %s interrumpida", self.id)
+            self.write({
+                'state': 'failed',
+                'log': self._append_log([_('Interrumpida: %s', e)]),
+            })
+            self.env.cr.commit()
+            return
+        self.state = 'done'
+
+    def _append_log(self, lines):
+        """
+        :return: el registro con las líneas agregadas, limitado a las últimas
+                 MAX_LOG_LINES para que su escritura no crezca con cada bloque
+        """
+        log_lines = (self.log or '').splitlines()[-MAX_LOG_LINES:] + lines
+        return '\n'.join(log_lines[-MAX_LOG_LINES:])
+
+    def _get_target_model(self):
+        if self.import_type == 'policy':
+            return self.env['pharmacy.insurance.info']
+        return self.env['res.partner']
+
+    def _iter_rows(self):
+        """Genera las filas del archivo como dicts sin cargarlo completo en memoria"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'data_file'),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_('La importación no tiene archivo.'))
+        if attachment.store_fname:
+            stream = open(attachment._full_path(attachment.store_fname), 'rb')
+        else:
+            stream = io.BytesIO(attachment.raw)
+
+        with io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') as text:
+            if self.file_format == 'csv':
+                yield from csv.DictReader(text)
+            else:
+                for line in text:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+
+    def _create_chunk(self, Model, vals_list):
+        """
+        Crea los registros del bloque en un solo create, con las reglas del
+        modelo validadas en modo masivo: las filas que no las cumplen se
+        reportan todas juntas y se descartan. Si el create falla por otro
+        motivo, reintenta fila por fila para aislar las filas con error.
+
+        :return: tupla (cantidad creada, lista de errores)
+        """
+        if not vals_list:
+            return 0, []
+        try:
+            with self.env.cr.savepoint(), Model._bulk_validation_mode():
+                records = Model.create([vals for line, vals in vals_list])
+                violations = records.get_constraint_violations()
+                if not violations:
+                    return len(vals_list), []
+                lines = dict(zip(records.ids, (line for line, vals in vals_list)))
+                messages = defaultdict(list)
+                for violation in violations.values():
+                    for record_id in violation['ids']:
+                        messages[record_id].append(violation['message'])
+                records.browse(list(messages)).unlink()
+                errors = [_('Fila %(line)s: %(error)s', line=lines[record_id], error=' '.join(record_messages))
+                          for record_id, record_messages in sorted(messages.items())]
+                return len(vals_list) - len(messages), errors
+        except (ValidationError, DatabaseError):
+            pass
+
+        created, errors = 0, []
+        for line, vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    Model.create(vals)
+                created += 1
+            except (ValidationError, DatabaseError) as e:
+                errors.append(_('Fila %(line)s: %(error)s', line=line, error=str(e).strip()))
+        return created, errors
+
+    def _prepare_chunk(self, chunk, first_line):
+        """
+        Valida y convierte un bloque de filas en valores de creación.
+
+        :param chunk: lista de filas (dicts)
+        :param first_line: número de la primera fila del bloque
+        :return: tupla ([(línea, vals)], [errores])
+        """
+        prepare = getattr(self, '_prepare_%s_chunk' % self.import_type)
+        lines = list(range(first_line, first_line + len(chunk)))
+        errors = [_('Fila %s: formato inválido', line)
+                  for line, row in zip(lines, chunk) if not row or not isinstance(row, dict)]
+        valid = [(line, {key: (value.strip() if isinstance(value, str) else value)
+                         for key, value in row.items() if key})
+                 for line, row in zip(lines, chunk) if row and isinstance(row, dict)]
+        vals_list, prepare_errors = prepare(valid)
+        return vals_list, errors + prepare_errors
+
+    def _prepare_patient_chunk(self, rows):
+        fields_map = ['name', 'patient_code', 'vat', 'email', 'phone', 'allergies',
+                      'chronic_conditions', 'current_medications']
+        codes = [row['patient_code'] for line, row in rows if row.get('patient_code')]
+        existing = set()
+        if codes:
+            existing = set(self.env['res.partner'].with_context(active_test=False).search(
+                [('patient_code', 'in', codes)]).mapped('patient_code'))
+
+        vals_list, errors, seen = [], [], set()
+        for line, row in rows:
+            code = row.get('patient_code')
+            if not row.get('name'):
+                errors.append(_('Fila %s: el nombre es obligatorio', line))
+            elif code and (code in existing or code in seen):
+                errors.append(_('Fila %(line)s: el código de paciente %(code)s ya existe', line=line, code=code))
+            else:
+                if code:
+                    seen.add(code)
+                vals = {key: row[key] for key in fields_map if row.get(key)}
+                vals['is_patient'] = True
+                vals_list.append((line, vals))
+        return vals_list, errors
+
+    def _prepare_prescriber_chunk(self, rows):
+        specialties = dict(self.env['res.partner']._fields['prescriber_specialty'].selection)
+        licenses = [row['medical_license'] for line, row in rows if row.get('medical_license')]
+        existing = set()
+        if licenses:
+            existing = set(self.env['res.partner'].with_context(active_test=False).search(
+                [('medical_license', 'in', licenses)]).mapped('medical_license'))
+
+        vals_list, errors, seen = [], [], set()
+        for line, row in rows:
+            license_number = row.get('medical_license')
+            specialty = row.get('prescriber_specialty')
+            if not row.get('name'):
+                errors.append(_('Fila %s: el nombre es obligatorio', line))
+            elif not license_number:
+                errors.append(_('Fila %s: los médicos prescriptores deben tener una cédula profesional', line))
+            elif license_number in existing or license_number in seen:
+                errors.append(_('Fila %(line)s: la cédula %(license)s ya existe', line=line, license=license_number))
+            elif specialty and specialty not in specialties:
+                errors.append(_('Fila %(line)s: especialidad desconocida %(specialty)s', line=line, specialty=specialty))
+            else:
+                seen.add(license_number)
+                vals = {key: row[key] for key in ('name', 'email', 'phone') if row.get(key)}
+                vals.update(is_prescriber=True, medical_license=license_number, prescriber_specialty=specialty or False)
+                vals_list.append((line, vals))
+        return vals_list, errors
+
+    def _prepare_policy_chunk(self, rows):
+        Partner = self.env['res.partner'].with_context(active_test=False)
+        codes = {row['patient_code'] for line, row in rows if row.get('patient_code')}
+        companies = {row['insurance_company'] for line, row in rows if row.get('insurance_company')}
+        patient_ids = {
+            partner.patient_code: partner.id
+            for partner in Partner.search([('patient_code', 'in', list(codes))])
+        } if codes else {}
+        company_ids = {
+            partner.name: partner.id
+            for partner in Partner.search([('is_company', '=', True), ('name', 'in', list(companies))])
+        } if companies else {}
+        levels = dict(self.env['pharmacy.insurance.info']._fields['coverage_level'].selection)
+
+        vals_list, errors = [], []
+        for line, row in rows:
+            try:
+                vals = {
+                    'partner_id': patient_ids.get(row.get('patient_code')),
+                    'insurance_company_id': company_ids.get(row.get('insurance_company')),
+                    'policy_number': row.get('policy_number'),
+                    'member_id': row.get('member_id'),
+                    'plan_name': row.get('plan_name'),
+                    'group_number': row.get('group_number') or False,
+                    'coverage_level': row.get('coverage_level') or 'basico',
+                    'start_date': fields.Date.to_date(row.get('start_date')) or fields.Date.today(),
+                    'end_date': fields.Date.to_date(row.get('end_date') or None),
+                }
+                for key in ('copay_default', 'coinsurance_percentage', 'annual_deductible', 'deductible_met'):
+                    vals[key] = float(row.get(key) or 0.0)
+            except ValueError as e:
+                errors.append(_('Fila %(line)s: valor inválido (%(error)s)', line=line, error=e))
+                continue
+
+            missing = [key for key in ('partner_id', 'insurance_company_id', 'policy_number', 'member_id', 'plan_name')
+                       if not vals[key]]
+            if missing:
+                errors.append(_('Fila %(line)s: faltan o no se encontraron %(fields)s',
+                                line=line, fields=', '.join(missing)))
+            elif vals['coverage_level'] not in levels:
+                errors.append(_('Fila %s: nivel de cobertura desconocido', line))
+            elif vals['end_date'] and vals['start_date'] > vals['end_date']:
+                errors.append(_('Fila %s: la fecha de fin no puede ser anterior a la fecha de inicio', line))
+            else:
+                vals_list.append((line, vals))
+        return vals_list, errors
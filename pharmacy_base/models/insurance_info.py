@@ -1,13 +1,33 @@
+import logging
+import threading
+
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
-from datetime import date
+from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import sql, split_every, SQL
+from datetime import date, timedelta
+
+from ..tools import profiled, REASONS, PlanSnapshot, get_plan_snapshot, split_patient_cost, compute_patient_cost
+
+_logger = logging.getLogger(__name__)
 
 
 class PharmacyInsuranceInfo(models.Model):
     _name = 'pharmacy.insurance.info'
+    _inherit = ['pharmacy.bulk.validation.mixin']
     _description = 'Información de Seguro Médico del Paciente'
     _order = 'start_date desc'
 
+    # Pólizas por lote (y por commit) en el reinicio anual del deducible
+    _DEDUCTIBLE_RESET_BATCH = 5000
+
+    # Pólizas leídas por lote al refrescar el snapshot de tarificación
+    _PLAN_SNAPSHOT_BATCH = 10000
+    _PLAN_SNAPSHOT_FIELDS = [
+        'active', 'start_date', 'end_date', 'annual_deductible', 'deductible_met',
+        'remaining_deductible', 'copay_default', 'coinsurance_percentage',
+    ]
+
     # Relaciones
     partner_id = fields.Many2one(
         'res.partner',
@@ -28,12 +48,14 @@ class PharmacyInsuranceInfo(models.Model):
     # Información de la Póliza
     policy_number = fields.Char(
         string='Número de Póliza',
-        required=True
+        required=True,
+        index=True
     )
 
     member_id = fields.Char(
         string='ID del Asegurado',
-        required=True
+        required=True,
+        index=True
     )
 
     group_number = fields.Char(
@@ -55,17 +77,20 @@ class PharmacyInsuranceInfo(models.Model):
     # Vigencia
     active = fields.Boolean(
         string='Activo',
-        default=True
+        default=True,
+        index=True
     )
 
     start_date = fields.Date(
         string='Fecha de Inicio',
         required=True,
+        index=True,
         default=fields.Date.today
     )
 
     end_date = fields.Date(
-        string='Fecha de Fin'
+        string='Fecha de Fin',
+        index=True
     )
 
     # Costos
@@ -92,6 +117,12 @@ class PharmacyInsuranceInfo(models.Model):
         help='Monto del deducible ya pagado en el año actual'
     )
 
+    deductible_entry_ids = fields.One2many(
+        'pharmacy.deductible.entry',
+        'insurance_id',
+        string='Movimientos de Deducible'
+    )
+
     currency_id = fields.Many2one(
         'res.currency',
         string='Moneda',
@@ -107,6 +138,7 @@ class PharmacyInsuranceInfo(models.Model):
     is_valid = fields.Boolean(
         string='Cobertura Válida',
         compute='_compute_is_valid',
+        search='_search_is_valid',
         store=False
     )
 
@@ -117,6 +149,7 @@ class PharmacyInsuranceInfo(models.Model):
     )
 
     @api.depends('active', 'start_date', 'end_date')
+    @profiled
     def _compute_is_valid(self):
         today = date.today()
         for record in self:
@@ -129,11 +162,54 @@ class PharmacyInsuranceInfo(models.Model):
             else:
                 record.is_valid = True
 
-    @api.depends('annual_deductible', 'deductible_met')
+    def _search_is_valid(self, operator, value):
+        """
+        Las pólizas archivadas nunca son válidas, pero el filtro active_test
+        por defecto las excluye de la búsqueda: para obtenerlas con
+        is_valid = False hay que buscar con active_test=False.
+        """
+        if operator in ('=', '!='):
+            wanted = {bool(value) == (operator == '=')}
+        elif operator in ('in', 'not in'):
+            values = {bool(item) for item in value}
+            wanted = values if operator == 'in' else {True, False} - values
+        else:
+            raise UserError(_('Operación no soportada: %s', operator))
+        if len(wanted) != 1:
+            return expression.TRUE_DOMAIN if wanted else expression.FALSE_DOMAIN
+        today = date.today()
+        if True in wanted:
+            return self._get_valid_domain(today)
+        return [
+            '|', '|',
+            ('active', '=', False),
+            ('start_date', '>', today),
+            ('end_date', '<', today),
+        ]
+
+    @api.model
+    def _get_valid_domain(self, today):
+        """Dominio de las pólizas con cobertura válida en la fecha dada"""
+        return [
+            ('active', '=', True),
+            ('start_date', '<=', today),
+            '|', ('end_date', '=', False), ('end_date', '>=', today),
+        ]
+
+    @api.depends('annual_deductible', 'deductible_met', 'deductible_entry_ids.amount', 'deductible_entry_ids.rolled_up')
+    @profiled
     def _compute_remaining_deductible(self):
+        # Movimientos del libro de deducible aún no acumulados en deductible_met
+        pending = dict(self.env['pharmacy.deductible.entry']._read_group(
+            [('insurance_id', 'in', self._origin.ids), ('rolled_up', '=', False)],
+            ['insurance_id'],
+            ['amount:sum'],
+        )) if self._origin.ids else {}
         for record in self:
-            record.remaining_deductible = record.annual_deductible - record.deductible_met
+            record.remaining_deductible = record.annual_deductible - record.deductible_met \
+                - pending.get(record._origin, 0.0)
 
+    @profiled
     def calculate_patient_cost(self, amount):
         """
         Calcula el costo que debe pagar el paciente según su plan
@@ -142,48 +218,365 @@ class PharmacyInsuranceInfo(models.Model):
         :return: dict con {'patient_pays': X, 'insurance_pays': Y}
         """
         self.ensure_one()
+        return self._split_patient_cost(self._get_cost_params()[self.id], amount)
+
+    @api.model
+    @profiled
+    def calculate_patient_cost_batch(self, lines):
+        """
+        Calcula en una sola llamada el costo de varias líneas (canasta POS,
+        re-tarificación de reclamos), con un único prefetch de las pólizas.
+
+        :param lines: lista de pares (póliza, monto); la póliza puede ser un id
+                      o un registro de pharmacy.insurance.info
+        :return: lista de dicts como calculate_patient_cost, en el mismo orden
+        """
+        pairs = [(policy if isinstance(policy, int) else policy.id, amount)
+                 for policy, amount in lines]
+        policies = self.browse(list(dict.fromkeys(policy_id for policy_id, dummy in pairs)))
+        params = policies._get_cost_params()
+        return [self._split_patient_cost(params[policy_id], amount) for policy_id, amount in pairs]
 
-        if not self.is_valid:
-            return {
-                'patient_pays': amount,
-                'insurance_pays': 0.0,
-                'reason': 'Cobertura no válida'
+    def _get_cost_params(self):
+        """
+        Lee de una vez los parámetros de costo de todas las pólizas de self.
+        Los computados se evalúan en lote sobre todo el recordset.
+
+        :return: dict {insurance_id: dict de parámetros}
+        """
+        self.fetch(['active', 'start_date', 'end_date', 'annual_deductible', 'deductible_met',
+                    'copay_default', 'coinsurance_percentage'])
+        return {
+            record.id: {
+                'is_valid': record.is_valid,
+                'remaining_deductible': record.remaining_deductible,
+                'copay_default': record.copay_default,
+                'coinsurance_percentage': record.coinsurance_percentage,
             }
+            for record in self
+        }
 
-        # Si hay deducible pendiente
-        if self.remaining_deductible > 0:
-            if amount <= self.remaining_deductible:
-                return {
-                    'patient_pays': amount,
-                    'insurance_pays': 0.0,
-                    'reason': 'Aplicado a deducible'
-                }
-            else:
-                amount_after_deductible = amount - self.remaining_deductible
-                patient_pays = self.remaining_deductible
-        else:
-            amount_after_deductible = amount
-            patient_pays = 0.0
+    def record_deductible_payment(self, amount, reference=False):
+        """
+        Registra un pago del paciente a cuenta del deducible anual.
+
+        Solo agrega un movimiento al libro de deducible (no escribe la póliza),
+        por lo que terminales concurrentes no se bloquean entre sí; el cron de
+        acumulación lo suma luego a deductible_met.
 
-        # Aplicar copago o coseguro
-        if self.copay_default > 0:
-            patient_pays += self.copay_default
-        elif self.coinsurance_percentage > 0:
-            patient_pays += amount_after_deductible * (self.coinsurance_percentage / 100.0)
+        :param amount: monto pagado a cuenta del deducible
+        :param reference: referencia de la venta (opcional)
+        :return: registro pharmacy.deductible.entry
+        """
+        self.ensure_one()
+        return self.env['pharmacy.deductible.entry'].create({
+            'insurance_id': self.id,
+            'amount': amount,
+            'reference': reference,
+        })
+
+    @api.model
+    def _cron_rollup_deductible(self):
+        """
+        Cron: suma a deductible_met los movimientos pendientes del libro en una
+        sola sentencia atómica, de modo que remaining_deductible no cambia.
+        """
+        self.env['pharmacy.deductible.entry'].flush_model()
+        self.flush_model(['deductible_met'])
+        self.env.cr.execute("""
+            WITH rolled AS (
+                UPDATE pharmacy_deductible_entry
+                   SET rolled_up = TRUE
+                 WHERE NOT rolled_up
+             RETURNING insurance_id, amount
+            ), totals AS (
+                SELECT insurance_id, SUM(amount) AS amount
+                  FROM rolled
+              GROUP BY insurance_id
+            )
+            UPDATE pharmacy_insurance_info pii
+               SET deductible_met = pii.deductible_met + totals.amount,
+                   write_date = (now() at time zone 'UTC')
+              FROM totals
+             WHERE pii.id = totals.insurance_id
+         RETURNING pii.id
+        """)
+        policies = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.env['pharmacy.deductible.entry'].invalidate_model(['rolled_up'])
+        self.invalidate_model(['deductible_met', 'remaining_deductible', 'write_date'])
+        policies.modified(['deductible_met'])
+        _logger.info("Deducible acumulado en %s pólizas", len(policies))
 
-        insurance_pays = amount - patient_pays
+    @api.model
+    def _cron_reset_annual_deductible(self):
+        """
+        Cron diario: al cambiar de año reinicia deductible_met y archiva las
+        pólizas vencidas, por lotes de ids confirmados uno a uno. El último id
+        procesado se guarda como punto de control, de modo que una ejecución
+        interrumpida continúa donde quedó.
+
+        El cron de acumulación sigue corriendo entre lotes, así que el
+        deducible no se pone en cero sino en la suma de los movimientos del
+        año nuevo ya acumulados.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        today = date.today()
+        if int(ICP.get_param('pharmacy_base.deductible_reset_year', today.year)) >= today.year:
+            ICP.set_param('pharmacy_base.deductible_reset_year', today.year)
+            return
 
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        last_id = int(ICP.get_param('pharmacy_base.deductible_reset_last_id', 0))
+        self.env['pharmacy.deductible.entry'].flush_model()
+        self.flush_model()
+
+        # Los pagos pendientes del año anterior no cuentan para el nuevo
+        self.env.cr.execute("""
+            UPDATE pharmacy_deductible_entry
+               SET rolled_up = TRUE
+             WHERE NOT rolled_up AND date < %s
+        """, (date(today.year, 1, 1),))
+        self.env['pharmacy.deductible.entry'].invalidate_model(['rolled_up'])
+
+        self.env.cr.execute("SELECT COUNT(*) FROM pharmacy_insurance_info WHERE id > %s", (last_id,))
+        remaining = self.env.cr.fetchone()[0]
+        done = 0
+        while True:
+            last_id, scanned, policy_ids = self._reset_deductible_chunk(
+                last_id, self._DEDUCTIBLE_RESET_BATCH, today)
+            if not scanned:
+                break
+            policies = self.browse(policy_ids)
+            policies.modified(['deductible_met', 'active'])
+            ICP.set_param('pharmacy_base.deductible_reset_last_id', last_id)
+            self.env.flush_all()
+            done += scanned
+            remaining = max(remaining - scanned, 0)
+            _logger.info("Reinicio de deducible %s: %s pólizas revisadas, %s pendientes",
+                         today.year, done, remaining)
+            self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
+            if auto_commit:
+                self.env.cr.commit()
+            # No acumular en caché los registros de todos los lotes
+            self.env.invalidate_all()
+
+        ICP.set_param('pharmacy_base.deductible_reset_year', today.year)
+        ICP.set_param('pharmacy_base.deductible_reset_last_id', 0)
+
+    @api.model
+    def _reset_deductible_chunk(self, last_id, limit, today):
+        """
+        Reinicia en una sola sentencia las pólizas con id posterior a
+        `last_id` (hasta `limit`): el deducible pagado pasa a ser lo acumulado
+        con movimientos del año en curso y se archivan las vencidas. Volver a
+        ejecutar un lote ya reiniciado no cambia el resultado.
+
+        :return: tupla (último id revisado, pólizas revisadas, ids modificados)
+        """
+        self.env.cr.execute("""
+            WITH chunk AS (
+                SELECT id
+                  FROM pharmacy_insurance_info
+                 WHERE id > %(last_id)s
+              ORDER BY id
+                 LIMIT %(limit)s
+            ), current_year AS (
+                SELECT entry.insurance_id, SUM(entry.amount) AS amount
+                  FROM pharmacy_deductible_entry entry
+                  JOIN chunk ON chunk.id = entry.insurance_id
+                 WHERE entry.rolled_up AND entry.date >= %(year_start)s
+              GROUP BY entry.insurance_id
+            ), updated AS (
+                UPDATE pharmacy_insurance_info pii
+                   SET deductible_met = COALESCE(current_year.amount, 0),
+                       active = pii.active AND (pii.end_date IS NULL OR pii.end_date >= %(today)s),
+                       write_date = (now() at time zone 'UTC'),
+                       write_uid = %(uid)s
+                  FROM chunk
+             LEFT JOIN current_year ON current_year.insurance_id = chunk.id
+                 WHERE pii.id = chunk.id
+                   AND (pii.deductible_met != COALESCE(current_year.amount, 0)
+                        OR (pii.active AND pii.end_date < %(today)s))
+             RETURNING pii.id
+            )
+            SELECT (SELECT MAX(id) FROM chunk), (SELECT COUNT(*) FROM chunk), ARRAY(SELECT id FROM updated)
+        """, {
+            'last_id': last_id,
+            'limit': limit,
+            'today': today,
+            'year_start': date(today.year, 1, 1),
+            'uid': self.env.uid,
+        })
+        max_id, scanned, policy_ids = self.env.cr.fetchone()
+        self.invalidate_model(['deductible_met', 'remaining_deductible', 'active', 'write_date', 'write_uid'])
+        return max_id, scanned, policy_ids
+
+    @api.model
+    def _split_patient_cost(self, params, amount):
+        """
+        Reparte un monto entre paciente y aseguradora
+
+        :param params: parámetros de la póliza (ver _get_cost_params)
+        :param amount: Monto total del medicamento
+        :return: dict con {'patient_pays': X, 'insurance_pays': Y, 'reason': Z}
+        """
+        patient_pays, insurance_pays, reason = split_patient_cost(
+            params['is_valid'],
+            params['remaining_deductible'],
+            params['copay_default'],
+            params['coinsurance_percentage'],
+            amount,
+        )
         return {
             'patient_pays': patient_pays,
             'insurance_pays': insurance_pays,
-            'reason': 'Cálculo normal'
+            'reason': REASONS[reason]
         }
 
+    @api.model
+    def _calculate_patient_cost_columnar(self, policy_ids, amounts, today=None):
+        """
+        Re-tarificación masiva (auditorías de reclamos, simulaciones de precio)
+        sobre el snapshot columnar de pólizas; da el mismo resultado que
+        calculate_patient_cost sin cargar registros.
+
+        :param policy_ids: secuencia de ids de póliza
+        :param amounts: secuencia de montos, en el mismo orden
+        :return: tupla de columnas (paga el paciente, paga el seguro, código de
+                 razón); los códigos indexan tools.pricing.REASONS
+        """
+        return compute_patient_cost(self._get_plan_snapshot(), policy_ids, amounts, today)
+
+    @api.model
+    def _get_plan_snapshot(self):
+        """
+        Snapshot columnar del proceso con los parámetros de costo de todas las
+        pólizas. Se refresca de forma incremental: solo se releen las pólizas
+        escritas y las que recibieron pagos de deducible desde el último refresco.
+
+        El snapshot es compartido por todas las peticiones del proceso y se
+        refresca con el cursor de la petición, así que ve los cambios de la
+        transacción en curso. Las pólizas se leen fuera del lock del snapshot
+        y solo se aplican bajo él. Si la transacción se revierte, las pólizas
+        que leyó se marcan para releerlas, de modo que sus valores no
+        confirmados no quedan en el snapshot. Un cambio de la secuencia del
+        registro (actualización de módulos) fuerza una recarga completa.
+        """
+        snapshot = get_plan_snapshot(self.env.cr.dbname)
+        registry_sequence = self.env.registry.registry_sequence
+        self.flush_model()
+        self.env['pharmacy.deductible.entry'].flush_model()
+        with snapshot.lock:
+            since = snapshot.cursor if snapshot.registry_sequence == registry_sequence else None
+            dirty = set(snapshot.dirty)
+        self.env.cr.execute("SELECT now() at time zone 'UTC', (SELECT COUNT(*) FROM pharmacy_insurance_info)")
+        now, total = self.env.cr.fetchone()
+
+        rebuilt = None
+        if since is not None:
+            policy_ids = self._get_plan_snapshot_changes(since, dirty)
+            rows = list(self._read_plan_snapshot_rows(policy_ids))
+            with snapshot.lock:
+                snapshot.upsert(rows)
+                # Hubo pólizas eliminadas: recarga completa
+                complete = len(snapshot) == total
+        if since is None or not complete:
+            self.env.cr.execute("SELECT id FROM pharmacy_insurance_info ORDER BY id")
+            policy_ids = None
+            rebuilt = PlanSnapshot()
+            rebuilt.upsert(self._read_plan_snapshot_rows([row[0] for row in self.env.cr.fetchall()]))
+
+        with snapshot.lock:
+            if rebuilt is not None:
+                snapshot.replace(rebuilt)
+            snapshot.dirty -= dirty
+            snapshot.registry_sequence = registry_sequence
+            # Mismo margen que el POS para transacciones que confirman tarde
+            snapshot.cursor = now - timedelta(minutes=5)
+        self._mark_plan_snapshot_on_rollback(snapshot, policy_ids)
+        return snapshot
+
+    def _mark_plan_snapshot_on_rollback(self, snapshot, policy_ids):
+        """
+        Si la transacción se revierte, marca para releer las pólizas que se
+        leyeron en ella (o una recarga completa si policy_ids es None).
+        """
+        data = self.env.cr.postrollback.data
+        read = data.get('pharmacy_plan_snapshot')
+        if read is None:
+            read = data['pharmacy_plan_snapshot'] = {'ids': set(), 'full': False}
+            self.env.cr.postrollback.add(
+                lambda: snapshot.mark_dirty(None if read['full'] else read['ids']))
+        if policy_ids is None:
+            read['full'] = True
+        else:
+            read['ids'].update(policy_ids)
+
+    @api.model
+    def _get_plan_snapshot_changes(self, since, dirty):
+        """:return: ids de las pólizas a releer en un refresco incremental"""
+        self.env.cr.execute("""
+            SELECT id FROM pharmacy_insurance_info WHERE write_date > %(since)s
+             UNION
+            SELECT insurance_id FROM pharmacy_deductible_entry
+             WHERE NOT rolled_up AND create_date > %(since)s
+        """, {'since': since})
+        return sorted({row[0] for row in self.env.cr.fetchall()} | dirty)
+
+    @api.model
+    def _read_plan_snapshot_rows(self, policy_ids):
+        """Genera las filas del snapshot de las pólizas dadas, leídas por lotes"""
+        for chunk in split_every(self._PLAN_SNAPSHOT_BATCH, policy_ids):
+            policies = self.with_context(active_test=False).browse(chunk).exists()
+            yield from policies.read(self._PLAN_SNAPSHOT_FIELDS, load=None)
+            policies.invalidate_recordset()
+
     @api.constrains('start_date', 'end_date')
+    @profiled
     def _check_dates(self):
-        for record in self:
-            if record.end_date and record.start_date > record.end_date:
-                raise ValidationError(_('La fecha de fin no puede ser anterior a la fecha de inicio.'))
+        self._check_bulk_validation_rule(
+            'dates', lambda policy: policy.end_date and policy.start_date > policy.end_date)
+
+    def _get_bulk_validation_rules(self):
+        rules = super()._get_bulk_validation_rules()
+        rules['dates'] = (
+            SQL("end_date IS NOT NULL AND start_date > end_date"),
+            _('La fecha de fin no puede ser anterior a la fecha de inicio.'),
+        )
+        return rules
+
+    def init(self):
+        """Índice de vigencia para búsquedas de cobertura válida por paciente"""
+        sql.create_index(
+            self.env.cr,
+            'pharmacy_insurance_info_validity_idx',
+            self._table,
+            ['partner_id', 'start_date', 'end_date'],
+            where='active',
+        )
+
+    @api.model
+    def _cron_refresh_validity(self):
+        """
+        Cron diario: marca como modificadas las pólizas cuya vigencia cambió
+        desde la última ejecución (inicio o fin cruzado), para que se recalculen
+        los campos almacenados que dependen de ella.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        today = date.today()
+        last_run = fields.Date.to_date(ICP.get_param('pharmacy_base.validity_refresh_date')) \
+            or today - timedelta(days=1)
+        if last_run >= today:
+            return
+
+        changed = self.with_context(active_test=False).search([
+            '|',
+            '&', ('start_date', '>', last_run), ('start_date', '<=', today),
+            '&', ('end_date', '>=', last_run), ('end_date', '<', today),
+        ])
+        changed.modified(['start_date', 'end_date'])
+        ICP.set_param('pharmacy_base.validity_refresh_date', fields.Date.to_string(today))
+        _logger.info("Vigencia de seguros refrescada: %s pólizas cambiaron desde %s", len(changed), last_run)
 
     _sql_constraints = [
         ('policy_member_unique', 'UNIQUE(insurance_company_id, policy_number, member_id)',
@@ -0,0 +1,28 @@
+from odoo import models, api
+
+from ..tools import reset_profiling_flag, PROFILING_PARAM
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._reset_profiling_flag()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        self._reset_profiling_flag()
+        return result
+
+    def unlink(self):
+        self._reset_profiling_flag()
+        return super().unlink()
+
+    def _reset_profiling_flag(self):
+        # El cambio se ve de inmediato en este worker; los demás lo releen al
+        # vencer su valor (PROFILING_FLAG_TTL)
+        if PROFILING_PARAM in self.mapped('key'):
+            reset_profiling_flag(self.env.cr.dbname)
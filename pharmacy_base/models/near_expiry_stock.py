@@ -0,0 +1,57 @@
+from odoo import models, fields, tools
+from odoo.tools import SQL
+
+
+class PharmacyNearExpiryStock(models.Model):
+    """
+    Existencias de medicamentos por lote próximas a vencer (o vencidas), por
+    ubicación interna. Vista SQL sobre stock_quant filtrada por el tramo de
+    vencimiento del lote, que se apoya en el índice parcial de stock_lot.
+    """
+    _name = 'pharmacy.near.expiry.stock'
+    _description = 'Existencias Próximas a Vencer'
+    _auto = False
+    _order = 'expiration_date, location_id'
+
+    product_id = fields.Many2one('product.product', string='Producto', readonly=True)
+    product_tmpl_id = fields.Many2one('product.template', string='Plantilla de Producto', readonly=True)
+    lot_id = fields.Many2one('stock.lot', string='Lote', readonly=True)
+    location_id = fields.Many2one('stock.location', string='Ubicación', readonly=True)
+    warehouse_id = fields.Many2one('stock.warehouse', string='Almacén', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    quantity = fields.Float(string='Cantidad', digits='Product Unit of Measure', readonly=True)
+    reserved_quantity = fields.Float(string='Reservado', digits='Product Unit of Measure', readonly=True)
+    expiration_date = fields.Datetime(string='Fecha de Vencimiento', readonly=True)
+    expiry_bucket = fields.Selection(
+        selection=lambda self: self.env['stock.lot']._fields['expiry_bucket'].selection,
+        string='Tramo de Vencimiento',
+        readonly=True
+    )
+
+    def _query(self):
+        return SQL("""
+            SELECT sq.id AS id,
+                   sq.product_id AS product_id,
+                   pp.product_tmpl_id AS product_tmpl_id,
+                   sq.lot_id AS lot_id,
+                   sq.location_id AS location_id,
+                   sl.warehouse_id AS warehouse_id,
+                   sq.company_id AS company_id,
+                   sq.quantity AS quantity,
+                   sq.reserved_quantity AS reserved_quantity,
+                   lot.expiration_date AS expiration_date,
+                   lot.expiry_bucket AS expiry_bucket
+              FROM stock_lot lot
+              JOIN stock_quant sq ON sq.lot_id = lot.id
+              JOIN stock_location sl ON sl.id = sq.location_id
+              JOIN product_product pp ON pp.id = sq.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE lot.expiry_bucket IN ('expired', '30', '90', '180')
+               AND sl.usage = 'internal'
+               AND sq.quantity > 0
+               AND pt.is_pharmaceutical
+        """)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL("CREATE OR REPLACE VIEW %s AS (%s)", SQL.identifier(self._table), self._query()))
@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# Cambiar al modificar los campos exportados: obliga a los POS a recargar completo
+SNAPSHOT_VERSION = 2
+
+# Margen para no perder registros de transacciones concurrentes que confirman
+# después de generar el snapshot (los clientes aplican las filas por id)
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class PharmacyPosSnapshot(models.AbstractModel):
+    _name = 'pharmacy.pos.snapshot'
+    _description = 'Snapshot Offline para POS de Farmacia'
+
+    _PATIENT_FIELDS = ['name', 'patient_code', 'vat', 'phone', 'allergies', 'current_medications']
+    _INSURANCE_FIELDS = [
+        'partner_id', 'insurance_company_id', 'policy_number', 'member_id', 'plan_name',
+        'coverage_level', 'start_date', 'end_date', 'copay_default', 'coinsurance_percentage',
+        'annual_deductible', 'deductible_met', 'remaining_deductible',
+    ]
+    _PRODUCT_FIELDS = [
+        'name', 'default_code', 'barcode', 'list_price', 'active_principle', 'generic_name',
+        'brand_name', 'pharmaceutical_form', 'concentration', 'requires_prescription',
+        'requires_refrigeration',
+    ]
+
+    @api.model
+    def get_snapshot(self, cursor=None, patient_limit=1000, patient_ids=None, insurance_ids=None):
+        """
+        Devuelve los datos del caché offline del POS: pacientes recientes, sus
+        seguros y los productos farmacéuticos con existencias.
+
+        Sin cursor (o con un cursor de otra versión) devuelve la carga completa;
+        con el cursor de la llamada anterior devuelve solo lo modificado desde
+        entonces y los ids que el POS debe descartar.
+
+        En el delta, el POS envía los ids de pacientes y seguros que tiene en
+        caché: los cambios se limitan a esos pacientes y los ids que ya no
+        existen (eliminados) se informan como descartados.
+
+        :param cursor: valor 'cursor' devuelto por la llamada anterior
+        :param patient_limit: cantidad de pacientes de la carga completa
+        :param patient_ids: ids de pacientes en caché del POS (solo delta)
+        :param insurance_ids: ids de seguros en caché del POS (solo delta)
+        :return: dict con 'version', 'cursor', 'full', una tabla columnar
+                 {'fields', 'rows'} por modelo y 'removed' {tabla: [ids]}
+        """
+        since = self._parse_cursor(cursor)
+        self.env.flush_all()
+        self.env.cr.execute("SELECT now() at time zone 'UTC'")
+        new_cursor = '%s:%s' % (SNAPSHOT_VERSION, fields.Datetime.to_string(self.env.cr.fetchone()[0] - SYNC_OVERLAP))
+
+        if since:
+            patients, removed_patients = self._get_patient_delta(since, patient_ids)
+            policies, removed_policies = self._get_insurance_delta(since, patient_ids, insurance_ids)
+            products, removed_products = self._get_product_delta(since)
+        else:
+            patients = self.env['res.partner'].search(
+                [('is_patient', '=', True)], order='write_date desc, id desc', limit=patient_limit)
+            policies = self.env['pharmacy.insurance.info'].search([('partner_id', 'in', patients.ids)])
+            products = self.env['product.template'].search(
+                [('is_pharmaceutical', '=', True), ('sale_ok', '=', True)])._filter_in_stock()
+            removed_patients = removed_policies = removed_products = []
+
+        return {
+            'version': SNAPSHOT_VERSION,
+            'cursor': new_cursor,
+            'full': not since,
+            'patients': self._to_table(patients, self._PATIENT_FIELDS),
+            'insurance_info': self._to_table(policies, self._INSURANCE_FIELDS),
+            'products': self._to_table(products, self._PRODUCT_FIELDS),
+            'removed': {
+                'patients': removed_patients,
+                'insurance_info': removed_policies,
+                'products': removed_products,
+            },
+        }
+
+    @api.model
+    def _parse_cursor(self, cursor):
+        """:return: datetime del cursor, o None si hay que hacer carga completa"""
+        version, dummy, value = (cursor or '').partition(':')
+        if version != str(SNAPSHOT_VERSION) or not value:
+            return None
+        return fields.Datetime.to_datetime(value)
+
+    @api.model
+    def _to_table(self, records, field_names):
+        """Serializa en forma columnar: nombres de campo una vez y filas como listas"""
+        rows = records.read(field_names, load=None) if records else []
+        return {
+            'fields': ['id'] + field_names,
+            'rows': [[row['id']] + [row[name] for name in field_names] for row in rows],
+        }
+
+    @api.model
+    def _get_deleted_ids(self, model_name, ids):
+        """Ids de la lista que ya no existen en la base de datos"""
+        if not ids:
+            return []
+        existing = self.env[model_name].with_context(active_test=False).search([('id', 'in', ids)])
+        return sorted(set(ids) - set(existing.ids))
+
+    @api.model
+    def _get_patient_delta(self, since, patient_ids=None):
+        domain = [
+            ('write_date', '>', since),
+            '|', ('is_patient', '=', True), ('patient_code', '!=', False),
+        ]
+        if patient_ids is not None:
+            domain.append(('id', 'in', patient_ids))
+        changed = self.env['res.partner'].with_context(active_test=False).search(domain)
+        kept = changed.filtered(lambda partner: partner.active and partner.is_patient)
+        return kept, (changed - kept).ids + self._get_deleted_ids('res.partner', patient_ids)
+
+    @api.model
+    def _get_insurance_delta(self, since, patient_ids=None, insurance_ids=None):
+        # Los pagos de deducible se registran en el libro sin modificar la póliza
+        domain = ['|', ('write_date', '>', since), ('deductible_entry_ids.create_date', '>', since)]
+        if patient_ids is not None:
+            domain.append(('partner_id', 'in', patient_ids))
+        changed = self.env['pharmacy.insurance.info'].with_context(active_test=False).search(domain)
+        kept = changed.filtered('active')
+        removed = (changed - kept).ids + self._get_deleted_ids('pharmacy.insurance.info', insurance_ids)
+        if patient_ids is not None and insurance_ids:
+            # Pólizas en caché que pasaron a un paciente que el POS no tiene
+            moved = self.env['pharmacy.insurance.info'].with_context(active_test=False).search([
+                ('id', 'in', insurance_ids), ('partner_id', 'not in', patient_ids),
+            ])
+            removed += moved.ids
+        return kept, sorted(set(removed))
+
+    @api.model
+    def _get_product_delta(self, since):
+        ProductTemplate = self.env['product.template'].with_context(active_test=False)
+        # Los cambios de existencias no modifican el producto: se toman de los
+        # quants y de los movimientos realizados, ya que un quant que queda en
+        # cero se elimina y no aparecería como modificado
+        self.env.cr.execute("""
+            SELECT pp.product_tmpl_id
+              FROM stock_quant sq
+              JOIN product_product pp ON pp.id = sq.product_id
+             WHERE sq.write_date > %(since)s
+             UNION
+            SELECT pp.product_tmpl_id
+              FROM stock_move sm
+              JOIN product_product pp ON pp.id = sm.product_id
+             WHERE sm.state = 'done' AND sm.date > %(since)s
+        """, {'since': since})
+        stock_changed = [row[0] for row in self.env.cr.fetchall()]
+        changed = ProductTemplate.search([
+            ('is_pharmaceutical', '=', True),
+            '|', ('write_date', '>', since), ('id', 'in', stock_changed),
+        ])
+        kept = changed.filtered(lambda product: product.active and product.sale_ok)._filter_in_stock()
+        return kept, (changed - kept).ids
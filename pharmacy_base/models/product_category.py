@@ -1,9 +1,26 @@
+import logging
+import threading
+
 from odoo import models, fields, api
 
+from ..tools import profiled
+
+_logger = logging.getLogger(__name__)
+
+ABC_SELECTION = [
+    ('A', 'Categoría A - Alta Rotación'),
+    ('B', 'Categoría B - Rotación Media'),
+    ('C', 'Categoría C - Baja Rotación'),
+]
+
 
 class PharmacyProductCategory(models.Model):
     _inherit = 'product.category'
 
+    # Productos por lote al sincronizar requires_prescription; hasta este
+    # tamaño la sincronización se hace en la misma transacción
+    _PRESCRIPTION_SYNC_BATCH = 5000
+
     pharmaceutical_category = fields.Selection([
         ('prescription', 'Medicamento con Receta'),
         ('otc', 'Venta Libre (OTC)'),
@@ -22,18 +39,151 @@ class PharmacyProductCategory(models.Model):
         store=True
     )
 
+    prescription_sync_pending = fields.Boolean(
+        string='Sincronización de Receta Pendiente',
+        readonly=True,
+        help='Los productos de la categoría se están actualizando en segundo plano'
+    )
+
     is_controlled = fields.Boolean(
         string='Medicamento Controlado',
         help='Requiere control especial y registro'
     )
 
-    abc_classification = fields.Selection([
-        ('A', 'Categoría A - Alta Rotación'),
-        ('B', 'Categoría B - Rotación Media'),
-        ('C', 'Categoría C - Baja Rotación'),
-    ], string='Clasificación ABC', help='Clasificación por rotación de inventario')
+    abc_classification = fields.Selection(
+        ABC_SELECTION,
+        string='Clasificación ABC',
+        readonly=True,
+        help='Clasificación por rotación de inventario (la mantiene el cron de clasificación ABC)'
+    )
 
     @api.depends('pharmaceutical_category')
+    @profiled
     def _compute_requires_prescription(self):
         for record in self:
-            record.requires_prescription = record.pharmaceutical_category in ['prescription', 'controlled']
\ No newline at end of file
+            record.requires_prescription = record.pharmaceutical_category in ['prescription', 'controlled']
+
+    def write(self, vals):
+        previous = {record.id: record.requires_prescription for record in self} \
+            if 'pharmaceutical_category' in vals else {}
+        result = super().write(vals)
+        changed = self.filtered(lambda record: record.id in previous
+                                and record.requires_prescription != previous[record.id])
+        if changed:
+            changed._schedule_prescription_sync()
+        return result
+
+    def _schedule_prescription_sync(self):
+        """
+        Propaga requires_prescription a los productos de las categorías: en
+        línea si son pocos, en segundo plano por lotes si no.
+        """
+        self.flush_recordset(['requires_prescription'])
+        self.env['product.template'].flush_model(['categ_id', 'requires_prescription'])
+        pending = self._count_prescription_pending()
+        if pending <= self._PRESCRIPTION_SYNC_BATCH:
+            self._sync_requires_prescription(self._PRESCRIPTION_SYNC_BATCH)
+        else:
+            self.write({'prescription_sync_pending': True})
+            self.env.ref('pharmacy_base.ir_cron_pharmacy_prescription_sync')._trigger()
+
+    def _count_prescription_pending(self):
+        """Cantidad de productos de estas categorías con requires_prescription desactualizado"""
+        self.env.cr.execute("""
+            SELECT COUNT(*)
+              FROM product_template pt
+              JOIN product_category pc ON pc.id = pt.categ_id
+             WHERE pc.id IN %s
+               AND pt.requires_prescription IS DISTINCT FROM pc.requires_prescription
+        """, (tuple(self.ids),))
+        return self.env.cr.fetchone()[0]
+
+    def _sync_requires_prescription(self, limit):
+        """
+        Actualiza en una sola sentencia hasta `limit` productos de estas
+        categorías cuyo requires_prescription difiere del de su categoría.
+
+        :return: cantidad de productos actualizados
+        """
+        self.env.cr.execute("""
+            UPDATE product_template pt
+               SET requires_prescription = pc.requires_prescription,
+                   write_date = (now() at time zone 'UTC'),
+                   write_uid = %s
+              FROM product_category pc
+             WHERE pc.id = pt.categ_id
+               AND pt.id IN (
+                   SELECT pt2.id
+                     FROM product_template pt2
+                     JOIN product_category pc2 ON pc2.id = pt2.categ_id
+                    WHERE pc2.id IN %s
+                      AND pt2.requires_prescription IS DISTINCT FROM pc2.requires_prescription
+                    LIMIT %s
+               )
+        """, (self.env.uid, tuple(self.ids), limit))
+        count = self.env.cr.rowcount
+        self.env['product.template'].invalidate_model(['requires_prescription', 'write_date', 'write_uid'])
+        return count
+
+    @api.model
+    def _cron_sync_requires_prescription(self):
+        """
+        Cron: sincroniza por lotes los productos de las categorías
+        reclasificadas, confirmando cada lote para no bloquear la tabla.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        categories = self.search([('prescription_sync_pending', '=', True)])
+        if not categories:
+            return
+        categories.flush_recordset(['requires_prescription'])
+        self.env['product.template'].flush_model(['categ_id', 'requires_prescription'])
+
+        remaining = categories._count_prescription_pending()
+        done = 0
+        while True:
+            count = categories._sync_requires_prescription(self._PRESCRIPTION_SYNC_BATCH)
+            done += count
+            remaining = max(remaining - count, 0)
+            _logger.info("Sincronización de receta: %s productos actualizados en %s categorías, %s pendientes",
+                         done, len(categories), remaining)
+            self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
+            if auto_commit:
+                self.env.cr.commit()
+            if count < self._PRESCRIPTION_SYNC_BATCH:
+                break
+
+        categories.write({'prescription_sync_pending': False})
+
+    @api.model
+    def _rank_abc_classification(self, threshold_a, threshold_b):
+        """
+        Clasifica las categorías con productos aplicando el corte de Pareto
+        sobre la rotación total de sus productos.
+        """
+        self.env.cr.execute("""
+            UPDATE product_category pc
+               SET abc_classification = ranked.abc
+              FROM (
+                  SELECT id,
+                         CASE WHEN rotation <= 0 THEN 'C'
+                              WHEN cumulative_before < %(threshold_a)s THEN 'A'
+                              WHEN cumulative_before < %(threshold_b)s THEN 'B'
+                              ELSE 'C' END AS abc
+                    FROM (
+                        SELECT id, rotation,
+                               COALESCE(SUM(rotation) OVER (
+                                   ORDER BY rotation DESC, id
+                                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                               ), 0) * 100.0 / NULLIF(SUM(rotation) OVER (), 0) AS cumulative_before
+                          FROM (
+                              SELECT categ_id AS id, SUM(abc_rotation) AS rotation
+                                FROM product_template
+                               WHERE categ_id IS NOT NULL
+                            GROUP BY categ_id
+                          ) by_category
+                    ) cumulative
+              ) ranked
+             WHERE pc.id = ranked.id
+               AND pc.abc_classification IS DISTINCT FROM ranked.abc
+        """, {'threshold_a': threshold_a, 'threshold_b': threshold_b})
+        self.invalidate_model(['abc_classification'])
@@ -1,9 +1,22 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, tools, _
+from odoo.osv import expression
+from odoo.tools import SQL
+
+from ..tools import normalize_principle, normalize_concentration, profiled, tokenize_terms
+from .product_category import ABC_SELECTION
+
+_logger = logging.getLogger(__name__)
 
 
 class ProductTemplate(models.Model):
-    _inherit = 'product.template'
+    _inherit = ['product.template', 'pharmacy.bulk.validation.mixin']
+
+    # Campos de búsqueda farmacéutica (con índice trigram)
+    _PHARMACEUTICAL_SEARCH_FIELDS = ['active_principle', 'generic_name', 'brand_name']
 
     # Identificación Farmacéutica
     is_pharmaceutical = fields.Boolean(
@@ -12,6 +25,7 @@ class ProductTemplate(models.Model):
     )
     active_principle = fields.Char(
         string='Principio Activo',
+        index='trigram',
         help='Componente químico activo del medicamento'
     )
 
@@ -44,11 +58,13 @@ class ProductTemplate(models.Model):
     # Nomenclatura
     generic_name = fields.Char(
         string='Nombre Genérico',
+        index='trigram',
         help='Denominación Común Internacional (DCI)'
     )
 
     brand_name = fields.Char(
-        string='Nombre Comercial/Marca'
+        string='Nombre Comercial/Marca',
+        index='trigram'
     )
 
     laboratory_id = fields.Many2one(
@@ -97,19 +113,336 @@ class ProductTemplate(models.Model):
         help='Productos que se sugieren comprar juntos'
     )
 
+    copurchase_published_ids = fields.Many2many(
+        'product.template',
+        'pharmacy_copurchase_published_rel',
+        'product_tmpl_id',
+        'related_tmpl_id',
+        string='Relacionados por Compras Conjuntas',
+        readonly=True,
+        help='Productos relacionados agregados automáticamente a partir de las ventas'
+    )
+
+    # Equivalencia Terapéutica
+    equivalence_key = fields.Char(
+        string='Clave de Equivalencia',
+        compute='_compute_equivalence_key',
+        store=True,
+        index=True,
+        help='Principio activo, forma farmacéutica y concentración normalizados. '
+             'Los productos con la misma clave son intercambiables.'
+    )
+
+    principle_tokens = fields.Char(
+        string='Tokens de Principio Activo',
+        compute='_compute_principle_tokens',
+        store=True,
+        help='Principio activo y nombre genérico normalizados para el control de alergias'
+    )
+
+    # Clasificación ABC (la mantiene el cron _cron_compute_abc_classification)
+    abc_rotation = fields.Float(
+        string='Rotación ABC',
+        readonly=True,
+        copy=False,
+        help='Unidades netas entregadas a clientes dentro de la ventana de análisis'
+    )
+
+    abc_classification = fields.Selection(
+        ABC_SELECTION,
+        string='Clasificación ABC',
+        readonly=True,
+        index=True,
+        copy=False,
+        help='Clasificación por rotación de inventario'
+    )
+
     # Campos Relacionados
+    # Se sincroniza por lotes desde product.category al reclasificar una
+    # categoría (ver _sync_requires_prescription), no por dependencia del ORM
     requires_prescription = fields.Boolean(
         string='Requiere Receta',
-        related='categ_id.requires_prescription',
+        compute='_compute_requires_prescription',
         store=True,
         readonly=True
     )
 
+    @api.depends('categ_id')
+    @profiled
+    def _compute_requires_prescription(self):
+        for record in self:
+            record.requires_prescription = record.categ_id.requires_prescription
+
+    @api.depends('is_pharmaceutical', 'active_principle', 'pharmaceutical_form', 'concentration')
+    def _compute_equivalence_key(self):
+        for record in self:
+            principle = normalize_principle(record.active_principle)
+            if record.is_pharmaceutical and principle:
+                record.equivalence_key = '|'.join([
+                    principle,
+                    record.pharmaceutical_form or '',
+                    normalize_concentration(record.concentration),
+                ])
+            else:
+                record.equivalence_key = False
+
+    @api.depends('active_principle', 'generic_name')
+    def _compute_principle_tokens(self):
+        for record in self:
+            tokens = tokenize_terms(record.active_principle) | tokenize_terms(record.generic_name)
+            record.principle_tokens = '|'.join(sorted(tokens)) or False
+
+    def get_generic_alternatives(self, in_stock=True, limit=None):
+        """
+        Devuelve los productos terapéuticamente equivalentes (mismo principio
+        activo, forma y concentración), del más barato al más caro.
+
+        :param in_stock: solo productos con existencias en ubicaciones internas
+        :param limit: cantidad máxima de resultados
+        :return: recordset de product.template
+        """
+        self.ensure_one()
+        if not self.equivalence_key:
+            return self.browse()
+        alternatives = self.search([
+            ('equivalence_key', '=', self.equivalence_key),
+            ('id', '!=', self.id),
+        ], order='list_price, id')
+        if in_stock and alternatives:
+            alternatives = alternatives._filter_in_stock()
+        return alternatives[:limit] if limit else alternatives
+
+    def _filter_in_stock(self):
+        """Filtra con una sola consulta los productos con existencias internas"""
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity', 'company_id'])
+        self.env.cr.execute("""
+            SELECT pp.product_tmpl_id
+              FROM stock_quant sq
+              JOIN product_product pp ON pp.id = sq.product_id
+              JOIN stock_location sl ON sl.id = sq.location_id
+             WHERE sl.usage = 'internal'
+               AND pp.product_tmpl_id IN %s
+               AND sq.company_id IN %s
+          GROUP BY pp.product_tmpl_id
+            HAVING SUM(sq.quantity) > 0
+        """, (tuple(self.ids), tuple(self.env.companies.ids)))
+        in_stock = {row[0] for row in self.env.cr.fetchall()}
+        return self.filtered(lambda product: product.id in in_stock)
+
     @api.constrains('is_pharmaceutical', 'active_principle')
+    @profiled
     def _check_pharmaceutical_fields(self):
-        for record in self:
-            if record.is_pharmaceutical and not record.active_principle:
-                raise ValidationError(_('Los productos farmacéuticos deben tener un principio activo definido.'))
+        self._check_bulk_validation_rule(
+            'pharmaceutical_fields', lambda product: product.is_pharmaceutical and not product.active_principle)
+
+    def _get_bulk_validation_rules(self):
+        rules = super()._get_bulk_validation_rules()
+        rules['pharmaceutical_fields'] = (
+            SQL("is_pharmaceutical AND COALESCE(active_principle, '') = ''"),
+            _('Los productos farmacéuticos deben tener un principio activo definido.'),
+        )
+        return rules
+
+    def get_copurchase_suggestions(self, limit=5):
+        """
+        Productos que suelen comprarse junto con la canasta self, según la
+        matriz de compras conjuntas. La clasificación de cada producto se
+        guarda en caché junto con la fecha del último cálculo del cron, por lo
+        que una nueva ejecución la invalida sin limpiar el caché del registro.
+
+        :param limit: cantidad máxima de sugerencias
+        :return: recordset de product.template, el más frecuente primero
+        """
+        version = self.env['ir.config_parameter'].sudo().get_param('pharmacy_base.copurchase_last_run')
+        scores = defaultdict(int)
+        for product_id in self.ids:
+            for related_id, count in self._get_copurchase_ranking(product_id, version):
+                scores[related_id] += count
+        for product_id in self.ids:
+            scores.pop(product_id, None)
+        ranked = self.browse(sorted(scores, key=lambda related_id: (-scores[related_id], related_id)))
+        return ranked.exists().filtered('active')[:limit]
+
+    @tools.ormcache('product_tmpl_id', 'version')
+    def _get_copurchase_ranking(self, product_tmpl_id, version):
+        self.env['pharmacy.copurchase.pair'].flush_model()
+        self.env.cr.execute("""
+            SELECT related_id, count
+              FROM (
+                  SELECT product_b_id AS related_id, count
+                    FROM pharmacy_copurchase_pair WHERE product_a_id = %(product_id)s
+                   UNION ALL
+                  SELECT product_a_id, count
+                    FROM pharmacy_copurchase_pair WHERE product_b_id = %(product_id)s
+              ) pairs
+          ORDER BY count DESC, related_id
+             LIMIT 50
+        """, {'product_id': product_tmpl_id})
+        return tuple(self.env.cr.fetchall())
+
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        """
+        Búsqueda estándar (nombre, referencia interna, código de barras, con
+        los filtros de compañía y archivado del contexto). Con 'ilike' se
+        anteponen las coincidencias de search_pharmaceutical por principio
+        activo, nombre genérico y marca, ordenadas por similitud.
+        """
+        result = super().name_search(name, domain, operator, limit)
+        if not name or operator != 'ilike':
+            return result
+        products = self.search_pharmaceutical(name, domain=domain, limit=limit)
+        if not products:
+            return result
+        found = set(products.ids)
+        ranked = [(product.id, product.display_name) for product in products]
+        return (ranked + [item for item in result if item[0] not in found])[:limit]
+
+    @api.model
+    def search_pharmaceutical(self, term, domain=None, limit=20):
+        """
+        Búsqueda parcial e insensible a acentos por principio activo, nombre
+        genérico y marca, ordenada por similitud con el término buscado.
+
+        Usa los índices trigram de esos campos; sin la extensión pg_trgm se
+        ordena por nombre.
+
+        :param term: texto buscado (ej: "ibupro")
+        :param domain: dominio adicional opcional
+        :param limit: cantidad máxima de resultados
+        :return: recordset de product.template
+        """
+        term_domain = expression.OR([
+            [(fname, 'ilike', term)] for fname in self._PHARMACEUTICAL_SEARCH_FIELDS
+        ])
+        domain = expression.AND([domain or [], term_domain])
+        if not self.env.registry.has_trigram:
+            return self.search(domain, limit=limit)
+
+        unaccent = self.env.registry.unaccent
+        query = self._search(domain, limit=limit)
+        scores = SQL(', ').join(
+            SQL("COALESCE(similarity(%s, %s), 0)",
+                unaccent(SQL.identifier(self._table, fname)), unaccent(SQL("%s", term)))
+            for fname in self._PHARMACEUTICAL_SEARCH_FIELDS
+        )
+        query.order = SQL("GREATEST(%s) DESC, %s", scores, SQL.identifier(self._table, 'id'))
+        self.env.cr.execute(query.select())
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _cron_compute_abc_classification(self):
+        """
+        Cron: recalcula la clasificación ABC de productos y categorías.
+
+        La rotación solo se vuelve a agregar para los productos con movimientos
+        modificados desde la última ejecución o que salieron de la ventana; el
+        corte de Pareto se aplica luego con una sentencia sobre la rotación
+        almacenada y solo escribe las clasificaciones que cambian.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        window_days = int(ICP.get_param('pharmacy_base.abc_window_days', 90))
+        threshold_a = float(ICP.get_param('pharmacy_base.abc_threshold_a', 80.0))
+        threshold_b = float(ICP.get_param('pharmacy_base.abc_threshold_b', 95.0))
+        last_run = fields.Datetime.to_datetime(ICP.get_param('pharmacy_base.abc_last_run'))
+        last_window_start = fields.Datetime.to_datetime(ICP.get_param('pharmacy_base.abc_window_start'))
+
+        now = fields.Datetime.now()
+        window_start = now - timedelta(days=window_days)
+        self.env['stock.move'].flush_model(['state', 'date', 'product_id', 'product_qty',
+                                            'location_id', 'location_dest_id'])
+        self.flush_model(['abc_rotation', 'abc_classification', 'categ_id'])
+
+        incremental = bool(last_run and last_window_start and last_window_start <= window_start)
+        updated = self._update_abc_rotation(window_start, last_run, last_window_start, incremental)
+        self._rank_abc_classification(threshold_a, threshold_b)
+        self.env['product.category']._rank_abc_classification(threshold_a, threshold_b)
+
+        ICP.set_param('pharmacy_base.abc_last_run', fields.Datetime.to_string(now))
+        ICP.set_param('pharmacy_base.abc_window_start', fields.Datetime.to_string(window_start))
+        _logger.info("Clasificación ABC %s: rotación actualizada en %s productos",
+                     'incremental' if incremental else 'completa', updated)
+
+    @api.model
+    def _update_abc_rotation(self, window_start, last_run, last_window_start, incremental):
+        """
+        Agrega en SQL la rotación (salidas menos devoluciones de clientes) de
+        los productos afectados y la guarda en abc_rotation.
+
+        :return: cantidad de productos cuya rotación cambió
+        """
+        if incremental:
+            affected = """
+                SELECT DISTINCT pp.product_tmpl_id AS id
+                  FROM stock_move sm
+                  JOIN product_product pp ON pp.id = sm.product_id
+                 WHERE sm.write_date > %(last_run)s
+                    OR (sm.state = 'done' AND sm.date >= %(last_window_start)s AND sm.date < %(window_start)s)
+            """
+        else:
+            affected = """
+                SELECT id FROM product_template WHERE abc_rotation != 0
+                 UNION
+                SELECT DISTINCT pp.product_tmpl_id
+                  FROM stock_move sm
+                  JOIN product_product pp ON pp.id = sm.product_id
+                 WHERE sm.state = 'done' AND sm.date >= %(window_start)s
+            """
+        self.env.cr.execute("""
+            WITH affected AS (%s),
+            rotation AS (
+                SELECT pp.product_tmpl_id AS id,
+                       SUM(CASE WHEN dest.usage = 'customer' THEN sm.product_qty ELSE -sm.product_qty END) AS qty
+                  FROM stock_move sm
+                  JOIN product_product pp ON pp.id = sm.product_id
+                  JOIN stock_location src ON src.id = sm.location_id
+                  JOIN stock_location dest ON dest.id = sm.location_dest_id
+                 WHERE sm.state = 'done'
+                   AND sm.date >= %%(window_start)s
+                   AND (dest.usage = 'customer') != (src.usage = 'customer')
+                   AND pp.product_tmpl_id IN (SELECT id FROM affected)
+              GROUP BY pp.product_tmpl_id
+            )
+            UPDATE product_template pt
+               SET abc_rotation = GREATEST(COALESCE(rotation.qty, 0), 0)
+              FROM affected
+         LEFT JOIN rotation ON rotation.id = affected.id
+             WHERE pt.id = affected.id
+               AND pt.abc_rotation IS DISTINCT FROM GREATEST(COALESCE(rotation.qty, 0), 0)
+        """ % affected, {
+            'window_start': window_start,
+            'last_run': last_run,
+            'last_window_start': last_window_start,
+        })
+        updated = self.env.cr.rowcount
+        self.invalidate_model(['abc_rotation'])
+        return updated
+
+    @api.model
+    def _rank_abc_classification(self, threshold_a, threshold_b):
+        """Aplica el corte de Pareto sobre la rotación almacenada de los productos"""
+        self.env.cr.execute("""
+            UPDATE product_template pt
+               SET abc_classification = ranked.abc
+              FROM (
+                  SELECT id,
+                         CASE WHEN abc_rotation <= 0 THEN 'C'
+                              WHEN cumulative_before < %(threshold_a)s THEN 'A'
+                              WHEN cumulative_before < %(threshold_b)s THEN 'B'
+                              ELSE 'C' END AS abc
+                    FROM (
+                        SELECT id, abc_rotation,
+                               COALESCE(SUM(abc_rotation) OVER (
+                                   ORDER BY abc_rotation DESC, id
+                                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                               ), 0) * 100.0 / NULLIF(SUM(abc_rotation) OVER (), 0) AS cumulative_before
+                          FROM product_template
+                    ) cumulative
+              ) ranked
+             WHERE pt.id = ranked.id
+               AND pt.abc_classification IS DISTINCT FROM ranked.abc
+        """, {'threshold_a': threshold_a, 'threshold_b': threshold_b})
+        self.invalidate_model(['abc_classification'])
 
     @api.onchange('is_pharmaceutical')
     def _onchange_is_pharmaceutical(self):
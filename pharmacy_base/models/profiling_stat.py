@@ -0,0 +1,67 @@
+from odoo import models, fields, api, _
+
+from ..tools import get_profiling_stats, reset_profiling_stats
+
+
+class PharmacyProfilingStat(models.TransientModel):
+    _name = 'pharmacy.profiling.stat'
+    _description = 'Estadística de Perfilado de Farmacia'
+    _order = 'total_ms desc'
+
+    method = fields.Char(
+        string='Método',
+        readonly=True
+    )
+
+    calls = fields.Integer(
+        string='Llamadas',
+        readonly=True
+    )
+
+    queries = fields.Integer(
+        string='Consultas SQL',
+        readonly=True
+    )
+
+    avg_queries = fields.Float(
+        string='Consultas por Llamada',
+        readonly=True,
+        digits=(16, 1)
+    )
+
+    total_ms = fields.Float(
+        string='Tiempo Acumulado (ms)',
+        readonly=True,
+        digits=(16, 1)
+    )
+
+    avg_ms = fields.Float(
+        string='Tiempo Promedio (ms)',
+        readonly=True,
+        digits=(16, 2)
+    )
+
+    p95_ms = fields.Float(
+        string='p95 (ms)',
+        readonly=True,
+        digits=(16, 2)
+    )
+
+    @api.model
+    def action_open_stats(self):
+        """Carga las estadísticas del worker actual y abre la vista de lista"""
+        self.search([]).unlink()
+        self.create(get_profiling_stats())
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Perfilado de Farmacia'),
+            'res_model': self._name,
+            'view_mode': 'list',
+            'target': 'current',
+        }
+
+    @api.model
+    def action_reset_stats(self):
+        """Reinicia las estadísticas del worker actual"""
+        reset_profiling_stats()
+        return self.action_open_stats()
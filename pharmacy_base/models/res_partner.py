@@ -1,9 +1,13 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools, _
+from odoo.tools import SQL
+from odoo.osv import expression
+from datetime import date
+
+from ..tools import profiled, tokenize_terms
 
 
 class ResPartner(models.Model):
-    _inherit = 'res.partner'
+    _inherit = ['res.partner', 'pharmacy.bulk.validation.mixin']
 
     # Tipos de Partner
     is_patient = fields.Boolean(
@@ -34,6 +38,13 @@ class ResPartner(models.Model):
         help='Alergias a medicamentos o componentes'
     )
 
+    allergen_tokens = fields.Char(
+        string='Tokens de Alergias',
+        compute='_compute_allergen_tokens',
+        store=True,
+        help='Alergias normalizadas para el control de dispensación'
+    )
+
     chronic_conditions = fields.Text(
         string='Condiciones Crónicas',
         help='Enfermedades crónicas o de largo plazo'
@@ -62,11 +73,23 @@ class ResPartner(models.Model):
         ('other', 'Otra Especialidad'),
     ], string='Especialidad Médica')
 
-    prescriber_signature = fields.Binary(
+    # Las imágenes se guardan como adjuntos del filestore (direccionados por
+    # checksum, sin duplicados) y no se precargan con el resto del partner
+    prescriber_signature = fields.Image(
         string='Firma Digitalizada',
+        max_width=1024,
+        max_height=1024,
         help='Firma del médico para recetas'
     )
 
+    prescriber_signature_128 = fields.Image(
+        string='Miniatura de Firma',
+        related='prescriber_signature',
+        max_width=128,
+        max_height=128,
+        store=True
+    )
+
     # Relaciones
     insurance_info_ids = fields.One2many(
         'pharmacy.insurance.info',
@@ -74,6 +97,55 @@ class ResPartner(models.Model):
         string='Información de Seguros'
     )
 
+    # Resumen de cobertura almacenado, para listas y kanban de pacientes
+    active_policy_count = fields.Integer(
+        string='Pólizas Vigentes',
+        compute='_compute_coverage_summary',
+        store=True
+    )
+
+    best_coverage_level = fields.Selection(
+        selection=lambda self: self.env['pharmacy.insurance.info']._fields['coverage_level'].selection,
+        string='Mejor Cobertura',
+        compute='_compute_coverage_summary',
+        store=True
+    )
+
+    coverage_end_date = fields.Date(
+        string='Próximo Vencimiento',
+        compute='_compute_coverage_summary',
+        store=True,
+        help='Fecha de fin más cercana entre las pólizas vigentes'
+    )
+
+    # No depende de los pagos pendientes del libro de deducible: se refresca
+    # cuando el cron de acumulación los suma a deductible_met, para no escribir
+    # el paciente en cada venta
+    coverage_remaining_deductible = fields.Monetary(
+        string='Deducible Restante',
+        currency_field='coverage_currency_id',
+        compute='_compute_coverage_summary',
+        store=True,
+        help='Deducible restante de la póliza vigente aplicable, al último acumulado del libro de deducible'
+    )
+
+    coverage_currency_id = fields.Many2one(
+        'res.currency',
+        string='Moneda de la Cobertura',
+        compute='_compute_coverage_summary',
+        store=True
+    )
+
+    # Pólizas que determinan la cobertura vigente (id, activa, inicio, fin),
+    # incluidas las archivadas; forma parte de la clave del caché de
+    # resolve_active_coverage, de modo que un cambio de cobertura no requiere
+    # limpiar el caché del registro
+    coverage_cache_key = fields.Char(
+        string='Clave de Caché de Cobertura',
+        compute='_compute_coverage_summary',
+        store=True
+    )
+
     # Constraints
     _sql_constraints = [
         ('medical_license_unique', 'UNIQUE(medical_license)',
@@ -83,14 +155,205 @@ class ResPartner(models.Model):
     ]
 
     @api.model_create_multi
+    @profiled
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('is_patient') and not vals.get('patient_code'):
-                vals['patient_code'] = self.env['ir.sequence'].next_by_code('pharmacy.patient.code')
+        pending = [vals for vals in vals_list if vals.get('is_patient') and not vals.get('patient_code')]
+        if pending:
+            for vals, code in zip(pending, self._reserve_patient_codes(len(pending))):
+                vals['patient_code'] = code
         return super().create(vals_list)
 
+    @api.model
+    def _reserve_patient_codes(self, count):
+        """
+        Reserva de una vez `count` códigos de paciente de la secuencia
+        pharmacy.patient.code, con el mismo formato que next_by_code.
+
+        Para secuencias estándar los números se piden a PostgreSQL en una sola
+        sentencia (nextval no bloquea filas, así que es seguro entre workers y
+        tolera huecos). Las secuencias sin huecos o por rangos de fecha usan
+        next_by_code.
+
+        :param count: cantidad de códigos a reservar
+        :return: lista de códigos en orden ascendente
+        """
+        Sequence = self.env['ir.sequence']
+        sequence = Sequence.search([
+            ('code', '=', 'pharmacy.patient.code'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence or sequence.implementation != 'standard' or sequence.use_date_range:
+            return [Sequence.next_by_code('pharmacy.patient.code') for dummy in range(count)]
+
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ('ir_sequence_%03d' % sequence.id, count),
+        )
+        numbers = sorted(number for number, in self.env.cr.fetchall())
+        prefix, suffix = sequence._get_prefix_suffix()
+        return [prefix + '%%0%sd' % sequence.padding % number + suffix for number in numbers]
+
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        result = super().name_search(name, domain, operator, limit)
+        if not name or operator not in ('ilike', '='):
+            return result
+        patients = self.lookup_patient(name, domain=domain, limit=limit)
+        if not patients:
+            return result
+        found = set(patients.ids)
+        ranked = [(patient.id, patient.display_name) for patient in patients]
+        return (ranked + [item for item in result if item[0] not in found])[:limit]
+
+    @api.model
+    @api.returns('self')
+    @profiled
+    def lookup_patient(self, code, domain=None, limit=None):
+        """
+        Identifica pacientes en mostrador por código escaneado o tecleado:
+        patient_code, o member_id / policy_number de una póliza activa.
+
+        Se resuelve en una sola consulta por coincidencia exacta sobre columnas
+        indexadas. Una póliza grupal puede devolver varios pacientes.
+
+        :param code: código de paciente, ID de asegurado o número de póliza
+        :param domain: dominio adicional opcional
+        :param limit: cantidad máxima de resultados
+        :return: recordset de res.partner, primero la coincidencia por patient_code
+        """
+        code = (code or '').strip()
+        if not code:
+            return self.browse()
+        patients = self.search(expression.AND([domain or [], [
+            ('is_patient', '=', True),
+            '|',
+            ('patient_code', '=', code),
+            ('insurance_info_ids', 'any', ['|', ('member_id', '=', code), ('policy_number', '=', code)]),
+        ]]), limit=limit)
+        return patients.sorted(lambda patient: patient.patient_code != code)
+
+    @api.depends('allergies')
+    def _compute_allergen_tokens(self):
+        for record in self:
+            record.allergen_tokens = '|'.join(sorted(tokenize_terms(record.allergies))) or False
+
+    @api.depends('is_patient', 'insurance_info_ids.active', 'insurance_info_ids.start_date', 'insurance_info_ids.end_date',
+                 'insurance_info_ids.coverage_level', 'insurance_info_ids.annual_deductible',
+                 'insurance_info_ids.deductible_met', 'insurance_info_ids.currency_id')
+    def _compute_coverage_summary(self):
+        # La vigencia depende de la fecha: el cron diario de vigencia de
+        # seguros marca como modificadas las pólizas que la cambian
+        levels = [value for value, dummy in self.env['pharmacy.insurance.info']._fields['coverage_level'].selection]
+        # Solo los pacientes tienen resumen; el resto de los contactos
+        # (compañías, proveedores, usuarios) no lee sus seguros
+        others = self.filtered(lambda partner: not partner.is_patient)
+        others.update({
+            'active_policy_count': 0,
+            'best_coverage_level': False,
+            'coverage_end_date': False,
+            'coverage_remaining_deductible': 0.0,
+            'coverage_currency_id': False,
+            'coverage_cache_key': False,
+        })
+        for partner in self - others:
+            policies = partner.insurance_info_ids.filtered('is_valid')
+            current = policies.sorted(lambda policy: (policy.start_date, policy.id), reverse=True)[:1]
+            partner.active_policy_count = len(policies)
+            partner.best_coverage_level = max(filter(None, policies.mapped('coverage_level')),
+                                              key=levels.index, default=False)
+            partner.coverage_end_date = min(filter(None, policies.mapped('end_date')), default=False)
+            partner.coverage_remaining_deductible = current.annual_deductible - current.deductible_met
+            partner.coverage_currency_id = current.currency_id or self.env.company.currency_id
+            partner.coverage_cache_key = '|'.join(
+                '%s:%s:%s:%s' % (policy.id, int(policy.active), policy.start_date, policy.end_date or '')
+                for policy in partner.with_context(active_test=False).insurance_info_ids.sorted('id')
+            ) or False
+
+    def screen_allergies(self, product_tmpl_ids):
+        """
+        Verifica en una sola llamada una canasta de productos contra las
+        alergias registradas del paciente.
+
+        :param product_tmpl_ids: ids (o recordset) de product.template
+        :return: lista de dicts {'product_tmpl_id', 'product_name', 'allergens'}
+                 solo para los productos con posible alergia
+        """
+        self.ensure_one()
+        allergens = set(self.allergen_tokens.split('|')) if self.allergen_tokens else set()
+        if not allergens:
+            return []
+        products = self.env['product.template'].browse(product_tmpl_ids)
+        products.fetch(['principle_tokens', 'name'])
+        alerts = []
+        for product in products:
+            matches = allergens.intersection(product.principle_tokens.split('|')) \
+                if product.principle_tokens else set()
+            if matches:
+                alerts.append({
+                    'product_tmpl_id': product.id,
+                    'product_name': product.name,
+                    'allergens': sorted(matches),
+                })
+        return alerts
+
+    def _get_prescription_signature(self):
+        """
+        Firma del prescriptor en tamaño completo, para imprimir la receta.
+        Es el único punto que carga la imagen original.
+
+        :return: imagen en base64 o False
+        """
+        self.ensure_one()
+        if not self.is_prescriber:
+            return False
+        return self.sudo().with_context(bin_size=False).prescriber_signature
+
+    @api.returns('pharmacy.insurance.info')
+    def resolve_active_coverage(self):
+        """
+        Devuelve la póliza vigente aplicable al paciente (la de inicio más
+        reciente) o un recordset vacío si no tiene cobertura válida.
+
+        El resultado se guarda en caché por paciente, fecha y clave de
+        cobertura (coverage_cache_key): al modificar sus seguros cambia la
+        clave, sin limpiar el caché del registro en ningún worker. Un acierto
+        evita la búsqueda de pólizas, pero la clave se lee del paciente (una
+        consulta si no está ya en el caché del entorno).
+
+        :return: recordset de pharmacy.insurance.info (0 o 1 registro)
+        """
+        self.ensure_one()
+        if not self.is_patient:
+            # Sin resumen de cobertura no hay clave de caché: búsqueda directa
+            coverage_id = self._search_active_coverage_id(self.id, date.today())
+        else:
+            coverage_id = self._get_active_coverage_id(self.id, date.today(), self.coverage_cache_key)
+        return self.env['pharmacy.insurance.info'].browse(coverage_id)
+
+    @tools.ormcache('partner_id', 'today', 'cache_key')
+    def _get_active_coverage_id(self, partner_id, today, cache_key):
+        return self._search_active_coverage_id(partner_id, today)
+
+    @api.model
+    def _search_active_coverage_id(self, partner_id, today):
+        InsuranceInfo = self.env['pharmacy.insurance.info'].sudo()
+        coverage = InsuranceInfo.search(
+            [('partner_id', '=', partner_id)] + InsuranceInfo._get_valid_domain(today),
+            order='start_date desc, id desc',
+            limit=1,
+        )
+        return coverage.id
+
     @api.constrains('is_prescriber', 'medical_license')
+    @profiled
     def _check_prescriber_license(self):
-        for record in self:
-            if record.is_prescriber and not record.medical_license:
-                raise ValidationError(_('Los médicos prescriptores deben tener una cédula profesional registrada.'))
\ No newline at end of file
+        self._check_bulk_validation_rule(
+            'prescriber_license', lambda partner: partner.is_prescriber and not partner.medical_license)
+
+    def _get_bulk_validation_rules(self):
+        rules = super()._get_bulk_validation_rules()
+        rules['prescriber_license'] = (
+            SQL("is_prescriber AND COALESCE(medical_license, '') = ''"),
+            _('Los médicos prescriptores deben tener una cédula profesional registrada.'),
+        )
+        return rules
\ No newline at end of file
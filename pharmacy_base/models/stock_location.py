@@ -0,0 +1,17 @@
+from odoo import models, fields
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    # Condiciones de almacenamiento para la cadena de frío
+    is_refrigerated = fields.Boolean(
+        string='Refrigerada',
+        default=False,
+        help='Ubicación con temperatura controlada (2-8 °C)'
+    )
+
+    is_light_protected = fields.Boolean(
+        string='Protegida de la Luz',
+        default=False
+    )
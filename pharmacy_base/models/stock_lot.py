@@ -0,0 +1,109 @@
+import logging
+import threading
+from datetime import date
+
+from odoo import models, fields, api
+from odoo.tools import SQL, sql
+
+_logger = logging.getLogger(__name__)
+
+# Tramos de vencimiento: (valor, días hasta el vencimiento inclusive)
+EXPIRY_BUCKETS = [('30', 30), ('90', 90), ('180', 180)]
+
+
+class StockLot(models.Model):
+    _inherit = 'stock.lot'
+
+    # Lotes por lote de actualización (y por commit) del tramo de vencimiento
+    _EXPIRY_BUCKET_BATCH = 5000
+
+    expiry_bucket = fields.Selection([
+        ('expired', 'Vencido'),
+        ('30', 'Vence en 30 días'),
+        ('90', 'Vence en 90 días'),
+        ('180', 'Vence en 180 días'),
+        ('ok', 'Más de 180 días'),
+    ], string='Tramo de Vencimiento', readonly=True, index=True,
+        help='Se recalcula diariamente a partir de la fecha de vencimiento')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lots = super().create(vals_list)
+        lots.filtered('expiration_date')._update_expiry_buckets()
+        return lots
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'expiration_date' in vals:
+            self._update_expiry_buckets()
+        return result
+
+    @api.model
+    def _get_expiry_bucket_sql(self, today):
+        """Expresión SQL del tramo de vencimiento de un lote a la fecha dada"""
+        cases = SQL(' ').join(
+            SQL("WHEN expiration_date::date <= %s THEN %s", fields.Date.add(today, days=days), bucket)
+            for bucket, days in EXPIRY_BUCKETS
+        )
+        return SQL(
+            "CASE WHEN expiration_date IS NULL THEN NULL "
+            "WHEN expiration_date::date < %s THEN 'expired' %s ELSE 'ok' END",
+            today, cases,
+        )
+
+    def _update_expiry_buckets(self, limit=None, today=None):
+        """
+        Actualiza en una sola sentencia el tramo de vencimiento de los lotes
+        que cambiaron de tramo (de self, o de todos si self está vacío).
+
+        :param limit: cantidad máxima de lotes a actualizar
+        :return: cantidad de lotes actualizados
+        """
+        bucket = self._get_expiry_bucket_sql(today or date.today())
+        self.flush_model(['expiration_date', 'expiry_bucket'])
+        self.env.cr.execute(SQL("""
+            UPDATE stock_lot lot
+               SET expiry_bucket = changed.bucket
+              FROM (
+                  SELECT id, %(bucket)s AS bucket
+                    FROM stock_lot
+                   WHERE %(bucket)s IS DISTINCT FROM expiry_bucket
+                     %(ids)s
+                   LIMIT %(limit)s
+              ) changed
+             WHERE lot.id = changed.id
+        """, bucket=bucket, limit=limit,
+            ids=SQL("AND id = ANY(%s)", self.ids) if self else SQL()))
+        count = self.env.cr.rowcount
+        self.invalidate_model(['expiry_bucket'])
+        return count
+
+    @api.model
+    def _cron_update_expiry_buckets(self):
+        """
+        Cron diario: recalcula en SQL el tramo de vencimiento de los lotes que
+        cambiaron de tramo, por lotes confirmados uno a uno.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        done = 0
+        while True:
+            count = self.browse()._update_expiry_buckets(limit=self._EXPIRY_BUCKET_BATCH)
+            done += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < self._EXPIRY_BUCKET_BATCH:
+                break
+        _logger.info("Tramos de vencimiento actualizados en %s lotes", done)
+        self.env['ir.cron']._notify_progress(done=done, remaining=0)
+
+    def init(self):
+        """Índice de lotes próximos a vencer y tramo de los lotes existentes"""
+        sql.create_index(
+            self.env.cr,
+            'stock_lot_near_expiry_idx',
+            self._table,
+            ['expiry_bucket', 'expiration_date'],
+            where="expiry_bucket IN ('expired', '30', '90', '180')",
+        )
+        # Al instalar o actualizar, sin esperar a la primera ejecución del cron
+        self.browse()._update_expiry_buckets()
@@ -0,0 +1,26 @@
+from odoo import models, _
+
+
+class StockMoveLine(models.Model):
+    _inherit = 'stock.move.line'
+
+    def _get_cold_chain_violations(self):
+        """
+        Líneas cuyo destino interno no cumple las condiciones de almacenamiento
+        del producto (refrigeración o protección de la luz).
+
+        :return: lista de tuplas (línea, mensaje)
+        """
+        violations = []
+        for line in self:
+            location = line.location_dest_id
+            product = line.product_id
+            if location.usage != 'internal':
+                continue
+            if product.requires_refrigeration and not location.is_refrigerated:
+                violations.append((line, _('%(product)s requiere refrigeración y se ubica en %(location)s',
+                                           product=product.display_name, location=location.display_name)))
+            if product.photosensitive and not location.is_light_protected:
+                violations.append((line, _('%(product)s es fotosensible y se ubica en %(location)s',
+                                           product=product.display_name, location=location.display_name)))
+        return violations
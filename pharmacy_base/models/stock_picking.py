@@ -0,0 +1,24 @@
+from odoo import models, fields, api
+
+
+class StockPicking(models.Model):
+    _inherit = 'stock.picking'
+
+    cold_chain_alert = fields.Text(
+        string='Alerta de Cadena de Frío',
+        compute='_compute_cold_chain_alert',
+        help='Productos cuya ubicación de destino no cumple sus condiciones de almacenamiento'
+    )
+
+    # Lo marca el cron de compras conjuntas al sumar la entrega a la matriz
+    copurchase_counted = fields.Boolean(
+        string='Incluida en Compras Conjuntas',
+        readonly=True,
+        copy=False
+    )
+
+    @api.depends('move_line_ids.location_dest_id', 'move_line_ids.product_id')
+    def _compute_cold_chain_alert(self):
+        for picking in self:
+            violations = picking.move_line_ids._get_cold_chain_violations()
+            picking.cold_chain_alert = '\n'.join(message for line, message in violations) or False
@@ -0,0 +1,72 @@
+from odoo import models, fields, api
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def _get_removal_strategy(self, product_id, location_id):
+        # Los medicamentos con vencimiento se reservan primero los que vencen
+        # antes (FEFO) cuando FIFO es solo la estrategia por defecto: una
+        # estrategia configurada en la categoría o en la ubicación se respeta
+        strategy = super()._get_removal_strategy(product_id, location_id)
+        product = product_id.sudo()
+        if strategy != 'fifo' or not (product.is_pharmaceutical and product.use_expiration_date):
+            return strategy
+        if product.categ_id.removal_strategy_id:
+            return strategy
+        location = location_id.sudo()
+        while location:
+            if location.removal_strategy_id:
+                return strategy
+            location = location.location_id
+        return 'fefo'
+
+    @api.model
+    def get_fefo_lots(self, product_id, location_id, quantity=None):
+        """
+        Lotes disponibles de un producto en una ubicación (y sus hijas) en
+        orden FEFO, excluyendo los vencidos, en una sola consulta. Solo
+        consulta: la reserva la hace el flujo estándar de stock.move
+        (_action_assign), que usa la estrategia FEFO de _get_removal_strategy.
+
+        :param product_id: id de product.product
+        :param location_id: id de stock.location
+        :param quantity: si se indica, solo los lotes necesarios para cubrirla
+        :return: lista de dicts {'lot_id', 'lot_name', 'expiration_date', 'available'}
+        """
+        location = self.env['stock.location'].browse(location_id)
+        self.flush_model(['product_id', 'location_id', 'lot_id', 'quantity', 'reserved_quantity'])
+        self.env['stock.lot'].flush_model(['name', 'expiration_date'])
+        self.env.cr.execute("""
+            SELECT lot.id, lot.name, lot.expiration_date,
+                   SUM(sq.quantity - sq.reserved_quantity) AS available
+              FROM stock_quant sq
+              JOIN stock_location sl ON sl.id = sq.location_id
+              JOIN stock_lot lot ON lot.id = sq.lot_id
+             WHERE sq.product_id = %(product_id)s
+               AND sl.parent_path LIKE %(parent_path)s
+               AND sl.usage = 'internal'
+               AND (lot.expiration_date IS NULL OR lot.expiration_date >= %(now)s)
+          GROUP BY lot.id
+            HAVING SUM(sq.quantity - sq.reserved_quantity) > 0
+          ORDER BY lot.expiration_date NULLS LAST, lot.id
+        """, {
+            'product_id': product_id,
+            'parent_path': '%s%%' % location.parent_path,
+            'now': fields.Datetime.now(),
+        })
+        lots = []
+        remaining = quantity
+        for lot_id, lot_name, expiration_date, available in self.env.cr.fetchall():
+            lots.append({
+                'lot_id': lot_id,
+                'lot_name': lot_name,
+                'expiration_date': expiration_date,
+                'available': available,
+            })
+            if remaining is not None:
+                remaining -= available
+                if remaining <= 0:
+                    break
+        return lots
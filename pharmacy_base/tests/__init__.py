@@ -1,3 +1,13 @@
 from . import test_product_template
 from . import test_res_partner
-from . import test_insurance_info
\ No newline at end of file
+from . import test_insurance_info
+from . import test_import_job
+from . import test_abc_classification
+from . import test_benchmark
+from . import test_profiling
+from . import test_pos_snapshot
+from . import test_cold_chain
+from . import test_copurchase
+from . import test_near_expiry
+from . import test_load_simulator
+from . import test_counter
\ No newline at end of file
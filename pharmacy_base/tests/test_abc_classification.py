@@ -0,0 +1,73 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAbcClassification(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ProductTemplate = cls.env['product.template']
+        cls.stock_location = cls.env.ref('stock.stock_location_stock')
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+
+        cls.category = cls.env['product.category'].create({
+            'name': 'ABC Category',
+            'pharmaceutical_category': 'otc',
+        })
+        cls.products = cls.ProductTemplate.create([{
+            'name': 'ABC Product %s' % i,
+            'categ_id': cls.category.id,
+            'is_storable': True,
+        } for i in range(4)])
+
+    def _deliver(self, product, quantity):
+        """Entrega `quantity` unidades del producto a clientes"""
+        variant = product.product_variant_id
+        self.env['stock.quant']._update_available_quantity(variant, self.stock_location, quantity)
+        move = self.env['stock.move'].create({
+            'name': 'ABC Delivery',
+            'product_id': variant.id,
+            'product_uom_qty': quantity,
+            'product_uom': variant.uom_id.id,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.customer_location.id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.quantity = quantity
+        move.picked = True
+        move._action_done()
+        return move
+
+    def test_pareto_classification(self):
+        """Test corte de Pareto a partir de la rotación de movimientos"""
+        top, middle, low, idle = self.products
+        # Volúmenes grandes para que la rotación de otros productos no influya
+        self._deliver(top, 860000)
+        self._deliver(middle, 100000)
+        self._deliver(low, 40000)
+
+        self.ProductTemplate._cron_compute_abc_classification()
+
+        self.assertEqual(top.abc_rotation, 860000)
+        self.assertEqual(top.abc_classification, 'A')
+        self.assertEqual(middle.abc_classification, 'B')
+        self.assertEqual(low.abc_classification, 'C')
+        self.assertEqual(idle.abc_classification, 'C')
+        self.assertTrue(self.category.abc_classification)
+
+    def test_incremental_run(self):
+        """Test que una ejecución incremental incorpora nuevos movimientos"""
+        top, middle, low, idle = self.products
+        self._deliver(top, 100)
+        self.ProductTemplate._cron_compute_abc_classification()
+        self.assertEqual(top.abc_rotation, 100)
+
+        self._deliver(idle, 5000000)
+        self.env['ir.config_parameter'].sudo().set_param('pharmacy_base.abc_last_run', '2000-01-01 00:00:00')
+        self.ProductTemplate._cron_compute_abc_classification()
+
+        self.assertEqual(idle.abc_rotation, 5000000)
+        self.assertEqual(idle.abc_classification, 'A')
+        self.assertEqual(top.abc_rotation, 100)
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import config, split_every
+
+_logger = logging.getLogger(__name__)
+
+# Volúmenes de referencia; PHARMACY_BENCH_SCALE permite reducirlos (ej: 0.1)
+SCALE = float(os.environ.get('PHARMACY_BENCH_SCALE', 1.0))
+PATIENTS = int(100000 * SCALE)
+POLICIES_PER_PATIENT = 3
+PRODUCTS = int(150000 * SCALE)
+
+# Tolerancias antes de considerar una regresión
+TIME_TOLERANCE = float(os.environ.get('PHARMACY_BENCH_TIME_TOLERANCE', 1.25))
+QUERY_TOLERANCE = float(os.environ.get('PHARMACY_BENCH_QUERY_TOLERANCE', 1.10))
+
+# Fuera del módulo instalado, que puede ser de solo lectura
+BASELINE_PATH = os.environ.get(
+    'PHARMACY_BENCH_BASELINE',
+    os.path.join(config['data_dir'], 'pharmacy_base', 'benchmark_baseline.json'),
+)
+
+PRINCIPLES = [
+    'Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Losartán', 'Metformina', 'Omeprazol',
+    'Atorvastatina', 'Enalapril', 'Salbutamol', 'Loratadina', 'Diclofenaco', 'Naproxeno',
+    'Azitromicina', 'Ciprofloxacino', 'Clonazepam', 'Sertralina', 'Levotiroxina', 'Prednisona',
+]
+FORMS = ['tableta', 'capsula', 'jarabe', 'suspension', 'inyectable', 'gotas']
+
+
+@tagged('pharmacy_benchmark', '-standard', 'post_install', '-at_install')
+class TestPharmacyBenchmark(TransactionCase):
+    """
+    Benchmark de los caminos críticos de pharmacy_base a volumen realista.
+
+    No corre con la suite estándar; ejecutar con:
+        --test-tags pharmacy_benchmark
+    La primera ejecución (o PHARMACY_BENCH_UPDATE=1) graba la línea base en
+    BASELINE_PATH; las siguientes fallan si el tiempo o la cantidad de
+    consultas de alguna operación supera la tolerancia.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+        rng = random.Random(42)
+        Partner = cls.env['res.partner']
+        InsuranceInfo = cls.env['pharmacy.insurance.info']
+        today = date.today()
+
+        started = time.perf_counter()
+        cls.companies = Partner.create([
+            {'name': 'Bench Insurance %s' % i, 'is_company': True} for i in range(20)
+        ])
+        cls.patients = Partner.browse()
+        for chunk in split_every(5000, range(PATIENTS)):
+            cls.patients |= Partner.create([{'name': 'Bench Patient %s' % i, 'is_patient': True} for i in chunk])
+
+        policy_ids = []
+        for chunk in split_every(2000, cls.patients.ids):
+            vals_list = []
+            for patient_id in chunk:
+                for n in range(POLICIES_PER_PATIENT):
+                    start = today - timedelta(days=rng.randint(-30, 720))
+                    vals_list.append({
+                        'partner_id': patient_id,
+                        'insurance_company_id': rng.choice(cls.companies.ids),
+                        'policy_number': 'BENCH-POL-%s-%s' % (patient_id, n),
+                        'member_id': 'BENCH-MEM-%s-%s' % (patient_id, n),
+                        'plan_name': 'Plan Bench',
+                        'start_date': start,
+                        'end_date': rng.choice([False, start + timedelta(days=365)]),
+                        'copay_default': rng.choice([0.0, 5.0, 10.0]),
+                        'coinsurance_percentage': rng.choice([0.0, 10.0, 20.0]),
+                        'annual_deductible': rng.choice([0.0, 200.0, 500.0]),
+                        'deductible_met': rng.choice([0.0, 100.0, 500.0]),
+                    })
+            policy_ids += InsuranceInfo.create(vals_list).ids
+        cls.policies = InsuranceInfo.browse(policy_ids)
+
+        cls.categories = cls.env['product.category'].create([
+            {'name': 'Bench Category %s' % i, 'pharmaceutical_category': rng.choice(['prescription', 'otc'])}
+            for i in range(50)
+        ])
+        product_ids = []
+        for chunk in split_every(5000, range(PRODUCTS)):
+            vals_list = []
+            for i in chunk:
+                principle = rng.choice(PRINCIPLES)
+                vals_list.append({
+                    'name': '%s Bench %s' % (principle, i),
+                    'is_pharmaceutical': True,
+                    'active_principle': principle,
+                    'generic_name': principle,
+                    'brand_name': 'Marca %s' % (i % 997),
+                    'pharmaceutical_form': rng.choice(FORMS),
+                    'concentration': '%smg' % rng.choice([5, 10, 50, 250, 500]),
+                    'categ_id': rng.choice(cls.categories.ids),
+                    'list_price': rng.uniform(1, 100),
+                })
+            product_ids += cls.env['product.template'].create(vals_list).ids
+        cls.products = cls.env['product.template'].browse(product_ids)
+        cls.env.flush_all()
+        cls.env.invalidate_all()
+        _logger.info("Benchmark: datos generados en %.1fs (%s pacientes, %s pólizas, %s productos)",
+                     time.perf_counter() - started, len(cls.patients), len(cls.policies), len(cls.products))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._check_baseline()
+        super().tearDownClass()
+
+    @classmethod
+    def _check_baseline(cls):
+        if not cls.results:
+            return
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as baseline_file:
+                baseline = json.load(baseline_file)
+        key = 'scale_%s' % SCALE
+
+        if os.environ.get('PHARMACY_BENCH_UPDATE') or key not in baseline:
+            baseline[key] = cls.results
+            os.makedirs(os.path.dirname(os.path.abspath(BASELINE_PATH)), exist_ok=True)
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            _logger.info("Benchmark: línea base grabada en %s", BASELINE_PATH)
+            return
+
+        regressions = []
+        for name, result in sorted(cls.results.items()):
+            reference = baseline[key].get(name)
+            if not reference:
+                continue
+            if result['seconds'] > reference['seconds'] * TIME_TOLERANCE:
+                regressions.append('%s: %.3fs (línea base %.3fs)' % (name, result['seconds'], reference['seconds']))
+            if result['queries'] > reference['queries'] * QUERY_TOLERANCE + 2:
+                regressions.append('%s: %s consultas (línea base %s)' % (name, result['queries'], reference['queries']))
+        if regressions:
+            raise AssertionError('Regresiones de rendimiento:\n' + '\n'.join(regressions))
+
+    @contextmanager
+    def _measure(self, name):
+        """Mide tiempo de pared y cantidad de consultas SQL de un bloque"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.env.cr.sql_log_count
+        started = time.perf_counter()
+        yield
+        self.env.flush_all()
+        result = {
+            'seconds': round(time.perf_counter() - started, 4),
+            'queries': self.env.cr.sql_log_count - queries,
+        }
+        type(self).results[name] = result
+        _logger.info("Benchmark %s: %.3fs, %s consultas", name, result['seconds'], result['queries'])
+
+    def test_calculate_patient_cost(self):
+        rng = random.Random(1)
+        basket = [(rng.choice(self.policies.ids), rng.uniform(1, 300)) for i in range(40)]
+        claims = [(rng.choice(self.policies.ids), rng.uniform(1, 300)) for i in range(10000)]
+        InsuranceInfo = self.env['pharmacy.insurance.info']
+
+        with self._measure('calculate_patient_cost_basket_scalar'):
+            for policy_id, amount in basket:
+                InsuranceInfo.browse(policy_id).calculate_patient_cost(amount)
+        with self._measure('calculate_patient_cost_basket_batch'):
+            InsuranceInfo.calculate_patient_cost_batch(basket)
+        with self._measure('calculate_patient_cost_claims_batch'):
+            InsuranceInfo.calculate_patient_cost_batch(claims)
+
+        simulation = [(rng.choice(self.policies.ids), rng.uniform(1, 300)) for i in range(int(1000000 * SCALE))]
+        policy_ids = [line[0] for line in simulation]
+        amounts = [line[1] for line in simulation]
+        with self._measure('plan_snapshot_load'):
+            InsuranceInfo._get_plan_snapshot()
+        with self._measure('calculate_patient_cost_columnar_simulation'):
+            InsuranceInfo._calculate_patient_cost_columnar(policy_ids, amounts)
+
+    def test_create_patients(self):
+        with self._measure('res_partner_create_patients_5000'):
+            self.env['res.partner'].create([
+                {'name': 'Bench Walk-in %s' % i, 'is_patient': True} for i in range(5000)
+            ])
+
+    def test_is_valid(self):
+        with self._measure('insurance_is_valid_compute'):
+            self.policies.mapped('is_valid')
+        with self._measure('insurance_is_valid_search'):
+            self.env['pharmacy.insurance.info'].search_count([('is_valid', '=', True)])
+        with self._measure('resolve_active_coverage_1000'):
+            for patient in self.patients[:1000]:
+                patient.resolve_active_coverage()
+
+    def test_patient_lookup(self):
+        rng = random.Random(2)
+        Partner = self.env['res.partner']
+        patients = self.patients.browse(rng.sample(self.patients.ids, 300))
+        policies = self.policies.browse(rng.sample(self.policies.ids, 300))
+        codes = patients.mapped('patient_code') + policies.mapped('member_id') + policies.mapped('policy_number')
+        rng.shuffle(codes)
+        with self._measure('patient_lookup_900'):
+            for code in codes:
+                Partner.lookup_patient(code)
+        with self._measure('patient_name_search_by_code_100'):
+            for code in codes[:100]:
+                Partner.name_search(code, limit=8)
+
+    def test_catalog_search(self):
+        ProductTemplate = self.env['product.template']
+        with self._measure('catalog_search_pharmaceutical'):
+            for term in ('ibupro', 'paracet', 'amoxi', 'marca 12', 'losartan'):
+                ProductTemplate.search_pharmaceutical(term, limit=20)
+        with self._measure('catalog_name_search'):
+            for term in ('ibupro', 'paracet', 'amoxi'):
+                ProductTemplate.name_search(term, limit=20)
+
+    def test_category_reclassification(self):
+        category = self.categories[0]
+        new_category = 'otc' if category.pharmaceutical_category == 'prescription' else 'prescription'
+        with self._measure('category_reclassification'):
+            category.pharmaceutical_category = new_category
+            self.env['product.category']._cron_sync_requires_prescription()
@@ -0,0 +1,82 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestColdChain(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ColdChainStock = cls.env['pharmacy.cold.chain.stock']
+        cls.stock_location = cls.env.ref('stock.stock_location_stock')
+        cls.Location = cls.env['stock.location']
+
+        cls.fridge = cls.Location.create({
+            'name': 'Refrigerador',
+            'location_id': cls.stock_location.id,
+            'usage': 'internal',
+            'is_refrigerated': True,
+        })
+        cls.fridge_shelf = cls.Location.create({
+            'name': 'Estante 1',
+            'location_id': cls.fridge.id,
+            'usage': 'internal',
+            'is_refrigerated': True,
+        })
+        cls.shelf = cls.Location.create({
+            'name': 'Góndola',
+            'location_id': cls.stock_location.id,
+            'usage': 'internal',
+        })
+
+        cls.insulin = cls.env['product.template'].create({
+            'name': 'Insulina Test',
+            'is_storable': True,
+            'requires_refrigeration': True,
+        }).product_variant_id
+        cls.aspirin = cls.env['product.template'].create({
+            'name': 'Aspirina Test',
+            'is_storable': True,
+        }).product_variant_id
+
+        Quant = cls.env['stock.quant']
+        Quant._update_available_quantity(cls.insulin, cls.fridge, 10)
+        Quant._update_available_quantity(cls.insulin, cls.fridge_shelf, 5)
+        Quant._update_available_quantity(cls.insulin, cls.shelf, 2)
+        Quant._update_available_quantity(cls.aspirin, cls.fridge, 50)
+
+    def test_cold_chain_report(self):
+        """Test que el reporte lista solo productos de cadena de frío y marca ubicaciones inadecuadas"""
+        rows = self.ColdChainStock.search([('product_id', 'in', (self.insulin | self.aspirin).ids)])
+        self.assertEqual(rows.product_id, self.insulin)
+        self.assertEqual(sum(rows.mapped('quantity')), 17)
+        self.assertEqual(rows.filtered('storage_violation').location_id, self.shelf)
+
+    def test_excursion_stock(self):
+        """Test existencias afectadas por una falla del refrigerador"""
+        affected = self.ColdChainStock.get_excursion_stock(self.fridge.ids)
+        affected = [row for row in affected if row['product_id'][0] == self.insulin.id]
+        self.assertEqual(sorted(row['quantity'] for row in affected), [5, 10])
+
+    def test_putaway_alert(self):
+        """Test aviso de ubicación de destino inadecuada en una transferencia"""
+        picking_type = self.env.ref('stock.picking_type_internal')
+        picking = self.env['stock.picking'].create({
+            'picking_type_id': picking_type.id,
+            'location_id': self.fridge.id,
+            'location_dest_id': self.shelf.id,
+            'move_ids': [(0, 0, {
+                'name': 'Insulina',
+                'product_id': self.insulin.id,
+                'product_uom_qty': 3,
+                'product_uom': self.insulin.uom_id.id,
+                'location_id': self.fridge.id,
+                'location_dest_id': self.shelf.id,
+            })],
+        })
+        picking.action_confirm()
+        picking.action_assign()
+        self.assertIn('Insulina Test', picking.cold_chain_alert)
+
+        picking.move_line_ids.location_dest_id = self.fridge_shelf
+        self.assertFalse(picking.cold_chain_alert)
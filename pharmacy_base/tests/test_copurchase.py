@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestCopurchase(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Pair = cls.env['pharmacy.copurchase.pair']
+        cls.stock_location = cls.env.ref('stock.stock_location_stock')
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+        cls.picking_type = cls.env.ref('stock.picking_type_out')
+
+        cls.products = cls.env['product.template'].create([{
+            'name': 'Copurchase Product %s' % i,
+            'is_storable': True,
+        } for i in range(4)])
+
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('pharmacy_base.copurchase_top_n', 1)
+        ICP.set_param('pharmacy_base.copurchase_min_count', 1)
+        ICP.set_param('pharmacy_base.copurchase_last_run', '2000-01-01 00:00:00')
+
+    def _sell(self, products):
+        """Entrega a un cliente una unidad de cada producto en una sola transferencia"""
+        picking = self.env['stock.picking'].create({
+            'picking_type_id': self.picking_type.id,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.customer_location.id,
+            'move_ids': [(0, 0, {
+                'name': product.name,
+                'product_id': product.product_variant_id.id,
+                'product_uom_qty': 1,
+                'product_uom': product.uom_id.id,
+                'location_id': self.stock_location.id,
+                'location_dest_id': self.customer_location.id,
+            }) for product in products],
+        })
+        for product in products:
+            self.env['stock.quant']._update_available_quantity(
+                product.product_variant_id, self.stock_location, 1)
+        picking.action_confirm()
+        picking.action_assign()
+        picking.move_ids.picked = True
+        picking.move_ids._action_done()
+        return picking
+
+    def test_incremental_related_products(self):
+        """Test pares incrementales y publicación del top en productos relacionados"""
+        a, b, c, d = self.products
+        a.related_products_ids = d
+        pickings = self._sell(a | b) | self._sell(a | b) | self._sell(a | c)
+        self.Pair._cron_compute_copurchase()
+
+        pair = self.Pair.search([('product_a_id', '=', a.id), ('product_b_id', '=', b.id)])
+        self.assertEqual(pair.count, 2)
+        self.assertEqual(a.related_products_ids, b | d)
+        self.assertEqual(a.copurchase_published_ids, b)
+        self.assertEqual(a.get_copurchase_suggestions(), b | c)
+
+        # Solo las nuevas entregas se suman; C pasa a ser el más comprado con A
+        now = fields.Datetime.now()
+        self.env.cr.execute("UPDATE stock_move SET date = %s WHERE id IN %s",
+                            (now - timedelta(hours=2), tuple(pickings.move_ids.ids)))
+        self.env['ir.config_parameter'].sudo().set_param(
+            'pharmacy_base.copurchase_last_run', fields.Datetime.to_string(now - timedelta(hours=1)))
+        self._sell(a | c)
+        self._sell(a | c)
+        self.Pair._cron_compute_copurchase()
+
+        self.assertEqual(pair.count, 2)
+        self.assertEqual(a.related_products_ids, c | d)
+        self.assertEqual(a.copurchase_published_ids, c)
+        self.assertEqual(a.get_copurchase_suggestions(limit=1), c)
+        self.assertEqual((a | c).get_copurchase_suggestions(), b)
+
+    def test_late_commit_counted_once(self):
+        """Test que una entrega confirmada después de la ejecución se suma una sola vez"""
+        a, b = self.products[:2]
+        self.Pair._cron_compute_copurchase()
+        last_run = fields.Datetime.to_datetime(
+            self.env['ir.config_parameter'].sudo().get_param('pharmacy_base.copurchase_last_run'))
+
+        # Validada antes de la ejecución anterior pero confirmada después
+        picking = self._sell(a | b)
+        self.env.cr.execute("UPDATE stock_move SET date = %s WHERE id IN %s",
+                            (last_run - timedelta(minutes=10), tuple(picking.move_ids.ids)))
+        self.Pair._cron_compute_copurchase()
+        pair = self.Pair.search([('product_a_id', '=', a.id), ('product_b_id', '=', b.id)])
+        self.assertEqual(pair.count, 1)
+        self.assertTrue(picking.copurchase_counted)
+
+        self.Pair._cron_compute_copurchase()
+        self.assertEqual(pair.count, 1)
@@ -0,0 +1,114 @@
+from datetime import date
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestCounter(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Counter = cls.env['pharmacy.counter']
+        Partner = cls.env['res.partner']
+        cls.patient = Partner.create({
+            'name': 'Paciente Mostrador',
+            'is_patient': True,
+            'allergies': 'Penicilina',
+        })
+        cls.uninsured = Partner.create({'name': 'Paciente Sin Seguro', 'is_patient': True})
+        insurance_company = Partner.create({'name': 'Aseguradora Mostrador', 'is_company': True})
+        cls.policy = cls.env['pharmacy.insurance.info'].create({
+            'partner_id': cls.patient.id,
+            'insurance_company_id': insurance_company.id,
+            'policy_number': 'MOST-001',
+            'member_id': 'MOST-M-001',
+            'plan_name': 'Plan Mostrador',
+            'start_date': date.today(),
+            'coinsurance_percentage': 20.0,
+        })
+
+        prescription_category = cls.env['product.category'].create({
+            'name': 'Mostrador Receta',
+            'pharmaceutical_category': 'prescription',
+        })
+        ProductTemplate = cls.env['product.template']
+        cls.penicillin = ProductTemplate.create({
+            'name': 'Penicilina Mostrador',
+            'is_pharmaceutical': True,
+            'active_principle': 'Penicilina G benzatínica',
+            'categ_id': prescription_category.id,
+            'list_price': 40.0,
+        }).product_variant_id
+        cls.paracetamol = ProductTemplate.create({
+            'name': 'Paracetamol Mostrador',
+            'is_pharmaceutical': True,
+            'active_principle': 'Paracetamol',
+            'list_price': 5.0,
+        }).product_variant_id
+
+    def test_counter_quote(self):
+        """Test cotización de una canasta en una sola llamada"""
+        quote = self.Counter.get_counter_quote(self.policy.member_id, [
+            (self.penicillin.id, 1, 100.0),
+            (self.paracetamol.id, 2, None),
+        ])
+        self.assertEqual(quote['patient']['id'], self.patient.id)
+        self.assertEqual(quote['coverage']['id'], self.policy.id)
+        self.assertTrue(quote['requires_prescription'])
+
+        penicillin, paracetamol = quote['lines']
+        self.assertTrue(penicillin['requires_prescription'])
+        self.assertFalse(paracetamol['requires_prescription'])
+        self.assertEqual(penicillin['allergens'], ['penicilina'])
+        self.assertEqual(paracetamol['allergens'], [])
+        self.assertEqual(paracetamol['amount'], 10.0)
+
+        # Mismo reparto que calculate_patient_cost línea por línea
+        for line in quote['lines']:
+            expected = self.policy.calculate_patient_cost(line['amount'])
+            self.assertAlmostEqual(line['patient_pays'], expected['patient_pays'])
+            self.assertAlmostEqual(line['insurance_pays'], expected['insurance_pays'])
+        self.assertAlmostEqual(quote['totals']['amount'], 110.0)
+        self.assertAlmostEqual(quote['totals']['patient_pays'] + quote['totals']['insurance_pays'], 110.0)
+
+    def test_counter_quote_without_coverage(self):
+        """Test que sin cobertura vigente paga todo el paciente"""
+        quote = self.Counter.get_counter_quote(self.uninsured.id, [(self.paracetamol.id, 1, 5.0)])
+        self.assertEqual(quote['patient']['id'], self.uninsured.id)
+        self.assertFalse(quote['coverage'])
+        self.assertEqual(quote['totals']['patient_pays'], 5.0)
+        self.assertEqual(quote['totals']['insurance_pays'], 0.0)
+
+    def test_counter_quote_input_checks(self):
+        """Test ids como texto, booleanos y productos inexistentes"""
+        missing_id = self.env['product.product'].search([], order='id desc', limit=1).id + 1000
+        quote = self.Counter.get_counter_quote(str(self.uninsured.id), [
+            (self.paracetamol.id, 1, 5.0),
+            (missing_id, 1, 7.0),
+        ])
+        self.assertEqual(quote['patient']['id'], self.uninsured.id)
+        self.assertEqual([line['product_id'] for line in quote['lines']], [self.paracetamol.id])
+        self.assertEqual(quote['unknown_product_ids'], [missing_id])
+        self.assertEqual(quote['totals']['amount'], 5.0)
+
+        quote = self.Counter.get_counter_quote(True, [(self.paracetamol.id, 1, 5.0)])
+        self.assertFalse(quote['patient'])
+        self.assertFalse(quote['candidates'])
+
+    def test_counter_quote_queries(self):
+        """Test que la cantidad de consultas no depende de la cantidad de líneas"""
+        self.Counter.get_counter_quote(self.patient.patient_code, [(self.paracetamol.id, 1, 5.0)])
+        self.env.invalidate_all()
+        self.env.registry.clear_cache()
+        queries = self.env.cr.sql_log_count
+        self.Counter.get_counter_quote(self.patient.patient_code, [(self.paracetamol.id, 1, 5.0)])
+        one_line = self.env.cr.sql_log_count - queries
+
+        self.env.invalidate_all()
+        self.env.registry.clear_cache()
+        queries = self.env.cr.sql_log_count
+        self.Counter.get_counter_quote(self.patient.patient_code, [
+            (product.id, 1, 5.0) for product in (self.penicillin, self.paracetamol) * 5
+        ])
+        self.assertLessEqual(self.env.cr.sql_log_count - queries, one_line + 1)
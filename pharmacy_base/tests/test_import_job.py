@@ -0,0 +1,126 @@
+import base64
+import json
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestImportJob(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ImportJob = cls.env['pharmacy.import.job']
+        cls.Partner = cls.env['res.partner']
+
+        cls.insurance_company = cls.Partner.create({
+            'name': 'Import Insurance Company',
+            'is_company': True,
+        })
+
+    def _create_job(self, import_type, file_format, content, chunk_size=2):
+        return self.ImportJob.create({
+            'name': 'Test Import',
+            'import_type': import_type,
+            'file_format': file_format,
+            'data_file': base64.b64encode(content.encode()),
+            'chunk_size': chunk_size,
+        })
+
+    def test_import_patients_csv(self):
+        """Test importación de pacientes CSV por bloques con filas inválidas"""
+        content = (
+            "name,patient_code,allergies\n"
+            "Import Patient 1,IMP000001,Penicilina\n"
+            ",IMP000002,\n"
+            "Import Patient 3,IMP000001,\n"
+            "Import Patient 4,,Sulfas\n"
+            "Import Patient 5,IMP000005,\n"
+        )
+        job = self._create_job('patient', 'csv', content)
+        job._run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, 5)
+        self.assertEqual(job.rows_created, 3)
+        self.assertEqual(job.rows_failed, 2)
+        self.assertIn('Bloque 3', job.log)
+        patients = self.Partner.search([('name', 'like', 'Import Patient')])
+        self.assertEqual(len(patients), 3)
+        self.assertTrue(all(patients.mapped('is_patient')))
+        self.assertTrue(all(patients.mapped('patient_code')))
+
+    def test_import_prescribers_license_required(self):
+        """Test que la importación valida la cédula de los prescriptores"""
+        content = (
+            "name,medical_license,prescriber_specialty\n"
+            "Dr. Import 1,IMP-LIC-1,general\n"
+            "Dr. Import 2,,general\n"
+            "Dr. Import 3,IMP-LIC-3,unknown\n"
+        )
+        job = self._create_job('prescriber', 'csv', content)
+        job._run()
+
+        self.assertEqual(job.rows_created, 1)
+        self.assertEqual(job.rows_failed, 2)
+        doctor = self.Partner.search([('medical_license', '=', 'IMP-LIC-1')])
+        self.assertTrue(doctor.is_prescriber)
+
+    def test_import_policies_jsonl(self):
+        """Test importación de seguros JSON Lines resolviendo referencias"""
+        patient = self.Partner.create({
+            'name': 'Policy Import Patient',
+            'is_patient': True,
+            'patient_code': 'IMPPOL001',
+        })
+        lines = [
+            {'patient_code': 'IMPPOL001', 'insurance_company': 'Import Insurance Company',
+             'policy_number': 'POL-IMP-1', 'member_id': 'MEM-IMP-1', 'plan_name': 'Plan Importado',
+             'start_date': '2024-01-01', 'copay_default': '5.0'},
+            {'patient_code': 'UNKNOWN', 'insurance_company': 'Import Insurance Company',
+             'policy_number': 'POL-IMP-2', 'member_id': 'MEM-IMP-2', 'plan_name': 'Plan Importado'},
+            {'patient_code': 'IMPPOL001', 'insurance_company': 'Import Insurance Company',
+             'policy_number': 'POL-IMP-3', 'member_id': 'MEM-IMP-3', 'plan_name': 'Plan Importado',
+             'start_date': '2024-12-31', 'end_date': '2024-01-01'},
+        ]
+        content = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n[1, 2]\n42\n'
+        job = self._create_job('policy', 'jsonl', content)
+        job._run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, 6)
+        self.assertEqual(job.rows_created, 1)
+        self.assertEqual(job.rows_failed, 5)
+        self.assertIn('Fila 6: formato inválido', job.log)
+        self.assertEqual(patient.insurance_info_ids.policy_number, 'POL-IMP-1')
+        self.assertEqual(patient.insurance_info_ids.copay_default, 5.0)
+
+    def test_import_resume_from_checkpoint(self):
+        """Test que una importación se reanuda desde el punto de control"""
+        content = (
+            "name,patient_code\n"
+            "Resume Patient 1,RES000001\n"
+            "Resume Patient 2,RES000002\n"
+            "Resume Patient 3,RES000003\n"
+        )
+        job = self._create_job('patient', 'csv', content)
+        job.write({'rows_done': 2, 'state': 'failed'})
+        job._run()
+
+        self.assertEqual(job.rows_done, 3)
+        self.assertEqual(job.rows_created, 1)
+        self.assertEqual(self.Partner.search([('patient_code', 'like', 'RES0000')]).mapped('patient_code'),
+                         ['RES000003'])
+
+    def test_import_log_capped(self):
+        """Test que el registro conserva solo las últimas líneas"""
+        content = "name,patient_code\n" + ''.join(',CAP%06d\n' % i for i in range(30))
+        job = self._create_job('patient', 'csv', content)
+        with patch('odoo.addons.pharmacy_base.models.import_job.MAX_LOG_LINES', 10):
+            job._run()
+
+        self.assertEqual(job.rows_failed, 30)
+        log_lines = job.log.splitlines()
+        self.assertEqual(len(log_lines), 10)
+        self.assertEqual(log_lines[-1], 'Fila 30: el nombre es obligatorio')
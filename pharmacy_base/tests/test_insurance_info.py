@@ -1,6 +1,9 @@
 from odoo.tests import TransactionCase, tagged
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from datetime import date, timedelta
+from unittest.mock import patch
+
+from odoo.addons.pharmacy_base.tools import REASONS
 
 
 @tagged('post_install', '-at_install')
@@ -182,4 +185,337 @@ class TestInsuranceInfo(TransactionCase):
                 'member_id': 'MEM-UNIQUE',     # Mismo miembro
                 'plan_name': 'Plan Duplicado',
                 'start_date': date.today(),
-            })
\ No newline at end of file
+            })
+
+    def test_calculate_patient_cost_batch_matches_scalar(self):
+        """Test que el cálculo en lote coincide con el cálculo individual"""
+        base_vals = {
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'plan_name': 'Plan Lote',
+        }
+        deductible = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-BATCH-1', member_id='MEM-BATCH-1',
+            start_date=date.today(), annual_deductible=500.0, deductible_met=200.0,
+            coinsurance_percentage=20.0,
+        ))
+        copay = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-BATCH-2', member_id='MEM-BATCH-2',
+            start_date=date.today(), copay_default=5.0,
+        ))
+        expired = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-BATCH-3', member_id='MEM-BATCH-3',
+            start_date=date.today() - timedelta(days=400),
+            end_date=date.today() - timedelta(days=10),
+        ))
+
+        lines = [
+            (deductible.id, 100.0),
+            (deductible, 500.0),
+            (copay.id, 40.0),
+            (expired.id, 25.0),
+            (copay.id, 12.5),
+        ]
+        results = self.InsuranceInfo.calculate_patient_cost_batch(lines)
+
+        self.assertEqual(len(results), len(lines))
+        for (policy, amount), result in zip(lines, results):
+            policy = self.InsuranceInfo.browse(policy) if isinstance(policy, int) else policy
+            self.assertEqual(result, policy.calculate_patient_cost(amount))
+
+    def test_search_is_valid(self):
+        """Test búsqueda de cobertura válida por rango de fechas"""
+        base_vals = {
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'plan_name': 'Plan Búsqueda',
+        }
+        valid = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-SEARCH-1', member_id='MEM-SEARCH-1',
+            start_date=date.today() - timedelta(days=30), end_date=date.today(),
+        ))
+        expired = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-SEARCH-2', member_id='MEM-SEARCH-2',
+            start_date=date.today() - timedelta(days=30), end_date=date.today() - timedelta(days=1),
+        ))
+        future = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-SEARCH-3', member_id='MEM-SEARCH-3',
+            start_date=date.today() + timedelta(days=1),
+        ))
+        policies = valid | expired | future
+
+        self.assertEqual(policies.filtered_domain([('is_valid', '=', True)]), valid)
+        self.assertEqual(
+            self.InsuranceInfo.search([('id', 'in', policies.ids), ('is_valid', '=', True)]), valid)
+        self.assertEqual(
+            self.InsuranceInfo.search([('id', 'in', policies.ids), ('is_valid', '!=', True)]),
+            expired | future)
+        self.assertEqual(
+            self.InsuranceInfo.search([('id', 'in', policies.ids), ('is_valid', 'in', [False])]),
+            expired | future)
+        self.assertEqual(
+            self.InsuranceInfo.search([('id', 'in', policies.ids), ('is_valid', 'not in', [False])]), valid)
+        with self.assertRaises(UserError):
+            self.InsuranceInfo.search([('is_valid', 'ilike', True)])
+
+        # Las archivadas solo aparecen al buscar sin el filtro active_test
+        valid.active = False
+        self.assertFalse(
+            self.InsuranceInfo.search([('id', 'in', policies.ids), ('is_valid', '=', True)]))
+        self.assertEqual(
+            self.InsuranceInfo.with_context(active_test=False).search(
+                [('id', 'in', policies.ids), ('is_valid', '=', False)]),
+            policies)
+
+    def test_cron_refresh_validity(self):
+        """Test que el cron de vigencia registra la fecha de ejecución"""
+        self.InsuranceInfo._cron_refresh_validity()
+        param = self.env['ir.config_parameter'].sudo().get_param('pharmacy_base.validity_refresh_date')
+        self.assertEqual(param, str(date.today()))
+
+    def test_resolve_active_coverage(self):
+        """Test resolución de la cobertura vigente del paciente con caché"""
+        patient = self.Partner.create({'name': 'Coverage Patient', 'is_patient': True})
+        base_vals = {
+            'partner_id': patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'plan_name': 'Plan Resolución',
+        }
+        self.assertFalse(patient.resolve_active_coverage())
+
+        older = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-RES-1', member_id='MEM-RES-1',
+            start_date=date.today() - timedelta(days=60),
+        ))
+        self.assertEqual(patient.resolve_active_coverage(), older)
+
+        newer = self.InsuranceInfo.create(dict(
+            base_vals, policy_number='POL-RES-2', member_id='MEM-RES-2',
+            start_date=date.today() - timedelta(days=5),
+        ))
+        self.assertEqual(patient.resolve_active_coverage(), newer)
+
+        # Un acierto de caché no busca pólizas: solo lee la clave del paciente
+        self.env.flush_all()
+        with self.assertQueryCount(0):
+            patient.resolve_active_coverage()
+        self.env.invalidate_all()
+        with self.assertQueryCount(1):
+            patient.resolve_active_coverage()
+
+        # Un cambio de cobertura (también archivar) cambia la clave del caché
+        # sin limpiar el registro
+        self.env.registry.cache_invalidated.clear()
+        cache_key = patient.coverage_cache_key
+        newer.active = False
+        self.assertNotEqual(patient.coverage_cache_key, cache_key)
+        self.assertEqual(patient.resolve_active_coverage(), older)
+        self.assertFalse(self.env.registry.cache_invalidated)
+
+        older.end_date = date.today() - timedelta(days=1)
+        self.assertFalse(patient.resolve_active_coverage())
+
+    def test_deductible_ledger(self):
+        """Test libro de deducible: pagos, acumulación y costo consistente"""
+        insurance = self.InsuranceInfo.create({
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'policy_number': 'POL-LEDGER',
+            'member_id': 'MEM-LEDGER',
+            'plan_name': 'Plan Libro',
+            'start_date': date.today(),
+            'annual_deductible': 500.0,
+            'deductible_met': 100.0,
+            'coinsurance_percentage': 20.0,
+        })
+        insurance.record_deductible_payment(150.0, reference='POS/0001')
+        insurance.record_deductible_payment(50.0, reference='POS/0002')
+
+        # Los pagos pendientes ya cuentan para el deducible restante
+        self.assertEqual(insurance.deductible_met, 100.0)
+        self.assertEqual(insurance.remaining_deductible, 200.0)
+        before = insurance.calculate_patient_cost(300.0)
+        self.assertEqual(before['patient_pays'], 200.0 + 100.0 * 0.2)
+
+        self.InsuranceInfo._cron_rollup_deductible()
+        self.assertEqual(insurance.deductible_met, 300.0)
+        self.assertEqual(insurance.remaining_deductible, 200.0)
+        self.assertTrue(all(insurance.deductible_entry_ids.mapped('rolled_up')))
+        self.assertEqual(insurance.calculate_patient_cost(300.0), before)
+
+    def test_annual_deductible_reset(self):
+        """Test reinicio anual del deducible por lotes, con archivado de vencidas"""
+        policies = self.InsuranceInfo.create([{
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'policy_number': 'POL-RESET-%s' % i,
+            'member_id': 'MEM-RESET',
+            'plan_name': 'Plan Reinicio',
+            'start_date': date.today() - timedelta(days=400),
+            'end_date': date.today() - timedelta(days=1) if i == 2 else False,
+            'annual_deductible': 500.0,
+            'deductible_met': 300.0,
+        } for i in range(3)])
+        self.env['pharmacy.deductible.entry'].create({
+            'insurance_id': policies[0].id,
+            'amount': 50.0,
+            'date': date(date.today().year - 1, 12, 31),
+        })
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('pharmacy_base.deductible_reset_year', date.today().year - 1)
+        # Ejecución interrumpida tras la primera póliza: se retoma desde ahí
+        ICP.set_param('pharmacy_base.deductible_reset_last_id', policies[0].id)
+
+        with patch.object(type(self.InsuranceInfo), '_DEDUCTIBLE_RESET_BATCH', 1):
+            self.InsuranceInfo._cron_reset_annual_deductible()
+
+        self.assertEqual(policies[0].deductible_met, 300.0)
+        self.assertEqual(policies[0].remaining_deductible, 200.0)
+        self.assertEqual(policies[1:].mapped('deductible_met'), [0.0, 0.0])
+        self.assertEqual(policies[1].remaining_deductible, 500.0)
+        self.assertTrue(policies[1].active)
+        self.assertFalse(policies[2].active)
+        self.assertEqual(ICP.get_param('pharmacy_base.deductible_reset_year'), str(date.today().year))
+        self.assertEqual(ICP.get_param('pharmacy_base.deductible_reset_last_id'), '0')
+
+    def test_annual_deductible_reset_with_rollup(self):
+        """Test que una acumulación entre dos lotes del reinicio no se pierde"""
+        policies = self.InsuranceInfo.create([{
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'policy_number': 'POL-ROLL-%s' % i,
+            'member_id': 'MEM-ROLL',
+            'plan_name': 'Plan Acumulación',
+            'start_date': date.today() - timedelta(days=400),
+            'annual_deductible': 500.0,
+            'deductible_met': 300.0,
+        } for i in range(2)])
+        self.env['ir.config_parameter'].sudo().set_param(
+            'pharmacy_base.deductible_reset_year', date.today().year - 1)
+        self.env['ir.config_parameter'].sudo().set_param(
+            'pharmacy_base.deductible_reset_last_id', policies[0].id - 1)
+
+        InsuranceInfo = type(self.InsuranceInfo)
+        reset_chunk = InsuranceInfo._reset_deductible_chunk
+        chunks = []
+
+        def reset_chunk_then_rollup(model, last_id, limit, today):
+            result = reset_chunk(model, last_id, limit, today)
+            if not chunks:
+                # Ventas del año nuevo acumuladas entre el primer y el segundo lote
+                for policy in policies:
+                    policy.record_deductible_payment(40.0)
+                model._cron_rollup_deductible()
+            chunks.append(result)
+            return result
+
+        with patch.object(InsuranceInfo, '_DEDUCTIBLE_RESET_BATCH', 1), \
+                patch.object(InsuranceInfo, '_reset_deductible_chunk', reset_chunk_then_rollup):
+            self.InsuranceInfo._cron_reset_annual_deductible()
+
+        self.assertEqual(policies.mapped('deductible_met'), [40.0, 40.0])
+        self.assertEqual(policies.mapped('remaining_deductible'), [460.0, 460.0])
+
+    def test_columnar_pricing_matches_scalar(self):
+        """Test snapshot columnar: mismo resultado que calculate_patient_cost"""
+        base = {
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'member_id': 'MEM-COL',
+            'plan_name': 'Plan Columnar',
+            'start_date': date.today() - timedelta(days=30),
+        }
+        policies = self.InsuranceInfo.create([
+            dict(base, policy_number='POL-COL-1', copay_default=10.0),
+            dict(base, policy_number='POL-COL-2', coinsurance_percentage=17.5,
+                 annual_deductible=200.0, deductible_met=50.0),
+            dict(base, policy_number='POL-COL-3', end_date=date.today() - timedelta(days=1)),
+            dict(base, policy_number='POL-COL-4', annual_deductible=500.0),
+        ])
+        policies[1].record_deductible_payment(25.0)
+        lines = [(policy.id, amount) for policy in policies for amount in (12.5, 99.99, 180.0, 700.0)]
+
+        def check():
+            patient, insurance, reasons = self.InsuranceInfo._calculate_patient_cost_columnar(
+                [line[0] for line in lines], [line[1] for line in lines])
+            for index, (policy_id, amount) in enumerate(lines):
+                expected = self.InsuranceInfo.browse(policy_id).calculate_patient_cost(amount)
+                self.assertEqual(patient[index], expected['patient_pays'])
+                self.assertEqual(insurance[index], expected['insurance_pays'])
+                self.assertEqual(REASONS[reasons[index]], expected['reason'])
+
+        check()
+        # Refresco incremental tras escrituras y pagos de deducible
+        policies[0].copay_default = 0.0
+        policies[0].coinsurance_percentage = 30.0
+        policies[3].record_deductible_payment(480.0)
+        check()
+
+        with patch('odoo.addons.pharmacy_base.tools.pricing.numpy', None):
+            check()
+
+        # Un rollback marca para releer las pólizas leídas en la transacción,
+        # aunque su write_date no cambie
+        self.env.cr.execute(
+            "UPDATE pharmacy_insurance_info SET copay_default = 7.0, write_date = '2000-01-01' WHERE id = %s",
+            [policies[1].id])
+        policies.invalidate_recordset()
+        self.env.cr.postrollback.run()
+        check()
+
+        policies[2].unlink()
+        with self.assertRaises(KeyError):
+            self.InsuranceInfo._calculate_patient_cost_columnar([policies[2].id], [10.0])
+
+    def test_patient_coverage_summary(self):
+        """Test resumen de cobertura almacenado en el paciente"""
+        patient = self.Partner.create({'name': 'Summary Patient', 'is_patient': True})
+        self.assertEqual(patient.active_policy_count, 0)
+        self.assertFalse(patient.best_coverage_level)
+
+        base = {
+            'partner_id': patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'member_id': 'MEM-SUM',
+            'plan_name': 'Plan Resumen',
+            'annual_deductible': 300.0,
+        }
+        basic, premium = self.InsuranceInfo.create([
+            dict(base, policy_number='POL-SUM-1', start_date=date.today() - timedelta(days=60),
+                 end_date=date.today() + timedelta(days=30), coverage_level='basico'),
+            dict(base, policy_number='POL-SUM-2', start_date=date.today() - timedelta(days=10),
+                 end_date=date.today() + timedelta(days=200), coverage_level='premium'),
+        ])
+        self.assertEqual(patient.active_policy_count, 2)
+        self.assertEqual(patient.best_coverage_level, 'premium')
+        self.assertEqual(patient.coverage_end_date, date.today() + timedelta(days=30))
+        self.assertEqual(patient.coverage_remaining_deductible, 300.0)
+
+        # Un pago no escribe al paciente; el resumen se refresca al acumular
+        premium.record_deductible_payment(120.0)
+        self.assertNotIn(patient, self.env.records_to_compute(patient._fields['coverage_remaining_deductible']))
+        self.assertEqual(patient.coverage_remaining_deductible, 300.0)
+        self.InsuranceInfo._cron_rollup_deductible()
+        self.assertEqual(patient.coverage_remaining_deductible, 180.0)
+        self.assertEqual(patient.coverage_currency_id, premium.currency_id)
+
+        premium.active = False
+        self.assertEqual(patient.active_policy_count, 1)
+        self.assertEqual(patient.best_coverage_level, 'basico')
+        self.assertEqual(patient.coverage_remaining_deductible, 300.0)
+
+        # Los contactos que no son pacientes no tienen resumen
+        company = self.Partner.create({'name': 'Summary Company', 'is_company': True})
+        self.assertEqual(company.active_policy_count, 0)
+        self.assertFalse(company.coverage_cache_key)
+        self.assertFalse(company.resolve_active_coverage())
+
+        # La vigencia vencida la refresca el cron diario
+        self.env['ir.config_parameter'].sudo().set_param(
+            'pharmacy_base.validity_refresh_date', date.today() - timedelta(days=1))
+        self.env.cr.execute("UPDATE pharmacy_insurance_info SET end_date = %s WHERE id = %s",
+                            (date.today() - timedelta(days=1), basic.id))
+        basic.invalidate_recordset(['end_date'])
+        self.InsuranceInfo._cron_refresh_validity()
+        self.assertEqual(patient.active_policy_count, 0)
+        self.assertFalse(patient.coverage_end_date)
\ No newline at end of file
@@ -0,0 +1,55 @@
+from datetime import date
+
+from odoo.tests import HttpCase, tagged
+from odoo.tests.common import get_db_name
+
+from odoo.addons.pharmacy_base.tools.load_simulator import percentile, run_simulation
+
+
+@tagged('post_install', '-at_install')
+class TestLoadSimulator(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Contraseña conocida: la del administrador puede haber cambiado
+        cls.user = cls.env.ref('base.user_admin')
+        cls.password = 'pharmacy-load-simulator'
+        cls.user.password = cls.password
+        Partner = cls.env['res.partner']
+        insurance_company = Partner.create({'name': 'Aseguradora Carga', 'is_company': True})
+        cls.patients = Partner.create([
+            {'name': 'Paciente Carga %s' % i, 'is_patient': True} for i in range(3)
+        ])
+        cls.env['pharmacy.insurance.info'].create([{
+            'partner_id': patient.id,
+            'insurance_company_id': insurance_company.id,
+            'policy_number': 'CARGA-%s' % patient.id,
+            'member_id': 'CARGA-M-%s' % patient.id,
+            'plan_name': 'Plan Carga',
+            'start_date': date.today(),
+            'copay_default': 10.0,
+        } for patient in cls.patients])
+
+    def test_percentile(self):
+        """Test percentiles por rango más cercano"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_run_simulation(self):
+        """Test una corrida corta con terminales concurrentes contra el servidor de tests"""
+        report = run_simulation(
+            self.base_url(), get_db_name(), self.user.login, self.password,
+            terminals=2, sales=3, walk_in_ratio=0.5, seed=1,
+        )
+        self.assertEqual(report['terminals'], 2)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['sales'], 6)
+        calls = {operation: values['calls'] for operation, values in report['operations'].items()}
+        self.assertEqual(calls.get('lookup_patient', 0) + calls.get('create_patient', 0), 6)
+        self.assertEqual(calls.get('resolve_active_coverage', 0), calls.get('lookup_patient', 0))
+        for values in report['operations'].values():
+            self.assertLessEqual(values['p50_ms'], values['p99_ms'])
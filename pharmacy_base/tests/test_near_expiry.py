@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestNearExpiry(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stock_location = cls.env.ref('stock.stock_location_stock')
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+        cls.NearExpiryStock = cls.env['pharmacy.near.expiry.stock']
+
+        cls.amoxicillin = cls.env['product.template'].create({
+            'name': 'Amoxicilina Test',
+            'is_storable': True,
+            'is_pharmaceutical': True,
+            'active_principle': 'Amoxicilina',
+            'tracking': 'lot',
+            'use_expiration_date': True,
+        }).product_variant_id
+
+        now = fields.Datetime.now()
+        Lot = cls.env['stock.lot']
+        cls.lot_expired = Lot.create({
+            'name': 'L-VENCIDO',
+            'product_id': cls.amoxicillin.id,
+            'expiration_date': now - timedelta(days=5),
+        })
+        cls.lot_20 = Lot.create({
+            'name': 'L-20',
+            'product_id': cls.amoxicillin.id,
+            'expiration_date': now + timedelta(days=20),
+        })
+        cls.lot_120 = Lot.create({
+            'name': 'L-120',
+            'product_id': cls.amoxicillin.id,
+            'expiration_date': now + timedelta(days=120),
+        })
+        cls.lot_400 = Lot.create({
+            'name': 'L-400',
+            'product_id': cls.amoxicillin.id,
+            'expiration_date': now + timedelta(days=400),
+        })
+
+        Quant = cls.env['stock.quant']
+        for lot in (cls.lot_expired, cls.lot_20, cls.lot_120, cls.lot_400):
+            Quant._update_available_quantity(cls.amoxicillin, cls.stock_location, 10, lot_id=lot)
+
+    def test_expiry_buckets(self):
+        """Test tramos de vencimiento al crear, modificar y con el cron"""
+        self.assertEqual(self.lot_expired.expiry_bucket, 'expired')
+        self.assertEqual(self.lot_20.expiry_bucket, '30')
+        self.assertEqual(self.lot_120.expiry_bucket, '180')
+        self.assertEqual(self.lot_400.expiry_bucket, 'ok')
+
+        self.lot_400.expiration_date = fields.Datetime.now() + timedelta(days=60)
+        self.assertEqual(self.lot_400.expiry_bucket, '90')
+
+        # El cron mueve de tramo los lotes a medida que pasan los días
+        self.env.cr.execute(
+            "UPDATE stock_lot SET expiration_date = expiration_date - interval '30 days' WHERE id = %s",
+            [self.lot_20.id],
+        )
+        self.env['stock.lot']._cron_update_expiry_buckets()
+        self.assertEqual(self.lot_20.expiry_bucket, 'expired')
+
+    def test_near_expiry_report(self):
+        """Test que el reporte lista solo los lotes próximos a vencer o vencidos"""
+        rows = self.NearExpiryStock.search([('product_id', '=', self.amoxicillin.id)])
+        self.assertEqual(rows.lot_id, self.lot_expired | self.lot_20 | self.lot_120)
+        self.assertEqual(sum(rows.mapped('quantity')), 30)
+
+    def test_fefo_lots(self):
+        """Test lotes en orden FEFO sin los vencidos"""
+        lots = self.env['stock.quant'].get_fefo_lots(self.amoxicillin.id, self.stock_location.id)
+        self.assertEqual([lot['lot_id'] for lot in lots], [self.lot_20.id, self.lot_120.id, self.lot_400.id])
+
+        lots = self.env['stock.quant'].get_fefo_lots(self.amoxicillin.id, self.stock_location.id, quantity=15)
+        self.assertEqual([lot['lot_id'] for lot in lots], [self.lot_20.id, self.lot_120.id])
+
+    def test_fefo_reservation(self):
+        """Test que la reserva de un medicamento toma primero el lote que vence antes"""
+        move = self.env['stock.move'].create({
+            'name': 'Dispensación',
+            'product_id': self.amoxicillin.id,
+            'product_uom': self.amoxicillin.uom_id.id,
+            'product_uom_qty': 5,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.customer_location.id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        self.assertEqual(move.move_line_ids.lot_id, self.lot_20)
+
+    def test_removal_strategy_configured(self):
+        """Test que FEFO es solo el valor por defecto: se respeta la estrategia de la categoría"""
+        Quant = self.env['stock.quant']
+        self.assertEqual(Quant._get_removal_strategy(self.amoxicillin, self.stock_location), 'fefo')
+        self.amoxicillin.categ_id = self.env['product.category'].create({
+            'name': 'Categoría FIFO',
+            'removal_strategy_id': self.env.ref('stock.removal_fifo').id,
+        })
+        self.assertEqual(Quant._get_removal_strategy(self.amoxicillin, self.stock_location), 'fifo')
+
+    def test_expiry_buckets_on_install(self):
+        """Test que init() completa el tramo de los lotes existentes"""
+        lots = self.lot_expired | self.lot_20 | self.lot_400
+        self.env.cr.execute("UPDATE stock_lot SET expiry_bucket = NULL WHERE id IN %s", (tuple(lots.ids),))
+        lots.invalidate_recordset(['expiry_bucket'])
+        self.env['stock.lot'].init()
+        self.assertEqual(lots.mapped('expiry_bucket'), ['expired', '30', 'ok'])
@@ -0,0 +1,158 @@
+from datetime import date
+
+from odoo.tests import TransactionCase, tagged
+
+
+class PosClientStandIn:
+    """Cliente POS mínimo que mantiene el caché offline en memoria"""
+
+    def __init__(self, env):
+        self.env = env
+        self.cursor = None
+        self.tables = {'patients': {}, 'insurance_info': {}, 'products': {}}
+
+    def sync(self):
+        snapshot = self.env['pharmacy.pos.snapshot'].get_snapshot(
+            cursor=self.cursor,
+            patient_ids=list(self.tables['patients']) if self.cursor else None,
+            insurance_ids=list(self.tables['insurance_info']) if self.cursor else None,
+        )
+        for name, table in self.tables.items():
+            if snapshot['full']:
+                table.clear()
+            field_names = snapshot[name]['fields']
+            for row in snapshot[name]['rows']:
+                table[row[0]] = dict(zip(field_names, row))
+            for record_id in snapshot['removed'][name]:
+                table.pop(record_id, None)
+        self.cursor = snapshot['cursor']
+        return snapshot
+
+
+@tagged('post_install', '-at_install')
+class TestPosSnapshot(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Partner = cls.env['res.partner']
+        cls.patient = Partner.create({'name': 'Snapshot Patient', 'is_patient': True})
+        cls.other_patient = Partner.create({'name': 'Snapshot Other Patient', 'is_patient': True})
+        cls.insurance_company = Partner.create({'name': 'Snapshot Insurance', 'is_company': True})
+        cls.policy = cls.env['pharmacy.insurance.info'].create({
+            'partner_id': cls.patient.id,
+            'insurance_company_id': cls.insurance_company.id,
+            'policy_number': 'POL-SNAP',
+            'member_id': 'MEM-SNAP',
+            'plan_name': 'Plan Snapshot',
+            'start_date': date.today(),
+        })
+        cls.product = cls.env['product.template'].create({
+            'name': 'Snapshot Product',
+            'is_pharmaceutical': True,
+            'active_principle': 'Paracetamol',
+            'is_storable': True,
+        })
+        cls.env['stock.quant']._update_available_quantity(
+            cls.product.product_variant_id, cls.env.ref('stock.stock_location_stock'), 5.0)
+
+        # Simular datos antiguos para que el delta solo contenga lo modificado luego
+        cls.env.flush_all()
+        for table, records in [('res_partner', cls.patient | cls.other_patient),
+                               ('pharmacy_insurance_info', cls.policy),
+                               ('product_template', cls.product)]:
+            cls.env.cr.execute(
+                "UPDATE %s SET write_date = write_date - interval '1 day' WHERE id IN %%s" % table,
+                (tuple(records.ids),))
+        cls.env.cr.execute(
+            "UPDATE stock_quant SET write_date = write_date - interval '1 day' WHERE product_id = %s",
+            (cls.product.product_variant_id.id,))
+        cls.env.invalidate_all()
+
+    def test_full_then_delta(self):
+        """Test carga completa seguida de sincronización incremental"""
+        client = PosClientStandIn(self.env)
+        snapshot = client.sync()
+        self.assertTrue(snapshot['full'])
+        self.assertIn(self.patient.id, client.tables['patients'])
+        self.assertEqual(client.tables['insurance_info'][self.policy.id]['partner_id'], self.patient.id)
+        self.assertIn(self.product.id, client.tables['products'])
+
+        self.patient.allergies = 'Penicilina'
+        self.policy.active = False
+        snapshot = client.sync()
+
+        self.assertFalse(snapshot['full'])
+        delta_patient_ids = [row[0] for row in snapshot['patients']['rows']]
+        self.assertIn(self.patient.id, delta_patient_ids)
+        self.assertNotIn(self.other_patient.id, delta_patient_ids)
+        self.assertNotIn(self.product.id, [row[0] for row in snapshot['products']['rows']])
+        self.assertEqual(client.tables['patients'][self.patient.id]['allergies'], 'Penicilina')
+        self.assertIn(self.policy.id, snapshot['removed']['insurance_info'])
+        self.assertNotIn(self.policy.id, client.tables['insurance_info'])
+
+    def test_delta_removed_policy_and_cached_patients_only(self):
+        """Test que el delta informa seguros eliminados y solo trae pacientes en caché"""
+        client = PosClientStandIn(self.env)
+        client.sync()
+        self.assertIn(self.policy.id, client.tables['insurance_info'])
+        # El POS descartó de su caché al otro paciente
+        client.tables['patients'].pop(self.other_patient.id)
+
+        self.policy.unlink()
+        self.other_patient.allergies = 'Sulfas'
+        snapshot = client.sync()
+
+        self.assertIn(self.policy.id, snapshot['removed']['insurance_info'])
+        self.assertNotIn(self.policy.id, client.tables['insurance_info'])
+        self.assertNotIn(self.other_patient.id, [row[0] for row in snapshot['patients']['rows']])
+
+    def test_delta_stock_out_removes_product(self):
+        """Test que un producto sin existencias se descarta en el delta"""
+        client = PosClientStandIn(self.env)
+        client.sync()
+        self.env['stock.quant']._update_available_quantity(
+            self.product.product_variant_id, self.env.ref('stock.stock_location_stock'), -5.0)
+
+        snapshot = client.sync()
+        self.assertIn(self.product.id, snapshot['removed']['products'])
+        self.assertNotIn(self.product.id, client.tables['products'])
+
+    def test_delta_last_unit_sold_removes_product(self):
+        """Test que vender la última unidad descarta el producto aunque se elimine el quant"""
+        client = PosClientStandIn(self.env)
+        client.sync()
+        self.assertIn(self.product.id, client.tables['products'])
+
+        stock_location = self.env.ref('stock.stock_location_stock')
+        customer_location = self.env.ref('stock.stock_location_customers')
+        picking = self.env['stock.picking'].create({
+            'picking_type_id': self.env.ref('stock.picking_type_out').id,
+            'location_id': stock_location.id,
+            'location_dest_id': customer_location.id,
+            'move_ids': [(0, 0, {
+                'name': self.product.name,
+                'product_id': self.product.product_variant_id.id,
+                'product_uom_qty': 5,
+                'product_uom': self.product.uom_id.id,
+                'location_id': stock_location.id,
+                'location_dest_id': customer_location.id,
+            })],
+        })
+        picking.action_confirm()
+        picking.action_assign()
+        picking.move_ids.picked = True
+        picking.move_ids._action_done()
+        self.env['stock.quant']._unlink_zero_quants()
+        self.assertFalse(self.env['stock.quant'].search([
+            ('product_id', '=', self.product.product_variant_id.id), ('location_id', '=', stock_location.id),
+        ]))
+
+        snapshot = client.sync()
+        self.assertIn(self.product.id, snapshot['removed']['products'])
+        self.assertNotIn(self.product.id, client.tables['products'])
+
+    def test_cursor_version_mismatch_forces_full(self):
+        """Test que un cursor de otra versión provoca una carga completa"""
+        snapshot = self.env['pharmacy.pos.snapshot'].get_snapshot(cursor='0:2020-01-01 00:00:00')
+        self.assertTrue(snapshot['full'])
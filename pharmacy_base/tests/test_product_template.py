@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from odoo.tests import TransactionCase, tagged
 from odoo.exceptions import ValidationError
 
@@ -32,6 +34,39 @@ class TestProductTemplate(TransactionCase):
                 # Falta active_principle
             })
 
+    def test_bulk_validation_reports_all_violations(self):
+        """Test validación masiva: todas las violaciones en una sola pasada"""
+        vals_list = [{
+            'name': 'Bulk Product %s' % i,
+            'is_pharmaceutical': True,
+            'active_principle': 'Paracetamol' if i % 3 else False,
+            'categ_id': self.category_pharma.id,
+        } for i in range(9)]
+        with self.ProductTemplate._bulk_validation_mode():
+            products = self.ProductTemplate.create(vals_list)
+            violations = products.get_constraint_violations()
+        self.assertEqual(list(violations), ['pharmaceutical_fields'])
+        self.assertEqual(violations['pharmaceutical_fields']['ids'], products[::3].ids)
+
+        # Fuera del modo masivo el error nombra a todos los productos inválidos
+        with self.assertRaises(ValidationError) as error:
+            self.ProductTemplate.create(vals_list)
+        for i in (0, 3, 6):
+            self.assertIn('Bulk Product %s' % i, str(error.exception))
+
+        # Fuera del modo masivo las reglas se verifican sin consultas SQL
+        with patch.object(type(self.ProductTemplate), 'get_constraint_violations') as get_violations:
+            self.ProductTemplate.create(vals_list[1])
+        get_violations.assert_not_called()
+
+        # El modo masivo solo omite las reglas del modelo que lo activó
+        with self.ProductTemplate._bulk_validation_mode(), self.assertRaises(ValidationError):
+            self.env['res.partner'].create({'name': 'Bulk Prescriber', 'is_prescriber': True})
+
+        # El modo masivo no se puede activar desde el contexto (RPC)
+        with self.assertRaises(ValidationError):
+            self.ProductTemplate.with_context(pharmacy_bulk_validation=True).create(vals_list[:1])
+
     def test_create_pharmaceutical_product_success(self):
         """Test creación exitosa de producto farmacéutico"""
         product = self.ProductTemplate.create({
@@ -84,4 +119,120 @@ class TestProductTemplate(TransactionCase):
             'categ_id': self.category_otc.id,
         })
         self.assertEqual(product.pharmaceutical_form, 'tableta')
-        self.assertEqual(product.concentration, '500mg')
\ No newline at end of file
+        self.assertEqual(product.concentration, '500mg')
+
+    def test_search_pharmaceutical_partial_and_ranked(self):
+        """Test búsqueda parcial por principio activo, genérico y marca"""
+        exact = self.ProductTemplate.create({
+            'name': 'Search Product A',
+            'is_pharmaceutical': True,
+            'active_principle': 'Ibuprofeno',
+            'brand_name': 'Dolorex',
+            'categ_id': self.category_otc.id,
+        })
+        combined = self.ProductTemplate.create({
+            'name': 'Search Product B',
+            'is_pharmaceutical': True,
+            'active_principle': 'Ibuprofeno + Cafeína + Pseudoefedrina',
+            'categ_id': self.category_otc.id,
+        })
+        generic = self.ProductTemplate.create({
+            'name': 'Search Product C',
+            'is_pharmaceutical': True,
+            'active_principle': 'Paracetamol',
+            'generic_name': 'Acetaminofén',
+            'categ_id': self.category_otc.id,
+        })
+        products = exact | combined | generic
+        domain = [('id', 'in', products.ids)]
+
+        found = self.ProductTemplate.search_pharmaceutical('ibupro', domain=domain)
+        self.assertEqual(set(found.ids), {exact.id, combined.id})
+        if self.env.registry.has_trigram:
+            self.assertEqual(found[0], exact)
+
+        self.assertEqual(self.ProductTemplate.search_pharmaceutical('doloRex', domain=domain), exact)
+        self.assertEqual(self.ProductTemplate.search_pharmaceutical('acetamino', domain=domain), generic)
+
+        result = self.ProductTemplate.name_search('ibupro', domain, limit=10)
+        self.assertEqual({item[0] for item in result}, {exact.id, combined.id})
+        # La búsqueda estándar por nombre se conserva
+        result = self.ProductTemplate.name_search('Search Product C', domain, limit=10)
+        self.assertEqual([item[0] for item in result], [generic.id])
+
+    def test_generic_alternatives(self):
+        """Test alternativas equivalentes por principio, forma y concentración"""
+        vals = {
+            'is_pharmaceutical': True,
+            'pharmaceutical_form': 'tableta',
+            'categ_id': self.category_otc.id,
+            'is_storable': True,
+        }
+        brand = self.ProductTemplate.create(dict(
+            vals, name='Brand Combo', active_principle='Paracetamol + Cafeína',
+            concentration='500 mg', brand_name='Marca', list_price=20.0))
+        generic = self.ProductTemplate.create(dict(
+            vals, name='Generic Combo', active_principle='cafeina, paracetamol',
+            concentration='500mg', list_price=8.0))
+        no_stock = self.ProductTemplate.create(dict(
+            vals, name='Generic Combo No Stock', active_principle='Paracetamol/Cafeina',
+            concentration='500MG', list_price=5.0))
+        other_form = self.ProductTemplate.create(dict(
+            vals, name='Combo Jarabe', active_principle='Paracetamol + Cafeína',
+            concentration='500 mg', pharmaceutical_form='jarabe', list_price=7.0))
+
+        self.assertEqual(brand.equivalence_key, generic.equivalence_key)
+        self.assertEqual(brand.equivalence_key, no_stock.equivalence_key)
+        self.assertNotEqual(brand.equivalence_key, other_form.equivalence_key)
+
+        self.assertEqual(brand.get_generic_alternatives(in_stock=False), no_stock | generic)
+
+        stock_location = self.env.ref('stock.stock_location_stock')
+        self.env['stock.quant']._update_available_quantity(
+            generic.product_variant_id, stock_location, 10.0)
+        self.assertEqual(brand.get_generic_alternatives(), generic)
+
+    def test_category_reclassification_updates_products(self):
+        """Test que reclasificar una categoría actualiza sus productos"""
+        category = self.Category.create({
+            'name': 'Reclassified Category',
+            'pharmaceutical_category': 'otc',
+        })
+        products = self.ProductTemplate.create([{
+            'name': 'Reclassified Product %s' % i,
+            'is_pharmaceutical': True,
+            'active_principle': 'Principle %s' % i,
+            'categ_id': category.id,
+        } for i in range(3)])
+        self.assertFalse(any(products.mapped('requires_prescription')))
+
+        category.pharmaceutical_category = 'prescription'
+        self.assertTrue(all(products.mapped('requires_prescription')))
+        self.assertFalse(category.prescription_sync_pending)
+
+    def test_category_reclassification_background_batches(self):
+        """Test sincronización en segundo plano por lotes"""
+        category = self.Category.create({
+            'name': 'Large Category',
+            'pharmaceutical_category': 'prescription',
+        })
+        products = self.ProductTemplate.create([{
+            'name': 'Large Product %s' % i,
+            'categ_id': category.id,
+        } for i in range(5)])
+        self.assertTrue(all(products.mapped('requires_prescription')))
+
+        with patch.object(type(self.Category), '_PRESCRIPTION_SYNC_BATCH', 2):
+            category.pharmaceutical_category = 'otc'
+            self.assertTrue(category.prescription_sync_pending)
+            self.assertTrue(all(products.mapped('requires_prescription')))
+
+            with patch.object(type(self.env['ir.cron']), '_notify_progress') as notify:
+                self.Category._cron_sync_requires_prescription()
+
+        # El progreso se informa después de cada lote
+        self.assertEqual(
+            [call.kwargs for call in notify.call_args_list],
+            [{'done': 2, 'remaining': 3}, {'done': 4, 'remaining': 1}, {'done': 5, 'remaining': 0}])
+        self.assertFalse(category.prescription_sync_pending)
+        self.assertFalse(any(products.mapped('requires_prescription')))
\ No newline at end of file
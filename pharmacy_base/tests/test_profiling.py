@@ -0,0 +1,72 @@
+from datetime import date
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.pharmacy_base.tools import get_profiling_stats, reset_profiling_stats, reset_profiling_flag, is_profiling_enabled
+
+
+@tagged('post_install', '-at_install')
+class TestProfiling(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.patient = cls.env['res.partner'].create({'name': 'Profiled Patient', 'is_patient': True})
+        cls.insurance_company = cls.env['res.partner'].create({
+            'name': 'Profiled Insurance',
+            'is_company': True,
+        })
+
+    def setUp(self):
+        super().setUp()
+        reset_profiling_stats()
+        self.addCleanup(reset_profiling_stats)
+        # El valor del parámetro en caché puede venir de una transacción revertida
+        reset_profiling_flag()
+        self.addCleanup(reset_profiling_flag)
+
+    def _stats_by_method(self):
+        return {stat['method']: stat for stat in get_profiling_stats()}
+
+    def test_profiling_disabled_by_default(self):
+        """Test que sin el parámetro no se registran mediciones"""
+        self.env['res.partner'].create({'name': 'Not Profiled', 'is_patient': True})
+        self.assertEqual(get_profiling_stats(), [])
+
+    def test_profiling_flag_cached(self):
+        """Test que el parámetro no se relee en cada llamada y que set_param lo refresca"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        self.assertFalse(is_profiling_enabled(self.env))
+        with patch.object(type(ICP), 'get_param', side_effect=AssertionError('get_param')):
+            self.assertFalse(is_profiling_enabled(self.env))
+        ICP.set_param('pharmacy_base.profiling', '1')
+        self.assertTrue(is_profiling_enabled(self.env))
+
+    def test_profiling_records_calls(self):
+        """Test que con el perfilado activo se registran llamadas y consultas"""
+        self.env['ir.config_parameter'].sudo().set_param('pharmacy_base.profiling', '1')
+        insurance = self.env['pharmacy.insurance.info'].create({
+            'partner_id': self.patient.id,
+            'insurance_company_id': self.insurance_company.id,
+            'policy_number': 'POL-PROFILED',
+            'member_id': 'MEM-PROFILED',
+            'plan_name': 'Plan Perfilado',
+            'start_date': date.today(),
+        })
+        insurance.calculate_patient_cost(100.0)
+        insurance.calculate_patient_cost(50.0)
+        self.env['res.partner'].create({'name': 'Profiled Walk-in', 'is_patient': True})
+
+        stats = self._stats_by_method()
+        cost = stats['PharmacyInsuranceInfo.calculate_patient_cost']
+        self.assertEqual(cost['calls'], 2)
+        self.assertGreaterEqual(cost['p95_ms'], 0.0)
+        self.assertIn('PharmacyInsuranceInfo._check_dates', stats)
+        self.assertIn('ResPartner.create', stats)
+
+        action = self.env['pharmacy.profiling.stat'].action_open_stats()
+        self.assertEqual(action['res_model'], 'pharmacy.profiling.stat')
+        self.assertTrue(self.env['pharmacy.profiling.stat'].search([
+            ('method', '=', 'PharmacyInsuranceInfo.calculate_patient_cost'),
+        ]))
@@ -1,3 +1,8 @@
+import base64
+import io
+
+from PIL import Image
+
 from odoo.tests import TransactionCase, tagged
 from odoo.exceptions import ValidationError
 
@@ -19,6 +24,27 @@ class TestResPartner(TransactionCase):
         self.assertTrue(patient.patient_code)
         self.assertTrue(patient.patient_code.startswith('PAC'))
 
+    def test_patient_code_bulk_create(self):
+        """Test que la creación masiva asigna códigos únicos y ordenados"""
+        patients = self.Partner.create([
+            {'name': 'Bulk Patient %s' % i, 'is_patient': True} for i in range(5)
+        ] + [{'name': 'Bulk Contact', 'is_patient': False}])
+        codes = patients.filtered('is_patient').mapped('patient_code')
+        self.assertEqual(len(set(codes)), 5)
+        self.assertEqual(codes, sorted(codes))
+        for code in codes:
+            self.assertRegex(code, r'^PAC\d{6}$')
+        self.assertFalse(patients.filtered(lambda p: not p.is_patient).patient_code)
+
+    def test_patient_code_explicit_kept(self):
+        """Test que un código de paciente explícito se respeta"""
+        patient = self.Partner.create({
+            'name': 'Legacy Patient',
+            'is_patient': True,
+            'patient_code': 'LEG000001',
+        })
+        self.assertEqual(patient.patient_code, 'LEG000001')
+
     def test_prescriber_requires_license(self):
         """Test que médicos prescriptores requieren licencia"""
         with self.assertRaises(ValidationError):
@@ -39,6 +65,27 @@ class TestResPartner(TransactionCase):
         self.assertEqual(doctor.medical_license, 'MED-12345')
         self.assertEqual(doctor.prescriber_specialty, 'general')
 
+    def test_prescriber_signature_thumbnail(self):
+        """Test que la firma se reduce y solo se carga completa al imprimir"""
+        stream = io.BytesIO()
+        Image.new('RGB', (1600, 600), 'white').save(stream, format='PNG')
+        doctor = self.Partner.create({
+            'name': 'Dr. Signature',
+            'is_prescriber': True,
+            'medical_license': 'SIG-12345',
+            'prescriber_signature': base64.b64encode(stream.getvalue()),
+        })
+        self.env.flush_all()
+        self.env.invalidate_all()
+
+        doctor.read(['name', 'medical_license', 'prescriber_specialty'])
+        self.assertFalse(self.env.cache.contains(doctor, doctor._fields['prescriber_signature']))
+
+        thumbnail = Image.open(io.BytesIO(base64.b64decode(doctor.prescriber_signature_128)))
+        self.assertLessEqual(max(thumbnail.size), 128)
+        signature = Image.open(io.BytesIO(base64.b64decode(doctor._get_prescription_signature())))
+        self.assertEqual(signature.size, (1024, 384))
+
     def test_laboratory_creation(self):
         """Test creación de laboratorio"""
         laboratory = self.Partner.create({
@@ -62,6 +109,67 @@ class TestResPartner(TransactionCase):
         self.assertEqual(patient.chronic_conditions, 'Diabetes, Hipertensión')
         self.assertEqual(patient.current_medications, 'Metformina 500mg')
 
+    def test_screen_allergies(self):
+        """Test control de alergias de una canasta contra el paciente"""
+        patient = self.Partner.create({
+            'name': 'Allergic Patient',
+            'is_patient': True,
+            'allergies': 'Penicilina, Ácido acetilsalicílico\nSulfas',
+        })
+        ProductTemplate = self.env['product.template']
+        aspirin = ProductTemplate.create({
+            'name': 'Aspirina 500mg',
+            'is_pharmaceutical': True,
+            'active_principle': 'Acido Acetilsalicilico',
+        })
+        penicillin = ProductTemplate.create({
+            'name': 'Penicilina G',
+            'is_pharmaceutical': True,
+            'active_principle': 'Penicilina G benzatínica',
+        })
+        safe = ProductTemplate.create({
+            'name': 'Amoxicilina con Clavulánico',
+            'is_pharmaceutical': True,
+            'active_principle': 'Amoxicilina + Ácido clavulánico',
+        })
+
+        alerts = patient.screen_allergies((aspirin | penicillin | safe).ids)
+        self.assertEqual({alert['product_tmpl_id'] for alert in alerts}, {aspirin.id, penicillin.id})
+
+        patient.allergies = 'Amoxicilina'
+        alerts = patient.screen_allergies((aspirin | penicillin | safe).ids)
+        self.assertEqual([alert['product_tmpl_id'] for alert in alerts], [safe.id])
+
+        patient.allergies = False
+        self.assertEqual(patient.screen_allergies(safe.ids), [])
+
+    def test_lookup_patient(self):
+        """Test identificación de pacientes por código, ID de asegurado y póliza"""
+        insurer = self.Partner.create({'name': 'Lookup Insurer', 'is_company': True})
+        patient, relative = self.Partner.create([
+            {'name': 'Lookup Patient', 'is_patient': True},
+            {'name': 'Lookup Relative', 'is_patient': True},
+        ])
+        self.env['pharmacy.insurance.info'].create([{
+            'partner_id': partner.id,
+            'insurance_company_id': insurer.id,
+            'policy_number': 'GRP-7788',
+            'member_id': member_id,
+            'plan_name': 'Plan Familiar',
+        } for partner, member_id in ((patient, 'MEM-LOOKUP-1'), (relative, 'MEM-LOOKUP-2'))])
+
+        self.assertEqual(self.Partner.lookup_patient(patient.patient_code), patient)
+        self.assertEqual(self.Partner.lookup_patient(' MEM-LOOKUP-2 '), relative)
+        self.assertEqual(self.Partner.lookup_patient('GRP-7788'), patient | relative)
+        self.assertFalse(self.Partner.lookup_patient('MEM-LOOKUP'))
+
+        # El nombre buscado no coincide con el nombre del paciente
+        result = self.Partner.name_search('MEM-LOOKUP-1')
+        self.assertEqual(result[0][0], patient.id)
+
+        relative.insurance_info_ids.active = False
+        self.assertEqual(self.Partner.lookup_patient('GRP-7788'), patient)
+
     def test_multiple_partner_types(self):
         """Test que un partner puede tener múltiples tipos"""
         partner = self.Partner.create({
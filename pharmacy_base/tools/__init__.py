@@ -0,0 +1,7 @@
+from .text import normalize_text, normalize_principle, normalize_concentration, tokenize_terms
+from .profiling import (
+    profiled, profiling_scope, is_profiling_enabled, get_profiling_stats, reset_profiling_stats,
+    reset_profiling_flag, PROFILING_PARAM,
+)
+
+from .pricing import REASONS, PlanSnapshot, get_plan_snapshot, split_patient_cost, compute_patient_cost
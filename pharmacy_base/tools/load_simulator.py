@@ -0,0 +1,346 @@
+"""
+Simulador de carga concurrente de mostradores de farmacia.
+
+Es una herramienta de línea de comandos independiente: no se importa desde
+tools/__init__.py ni la carga el servidor, y escribe su reporte por salida
+estándar con print.
+
+Lanza N terminales simuladas en paralelo contra una instancia de Odoo por
+XML-RPC. Cada terminal repite el flujo de mostrador: identificación del
+paciente (lookup_patient), resolución de la cobertura vigente
+(resolve_active_coverage), cálculo del copago por línea
+(calculate_patient_cost) y, en una fracción de las ventas, alta de un
+paciente de paso (res.partner.create, que consume la secuencia de códigos).
+
+Informa por nivel de concurrencia el rendimiento, las latencias p50/p99 por
+operación, los fallos de serialización que llegan al cliente y, con --dsn,
+las esperas por bloqueo muestreadas en pg_stat_activity, agrupadas por tabla.
+
+Odoo reintenta en el servidor las transacciones con fallos de serialización,
+así que bajo contención moderada se ven como latencia y como rollbacks en
+pg_stat_database; al cliente solo llegan cuando se agotan los reintentos.
+
+Solo usa la biblioteca estándar (psycopg2 es opcional, para --dsn), por lo
+que puede ejecutarse desde cualquier máquina con acceso al servidor:
+
+    python pharmacy_base/tools/load_simulator.py --url http://localhost:8069 \\
+        --db farmacia --login admin --password admin \\
+        --terminals 1,10,30,60 --duration 60 --dsn "dbname=farmacia"
+
+Las altas de pacientes de paso quedan grabadas: usar una base de pruebas.
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import sys
+import threading
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+OPERATIONS = ('lookup_patient', 'resolve_active_coverage', 'calculate_patient_cost', 'create_patient')
+
+# Mensajes de PostgreSQL que indican conflicto de concurrencia
+CONCURRENCY_ERRORS = ('could not serialize', 'concurrent update', 'deadlock detected', 'lock not available')
+
+# Tabla afectada por la sentencia que espera un bloqueo
+STATEMENT_TABLE = re.compile(r'\b(?:UPDATE|INTO|FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista ya ordenada (0.0 si está vacía)"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values))) - 1))
+    return values[rank]
+
+
+class LoadStats:
+    """Latencias y errores por operación, compartidos por todas las terminales"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.serialization_failures = collections.Counter()
+        self.sales = 0
+
+    def record(self, operation, seconds, error=None):
+        with self.lock:
+            self.durations[operation].append(seconds)
+            if error is not None:
+                self.errors[operation] += 1
+                if any(message in str(error) for message in CONCURRENCY_ERRORS):
+                    self.serialization_failures[operation] += 1
+
+    def record_sale(self):
+        with self.lock:
+            self.sales += 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: duración de la corrida en segundos
+        :return: dict con totales y, por operación, llamadas, errores,
+                 fallos de serialización y latencias p50/p99 en milisegundos
+        """
+        with self.lock:
+            operations = {}
+            for operation in OPERATIONS:
+                durations = sorted(self.durations.get(operation, []))
+                if not durations:
+                    continue
+                operations[operation] = {
+                    'calls': len(durations),
+                    'errors': self.errors[operation],
+                    'serialization_failures': self.serialization_failures[operation],
+                    'p50_ms': percentile(durations, 50) * 1000,
+                    'p99_ms': percentile(durations, 99) * 1000,
+                }
+            calls = sum(values['calls'] for values in operations.values())
+            return {
+                'elapsed': elapsed,
+                'sales': self.sales,
+                'sales_per_second': self.sales / elapsed if elapsed else 0.0,
+                'calls_per_second': calls / elapsed if elapsed else 0.0,
+                'errors': sum(self.errors.values()),
+                'serialization_failures': sum(self.serialization_failures.values()),
+                'operations': operations,
+            }
+
+
+class LockSampler(threading.Thread):
+    """
+    Muestrea periódicamente las sesiones de la base de datos que esperan un
+    bloqueo y cuenta las muestras por tabla de la sentencia bloqueada. También
+    mide los rollbacks del servidor durante la corrida (incluye los reintentos
+    de Odoo por fallos de serialización).
+    """
+
+    def __init__(self, dsn, interval=0.05):
+        super().__init__(daemon=True)
+        if psycopg2 is None:
+            raise RuntimeError("--dsn requiere psycopg2")
+        self.connection = psycopg2.connect(dsn)
+        self.connection.autocommit = True
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.samples = 0
+        self.waits = collections.Counter()
+        self.max_waiting = 0
+        self.rollbacks_start = self._get_rollbacks()
+        self.rollbacks = 0
+
+    def _get_rollbacks(self):
+        with self.connection.cursor() as cr:
+            cr.execute("SELECT xact_rollback FROM pg_stat_database WHERE datname = current_database()")
+            return cr.fetchone()[0]
+
+    def run(self):
+        with self.connection.cursor() as cr:
+            while not self.stopping.is_set():
+                cr.execute("""
+                    SELECT wait_event, query
+                      FROM pg_stat_activity
+                     WHERE datname = current_database()
+                       AND wait_event_type = 'Lock'
+                       AND pid <> pg_backend_pid()
+                """)
+                rows = cr.fetchall()
+                self.samples += 1
+                self.max_waiting = max(self.max_waiting, len(rows))
+                for wait_event, query in rows:
+                    match = STATEMENT_TABLE.search(query or '')
+                    self.waits['%s (%s)' % (match.group(1) if match else '?', wait_event)] += 1
+                self.stopping.wait(self.interval)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        # pg_stat_database se actualiza con cierto retraso
+        time.sleep(0.5)
+        self.rollbacks = self._get_rollbacks() - self.rollbacks_start
+        self.connection.close()
+
+    def summary(self):
+        """:return: dict con muestras, máximo de sesiones esperando, esperas por tabla y rollbacks"""
+        return {
+            'samples': self.samples,
+            'max_waiting': self.max_waiting,
+            'waits': dict(self.waits.most_common()),
+            'rollbacks': self.rollbacks,
+        }
+
+
+class Terminal:
+    """Un mostrador simulado, con su propia conexión XML-RPC"""
+
+    def __init__(self, url, db, uid, password, stats, patient_codes, walk_in_ratio, max_lines, seed):
+        self.models = xmlrpc.client.ServerProxy('%s/xmlrpc/2/object' % url, allow_none=True)
+        self.db = db
+        self.uid = uid
+        self.password = password
+        self.stats = stats
+        self.patient_codes = patient_codes
+        self.walk_in_ratio = walk_in_ratio
+        self.max_lines = max_lines
+        self.rng = random.Random(seed)
+
+    def _call(self, operation, model, method, args, kwargs=None):
+        """Ejecuta y mide una llamada; devuelve None si falla"""
+        started = time.perf_counter()
+        try:
+            result = self.models.execute_kw(self.db, self.uid, self.password, model, method, args, kwargs or {})
+        except (xmlrpc.client.Fault, OSError) as error:
+            self.stats.record(operation, time.perf_counter() - started, error)
+            return None
+        self.stats.record(operation, time.perf_counter() - started)
+        return result
+
+    def run_sale(self):
+        """Una venta de mostrador completa"""
+        if not self.patient_codes or self.rng.random() < self.walk_in_ratio:
+            patient_id = self._call('create_patient', 'res.partner', 'create', [{
+                'name': 'Paciente de paso %s' % self.rng.getrandbits(32),
+                'is_patient': True,
+            }])
+            if patient_id:
+                self.stats.record_sale()
+            return
+
+        code = self.rng.choice(self.patient_codes)
+        patient_ids = self._call('lookup_patient', 'res.partner', 'lookup_patient', [code], {'limit': 1})
+        if not patient_ids:
+            return
+        coverage_ids = self._call('resolve_active_coverage', 'res.partner', 'resolve_active_coverage', [patient_ids])
+        if coverage_ids is None:
+            return
+        for dummy in range(self.rng.randint(1, self.max_lines) if coverage_ids else 0):
+            amount = round(self.rng.uniform(5, 200), 2)
+            if self._call('calculate_patient_cost', 'pharmacy.insurance.info', 'calculate_patient_cost',
+                          [coverage_ids, amount]) is None:
+                return
+        self.stats.record_sale()
+
+    def run(self, deadline=None, sales=None):
+        """Repite ventas hasta el plazo o la cantidad de ventas dada"""
+        done = 0
+        while (deadline is None or time.monotonic() < deadline) and (sales is None or done < sales):
+            self.run_sale()
+            done += 1
+
+
+def get_patient_codes(url, db, uid, password, sample=1000):
+    """Códigos de pacientes existentes con los que las terminales identifican clientes"""
+    models = xmlrpc.client.ServerProxy('%s/xmlrpc/2/object' % url, allow_none=True)
+    patients = models.execute_kw(db, uid, password, 'res.partner', 'search_read', [
+        [('is_patient', '=', True), ('patient_code', '!=', False)],
+    ], {'fields': ['patient_code'], 'limit': sample, 'order': 'id desc'})
+    return [patient['patient_code'] for patient in patients]
+
+
+def run_simulation(url, db, login, password, terminals, duration=None, sales=None,
+                   walk_in_ratio=0.1, max_lines=3, dsn=None, seed=0):
+    """
+    Ejecuta una corrida con una cantidad fija de terminales concurrentes.
+
+    :param terminals: cantidad de terminales simuladas
+    :param duration: segundos de la corrida (o None si se indica sales)
+    :param sales: ventas por terminal (o None si se indica duration)
+    :param walk_in_ratio: fracción de ventas a pacientes de paso (alta de paciente)
+    :param max_lines: máximo de líneas por venta
+    :param dsn: cadena de conexión a PostgreSQL para muestrear bloqueos (opcional)
+    :return: dict como LoadStats.summary, más 'terminals' y 'locks' si hay dsn
+    """
+    if duration is None and sales is None:
+        raise ValueError("Indicar duration o sales")
+    uid = xmlrpc.client.ServerProxy('%s/xmlrpc/2/common' % url).authenticate(db, login, password, {})
+    if not uid:
+        raise RuntimeError("Credenciales inválidas para %s en %s" % (login, db))
+    patient_codes = get_patient_codes(url, db, uid, password)
+
+    stats = LoadStats()
+    sampler = LockSampler(dsn) if dsn else None
+    workers = [
+        Terminal(url, db, uid, password, stats, patient_codes, walk_in_ratio, max_lines, seed=seed + index)
+        for index in range(terminals)
+    ]
+    if sampler:
+        sampler.start()
+    started = time.monotonic()
+    deadline = started + duration if duration is not None else None
+    with ThreadPoolExecutor(max_workers=terminals) as executor:
+        for future in [executor.submit(worker.run, deadline, sales) for worker in workers]:
+            future.result()
+    elapsed = time.monotonic() - started
+    if sampler:
+        sampler.stop()
+
+    report = stats.summary(elapsed)
+    report['terminals'] = terminals
+    if sampler:
+        report['locks'] = sampler.summary()
+    return report
+
+
+def format_report(report):
+    """Resumen legible de una corrida"""
+    lines = [
+        "%(terminals)s terminales: %(sales)s ventas en %(elapsed).1fs "
+        "(%(sales_per_second).1f ventas/s, %(calls_per_second).1f llamadas/s), "
+        "%(errors)s errores, %(serialization_failures)s fallos de serialización" % report,
+    ]
+    for operation, values in report['operations'].items():
+        lines.append(
+            "  %-24s %7d llamadas  p50 %8.1f ms  p99 %8.1f ms  %d errores  %d serialización" % (
+                operation, values['calls'], values['p50_ms'], values['p99_ms'],
+                values['errors'], values['serialization_failures'],
+            ))
+    locks = report.get('locks')
+    if locks:
+        lines.append("  Bloqueos: máx. %(max_waiting)s sesiones esperando, %(rollbacks)s rollbacks en el servidor" % locks)
+        for target, count in locks['waits'].items():
+            lines.append("    %-40s %5.1f%% de las muestras" % (target, 100.0 * count / locks['samples']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador de carga concurrente de mostradores de farmacia")
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--terminals', default='1,10,30',
+                        help="niveles de concurrencia separados por coma, se ejecutan en orden")
+    parser.add_argument('--duration', type=float, default=30.0, help="segundos por nivel")
+    parser.add_argument('--sales', type=int, help="ventas por terminal en lugar de duración fija")
+    parser.add_argument('--walk-in-ratio', type=float, default=0.1)
+    parser.add_argument('--max-lines', type=int, default=3)
+    parser.add_argument('--dsn', help="conexión a PostgreSQL para muestrear bloqueos (requiere psycopg2)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for terminals in [int(level) for level in args.terminals.split(',')]:
+        report = run_simulation(
+            args.url, args.db, args.login, args.password, terminals,
+            duration=None if args.sales else args.duration, sales=args.sales,
+            walk_in_ratio=args.walk_in_ratio, max_lines=args.max_lines, dsn=args.dsn, seed=args.seed,
+        )
+        reports.append(report)
+        if not args.json:
+            print(format_report(report), flush=True)
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import bisect
+import threading
+from array import array
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Códigos de razón de los resultados columnares, en el orden de REASONS
+REASON_INVALID, REASON_DEDUCTIBLE, REASON_NORMAL = range(3)
+REASONS = ('Cobertura no válida', 'Aplicado a deducible', 'Cálculo normal')
+
+# Fecha de fin para pólizas sin vencimiento (ordinal de date.max)
+NO_END_DATE = date.max.toordinal()
+
+# Columnas del snapshot y su tipo en array.array / numpy
+COLUMNS = {
+    'active': ('b', 'int8'),
+    'start_date': ('q', 'int64'),
+    'end_date': ('q', 'int64'),
+    'annual_deductible': ('d', 'float64'),
+    'deductible_met': ('d', 'float64'),
+    'remaining_deductible': ('d', 'float64'),
+    'copay_default': ('d', 'float64'),
+    'coinsurance_percentage': ('d', 'float64'),
+}
+
+_lock = threading.Lock()
+_snapshots = {}
+
+
+class PlanSnapshot:
+    """
+    Parámetros de costo de las pólizas en columnas compactas (array.array),
+    ordenadas por id de póliza. numpy lee las columnas sin copiarlas.
+
+    El lock protege las columnas y el estado de refresco; el modelo lee las
+    pólizas fuera del lock y solo aplica el resultado bajo él.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = array('q')
+        self.columns = {name: array(typecode) for name, (typecode, dummy) in COLUMNS.items()}
+        # Estado de refresco incremental (lo mantiene el modelo): fecha desde
+        # la que releer, secuencia del registro con la que se cargó e ids a
+        # releer aunque no hayan cambiado (lecturas de transacciones revertidas)
+        self.cursor = None
+        self.registry_sequence = None
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        del self.ids[:]
+        for column in self.columns.values():
+            del column[:]
+        self.cursor = None
+
+    def replace(self, other):
+        """Toma las columnas de otro snapshot (recarga completa construida aparte)"""
+        self.ids = other.ids
+        self.columns = other.columns
+
+    def mark_dirty(self, ids=None):
+        """
+        Fuerza a releer las pólizas dadas en el próximo refresco, o a una
+        recarga completa si ids es None.
+        """
+        with self.lock:
+            if ids is None:
+                self.cursor = None
+            else:
+                self.dirty.update(ids)
+
+    def upsert(self, rows):
+        """
+        Inserta o actualiza filas manteniendo el orden por id.
+
+        :param rows: iterable de dicts con 'id' y una clave por columna; las
+                     fechas como date (end_date puede ser False)
+        """
+        for row in rows:
+            values = {
+                'active': 1 if row['active'] else 0,
+                'start_date': row['start_date'].toordinal(),
+                'end_date': row['end_date'].toordinal() if row['end_date'] else NO_END_DATE,
+            }
+            position = bisect.bisect_left(self.ids, row['id'])
+            exists = position < len(self.ids) and self.ids[position] == row['id']
+            if not exists:
+                self.ids.insert(position, row['id'])
+            for name, column in self.columns.items():
+                value = values.get(name, row.get(name))
+                if exists:
+                    column[position] = value
+                else:
+                    column.insert(position, value)
+
+    def positions(self, policy_ids):
+        """:return: posiciones de policy_ids en las columnas (KeyError si falta alguno)"""
+        positions = []
+        missing = []
+        for policy_id in policy_ids:
+            position = bisect.bisect_left(self.ids, policy_id)
+            if position < len(self.ids) and self.ids[position] == policy_id:
+                positions.append(position)
+            else:
+                missing.append(policy_id)
+        if missing:
+            raise KeyError(missing)
+        return positions
+
+
+def get_plan_snapshot(dbname):
+    """Snapshot del proceso para la base de datos dada (se crea vacío)"""
+    with _lock:
+        if dbname not in _snapshots:
+            _snapshots[dbname] = PlanSnapshot()
+        return _snapshots[dbname]
+
+
+def split_patient_cost(is_valid, remaining_deductible, copay_default, coinsurance_percentage, amount):
+    """
+    Reparto de un monto entre paciente y aseguradora, con la misma aritmética
+    que pharmacy.insurance.info._split_patient_cost.
+
+    :return: tupla (paga el paciente, paga el seguro, código de razón)
+    """
+    if not is_valid:
+        return amount, 0.0, REASON_INVALID
+    if remaining_deductible > 0:
+        if amount <= remaining_deductible:
+            return amount, 0.0, REASON_DEDUCTIBLE
+        amount_after_deductible = amount - remaining_deductible
+        patient_pays = remaining_deductible
+    else:
+        amount_after_deductible = amount
+        patient_pays = 0.0
+    if copay_default > 0:
+        patient_pays += copay_default
+    elif coinsurance_percentage > 0:
+        patient_pays += amount_after_deductible * (coinsurance_percentage / 100.0)
+    return patient_pays, amount - patient_pays, REASON_NORMAL
+
+
+def compute_patient_cost(snapshot, policy_ids, amounts, today=None):
+    """
+    Calcula el costo de muchas líneas sobre el snapshot. Con numpy el cálculo
+    es vectorizado; sin numpy se recorre línea por línea con la misma fórmula.
+
+    :param policy_ids: secuencia de ids de póliza
+    :param amounts: secuencia de montos, en el mismo orden
+    :param today: fecha de vigencia (por defecto hoy)
+    :return: tupla (paga el paciente, paga el seguro, códigos de razón), como
+             arrays de numpy o listas si numpy no está disponible
+    """
+    today = (today or date.today()).toordinal()
+    with snapshot.lock:
+        if numpy is None:
+            return _compute_patient_cost_python(snapshot, policy_ids, amounts, today)
+        return _compute_patient_cost_numpy(snapshot, policy_ids, amounts, today)
+
+
+def _compute_patient_cost_python(snapshot, policy_ids, amounts, today):
+    columns = snapshot.columns
+    patient, insurance, reasons = [], [], []
+    for position, amount in zip(snapshot.positions(policy_ids), amounts):
+        is_valid = columns['active'][position] \
+            and columns['start_date'][position] <= today <= columns['end_date'][position]
+        result = split_patient_cost(
+            is_valid,
+            columns['remaining_deductible'][position],
+            columns['copay_default'][position],
+            columns['coinsurance_percentage'][position],
+            amount,
+        )
+        patient.append(result[0])
+        insurance.append(result[1])
+        reasons.append(result[2])
+    return patient, insurance, reasons
+
+
+def _compute_patient_cost_numpy(snapshot, policy_ids, amounts, today):
+    if not len(snapshot):
+        snapshot.positions(policy_ids)
+        return numpy.empty(0), numpy.empty(0), numpy.empty(0, dtype='int64')
+    ids = numpy.frombuffer(snapshot.ids, dtype='int64')
+    policy_ids = numpy.asarray(policy_ids, dtype='int64')
+    amounts = numpy.asarray(amounts, dtype='float64')
+    positions = numpy.searchsorted(ids, policy_ids)
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == policy_ids[found]
+    if not found.all():
+        raise KeyError(policy_ids[~found].tolist())
+
+    def column(name):
+        return numpy.frombuffer(snapshot.columns[name], dtype=COLUMNS[name][1])[positions]
+
+    remaining = column('remaining_deductible')
+    copay = column('copay_default')
+    coinsurance = column('coinsurance_percentage')
+    valid = (column('active') != 0) & (column('start_date') <= today) & (column('end_date') >= today)
+
+    pending = remaining > 0
+    covered = pending & (amounts <= remaining)
+    after_deductible = numpy.where(pending, amounts - remaining, amounts)
+    patient = numpy.where(pending, remaining, 0.0)
+    patient = numpy.where(
+        copay > 0,
+        patient + copay,
+        numpy.where(coinsurance > 0, patient + after_deductible * (coinsurance / 100.0), patient),
+    )
+    patient = numpy.where(valid & ~covered, patient, amounts)
+    insurance = numpy.where(valid & ~covered, amounts - patient, 0.0)
+    reasons = numpy.where(valid, numpy.where(covered, REASON_DEDUCTIBLE, REASON_NORMAL), REASON_INVALID)
+    return patient, insurance, reasons
@@ -0,0 +1,121 @@
+import collections
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Muestras recientes (método, segundos, consultas); acotado para no crecer sin límite
+RING_BUFFER_SIZE = 20000
+
+# Parámetro del sistema que activa el perfilado, y segundos durante los que
+# cada worker reutiliza su valor
+PROFILING_PARAM = 'pharmacy_base.profiling'
+PROFILING_FLAG_TTL = 60
+
+_lock = threading.Lock()
+_samples = collections.deque(maxlen=RING_BUFFER_SIZE)
+_totals = collections.defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'queries': 0})
+# {base de datos: (perfilado activo, vencimiento en time.monotonic())}
+_flags = {}
+
+
+def is_profiling_enabled(env):
+    """
+    El perfilado se activa con el parámetro del sistema pharmacy_base.profiling.
+
+    El parámetro se lee a lo sumo una vez cada PROFILING_FLAG_TTL segundos por
+    worker y base de datos; entre lecturas (el camino de los métodos
+    decorados con el perfilado inactivo) solo se consulta un dict en memoria.
+    """
+    dbname = env.cr.dbname
+    flag = _flags.get(dbname)
+    now = time.monotonic()
+    if flag is None or flag[1] <= now:
+        enabled = bool(env['ir.config_parameter'].sudo().get_param(PROFILING_PARAM))
+        flag = _flags[dbname] = (enabled, now + PROFILING_FLAG_TTL)
+    return flag[0]
+
+
+def reset_profiling_flag(dbname=None):
+    """Fuerza a releer el parámetro en la próxima llamada (de una base o de todas)"""
+    if dbname is None:
+        _flags.clear()
+    else:
+        _flags.pop(dbname, None)
+
+
+@contextmanager
+def profiling_scope(env, name):
+    """
+    Mide un bloque de código (tiempo y consultas SQL) si el perfilado está activo.
+
+    :param env: entorno de Odoo cuyo cursor se mide
+    :param name: nombre con el que se agrupan las mediciones
+    """
+    if not is_profiling_enabled(env):
+        yield
+        return
+    cr = env.cr
+    queries = cr.sql_log_count
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_sample(name, time.perf_counter() - started, cr.sql_log_count - queries)
+
+
+def profiled(method):
+    """Decorador de métodos de modelo que los mide con profiling_scope"""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with profiling_scope(self.env, name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def record_sample(name, seconds, queries):
+    with _lock:
+        _samples.append((name, seconds, queries))
+        totals = _totals[name]
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['queries'] += queries
+
+
+def get_profiling_stats():
+    """
+    Estadísticas por método desde el arranque del worker (o el último reset);
+    el p95 se calcula sobre las muestras del buffer circular.
+
+    :return: lista de dicts ordenada por tiempo acumulado descendente
+    """
+    with _lock:
+        samples = list(_samples)
+        totals = {name: dict(values) for name, values in _totals.items()}
+
+    durations = collections.defaultdict(list)
+    for name, seconds, dummy in samples:
+        durations[name].append(seconds)
+
+    stats = []
+    for name, values in totals.items():
+        recent = sorted(durations.get(name, []))
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        stats.append({
+            'method': name,
+            'calls': values['calls'],
+            'queries': values['queries'],
+            'total_ms': values['seconds'] * 1000.0,
+            'avg_ms': values['seconds'] * 1000.0 / values['calls'],
+            'avg_queries': values['queries'] / values['calls'],
+            'p95_ms': p95 * 1000.0,
+        })
+    return sorted(stats, key=lambda stat: stat['total_ms'], reverse=True)
+
+
+def reset_profiling_stats():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
@@ -0,0 +1,66 @@
+import re
+import unicodedata
+
+_SEPARATORS_RE = re.compile(r'\s*(?:\+|,|;|/|\by\b)\s*')
+_SPACES_RE = re.compile(r'\s+')
+_TERMS_RE = re.compile(r'[\n,;+/()]|\by\b', re.IGNORECASE)
+
+# Palabras que no identifican por sí solas un alérgeno o principio activo
+TOKEN_STOPWORDS = {
+    'acido', 'sodico', 'sodio', 'potasico', 'potasio', 'calcico', 'calcio',
+    'clorhidrato', 'hidrocloruro', 'sulfato', 'fosfato', 'maleato', 'citrato',
+    'alergia', 'alergico', 'alergica', 'compuesto', 'derivados', 'para', 'otros',
+}
+
+
+def normalize_text(value):
+    """
+    Normaliza un texto libre para comparaciones: minúsculas, sin acentos y
+    con espacios simples.
+
+    :param value: texto (o False)
+    :return: texto normalizado, '' si no hay valor
+    """
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _SPACES_RE.sub(' ', value.lower()).strip()
+
+
+def normalize_principle(value):
+    """
+    Normaliza un principio activo (posiblemente combinado) a sus componentes
+    ordenados: "Paracetamol + Cafeína" -> "cafeina+paracetamol".
+    """
+    components = _SEPARATORS_RE.split(normalize_text(value))
+    return '+'.join(sorted({component for component in components if component}))
+
+
+def normalize_concentration(value):
+    """
+    Normaliza una concentración: "500 mg" -> "500mg", "2,5 mg/5 ml" -> "2.5mg/5ml".
+    """
+    return normalize_text(value).replace(' ', '').replace(',', '.')
+
+
+def tokenize_terms(value):
+    """
+    Convierte un texto libre (alergias, principio activo) en tokens
+    normalizados: cada término completo y sus palabras significativas.
+    "Penicilina, Ácido acetilsalicílico" ->
+    {'penicilina', 'acido acetilsalicilico', 'acetilsalicilico'}
+
+    :param value: texto (o False)
+    :return: set de tokens
+    """
+    tokens = set()
+    for term in _TERMS_RE.split(value or ''):
+        term = normalize_text(term)
+        if not term:
+            continue
+        tokens.add(term)
+        tokens.update(word for word in term.split(' ')
+                      if len(word) >= 4 and word not in TOKEN_STOPWORDS)
+    tokens.difference_update(TOKEN_STOPWORDS)
+    return tokens